@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserInfo, Instructor, Topics, Courses, Lessons, Rating, Tags, TopicTag, CourseTag, LessonTag, Uploaded
+from .models import UserInfo, Instructor, Topics, Courses, Lessons, Rating, CourseRatingAggregate, Tags, TopicTag, CourseTag, LessonTag, Uploaded, UploadJob, VideoMetadata
 
 #Register ability for admins to view entities
 admin.site.register(UserInfo)
@@ -8,8 +8,11 @@ admin.site.register(Topics)
 admin.site.register(Courses)
 admin.site.register(Lessons)
 admin.site.register(Rating)
+admin.site.register(CourseRatingAggregate)
 admin.site.register(Tags)
 admin.site.register(TopicTag)
 admin.site.register(CourseTag)
 admin.site.register(LessonTag)
 admin.site.register(Uploaded)
+admin.site.register(UploadJob)
+admin.site.register(VideoMetadata)
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Blob, Uploaded
+
+logger = logging.getLogger("django")
+
+"""
+Content addressed store for lesson files, so file bytes never live in database rows.
+Blobs are keyed by the SHA-256 of their contents (stored as ab/cd/abcd...), which means
+identical files are stored once and a hash always names the same bytes.
+The storage backend is swappable through settings.BLOB_STORAGE (BACKEND + OPTIONS).
+Blobs are shared, so a blob is deleted once the last Uploaded row referencing it is gone.
+put_blob and release_blob both lock the blob's Blob row first: put_blob is called in the
+transaction that inserts the referencing row, so a release waits for that row to commit
+(and then keeps the blob) or finishes deleting before put_blob writes the file again.
+"""
+
+@lru_cache(maxsize=None)
+def get_blob_storage():
+    config = settings.BLOB_STORAGE
+    storage_class = import_string(config["BACKEND"])
+    return storage_class(**config.get("OPTIONS", {}))
+
+def blob_path(content_hash):
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+#Hash a file without loading it whole, leaving it rewound
+def _hash_file(file):
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+#Store a file in the blob store unless its content is already there
+def write_blob(file, content_hash):
+    storage = get_blob_storage()
+    path = blob_path(content_hash)
+    if not storage.exists(path):
+        saved = storage.save(path, file)
+        if saved != path:
+            #Another writer stored the same content first, the copy is not needed
+            storage.delete(saved)
+
+#Lock the blob's Blob row until the surrounding transaction ends, creating it if needed
+def lock_blob(content_hash):
+    Blob.objects.select_for_update().get_or_create(contentHash=content_hash)
+
+#Store bytes or a file, returning (content_hash, size). Content already stored is not written again
+#Must run in the transaction that saves the Uploaded row referencing the blob (see lock_blob)
+def put_blob(content):
+    file = ContentFile(content) if isinstance(content, (bytes, bytearray, memoryview)) else content
+    if not isinstance(file, File):
+        file = File(file)
+    content_hash, size = _hash_file(file)
+
+    lock_blob(content_hash)
+    write_blob(file, content_hash)
+    logger.debug(f"Blob_Stored : {content_hash} : {size} bytes")
+    return content_hash, size
+
+def open_blob(content_hash):
+    return get_blob_storage().open(blob_path(content_hash), "rb")
+
+def blob_exists(content_hash):
+    return get_blob_storage().exists(blob_path(content_hash))
+
+#Delete a blob if no Uploaded row references it (any more), under the lock of put_blob
+def release_blob(content_hash):
+    with transaction.atomic():
+        lock_blob(content_hash)
+        if Uploaded.objects.filter(contentHash=content_hash).exists():
+            return
+        delete_blob(content_hash)
+        Blob.objects.filter(contentHash=content_hash).delete()
+
+#Remove a blob, callers make sure nothing references it anymore
+def delete_blob(content_hash):
+    try:
+        get_blob_storage().delete(blob_path(content_hash))
+        logger.debug(f"Blob_Deleted : {content_hash}")
+    except Exception as e:
+        logger.error(f"Failed to delete blob {content_hash}: {e}")
@@ -0,0 +1,63 @@
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger("django")
+
+"""
+Helpers shared by the caches in front of the YouTube API and the database.
+- Cache errors (Redis down) are logged and treated as misses, never as request failures
+- Hits and misses are counted per cache name in the cache itself, so the numbers
+  cover every gunicorn and celery process
+"""
+
+#Get a value, returning default when the cache backend is unavailable
+def cache_get(key, default=None):
+    try:
+        return cache.get(key, default)
+    except Exception as e:
+        logger.error(f"Cache get failed for {key}: {e}")
+        return default
+
+def cache_set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception as e:
+        logger.error(f"Cache set failed for {key}: {e}")
+
+def cache_delete(key):
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.error(f"Cache delete failed for {key}: {e}")
+
+def _counter_key(name, outcome):
+    return f"stats:{name}:{outcome}"
+
+#Count one outcome (hit, miss, ...) for the named cache
+def record(name, outcome):
+    key = _counter_key(name, outcome)
+    try:
+        cache.add(key, 0, None)
+        cache.incr(key)
+    except Exception as e:
+        logger.error(f"Cache counter failed for {key}: {e}")
+
+def record_hit(name):
+    record(name, "hit")
+
+def record_miss(name):
+    record(name, "miss")
+
+#Counters for the named cache plus its hit rate (everything that was not a miss)
+def cache_stats(name, outcomes=("hit", "miss")):
+    keys = [_counter_key(name, outcome) for outcome in outcomes]
+    try:
+        values = cache.get_many(keys)
+    except Exception as e:
+        logger.error(f"Cache stats failed for {name}: {e}")
+        values = {}
+    stats = {outcome: values.get(key, 0) for outcome, key in zip(outcomes, keys)}
+    total = sum(stats.values())
+    stats["hit_rate"] = round((total - stats.get("miss", 0)) / total, 4) if total else None
+    return stats
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .caching import cache_get, cache_set, cache_delete, record, cache_stats
+from .conditional import conditional_response
+
+logger = logging.getLogger("django")
+
+"""
+Response cache for the catalog reads: course list and detail, a course's lessons, topic list and detail.
+Keys are versioned instead of deleted. Every response depends on a few version counters:
+- courses: any course row or rating aggregate (the course list)
+- course:<id>: the course, its rating aggregate, its lessons, their uploads and video metadata, its tags
+  (also the key of the course bundle, see course_bundle.py)
+- topics: any topic row
+The signal handlers in signals.py bump the counters after a commit, and the bulk writers that skip
+them (rating drains and rebuilds, video metadata refreshes) bump them themselves, which moves every
+response depending on them to new keys, so nothing stale is served and old entries just expire.
+A counter that expires or is evicted restarts from the current time, never from a value used before.
+
+Entries are fresh for CATALOG_CACHE_TTL and then kept CATALOG_CACHE_STALE_TTL longer. Only one
+request at a time rebuilds a key (a CATALOG_CACHE_LOCK_SECONDS lock): the others serve the
+stale entry or, with nothing cached yet, wait up to CATALOG_CACHE_WAIT for the rebuild.
+Stale entries only outlive their TTL, never a version bump. Outcomes are counted per request:
+hit, stale (served while another request rebuilds), waited (answered by another request's
+rebuild) and miss (built here).
+Entries keep the ETag/Last-Modified validators of the response (see conditional.py), so a hit
+answers If-None-Match/If-Modified-Since with a 304 without touching the database.
+"""
+
+CACHE_NAME = "catalog"
+CACHE_OUTCOMES = ("hit", "stale", "waited", "miss")
+#How often a request waiting on a rebuild looks for the result
+WAIT_INTERVAL = 0.05
+#Version counters expire when unused, so courses that were only looked up do not pile up
+VERSION_TTL = 24 * 60 * 60
+
+def _version_key(name):
+    return f"catalog:version:{name}"
+
+#Current value of each named version counter, created on first use
+def get_versions(names):
+    keys = [_version_key(name) for name in names]
+    try:
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                cache.add(key, time.time_ns(), VERSION_TTL)
+                versions[key] = cache.get(key)
+    except Exception as e:
+        logger.error(f"Catalog version lookup failed: {e}")
+        return None
+    return [versions[key] for key in keys]
+
+#Move every response depending on the named versions to new keys
+def bump_versions(names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.add(key, time.time_ns(), VERSION_TTL)
+            cache.incr(key)
+        except Exception as e:
+            logger.error(f"Catalog version bump failed for {key}: {e}")
+
+def course_version(course_id):
+    return f"course:{course_id}"
+
+def _response_key(request, versions):
+    uri = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f"catalog:response:{'.'.join(str(version) for version in versions)}:{uri}"
+
+def _claim(key):
+    try:
+        return cache.add(f"{key}:lock", 1, settings.CATALOG_CACHE_LOCK_SECONDS)
+    except Exception as e:
+        logger.error(f"Catalog cache lock failed for {key}: {e}")
+        return True
+
+def _cached(request, entry):
+    build = lambda: Response(entry["data"], status=entry["status"])
+    if entry.get("validators") is None:
+        return build()
+    return conditional_response(request, entry["validators"], build)
+
+#Build the response and cache it if it is a success, then let the next rebuild through
+def _build(key, build):
+    try:
+        response = build()
+        if response.status_code == 200:
+            cache_set(key, {
+                "data": response.data,
+                "status": response.status_code,
+                "validators": getattr(response, "cache_validators", None),
+                "fresh_until": time.time() + settings.CATALOG_CACHE_TTL,
+            }, settings.CATALOG_CACHE_TTL + settings.CATALOG_CACHE_STALE_TTL)
+        return response
+    finally:
+        cache_delete(f"{key}:lock")
+
+#The cached response to a GET depending on the named versions, build() makes it on a miss
+def cached_response(request, version_names, build):
+    versions = get_versions(version_names)
+    if versions is None:
+        return build() # Cache unavailable
+    key = _response_key(request, versions)
+    entry = cache_get(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        record(CACHE_NAME, "hit")
+        return _cached(request, entry)
+
+    if _claim(key):
+        record(CACHE_NAME, "miss")
+        return _build(key, build)
+    if entry is not None:
+        record(CACHE_NAME, "stale")
+        return _cached(request, entry)
+
+    # Another request is building it, wait for that instead of querying too
+    deadline = time.monotonic() + settings.CATALOG_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache_get(key)
+        if entry is not None:
+            record(CACHE_NAME, "waited")
+            return _cached(request, entry)
+    record(CACHE_NAME, "miss")
+    return build()
+
+def catalog_cache_stats():
+    return cache_stats(CACHE_NAME, CACHE_OUTCOMES)
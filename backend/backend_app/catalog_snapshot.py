@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from whitenoise.compress import Compressor
+
+from .models import Courses, CourseRatingAggregate, Lessons, CourseTag, Uploaded
+from .serializers import CourseSerializer
+
+logger = logging.getLogger("django")
+
+"""
+Static snapshot of the published catalog for anonymous visitors, who all ask for the same course list.
+build_snapshot renders every published course with its tag names, rating totals and lessons
+(with the YouTube video IDs of their uploads) into one JSON file in CATALOG_SNAPSHOT_DIR.
+- The file is named after a hash of its contents, catalog.<version>.json, so a name never
+  changes meaning and an unchanged catalog is not written again
+- Gzip and Brotli (when installed) copies are written next to it with WhiteNoise's compressor,
+  and are in place before the .json itself appears
+- SnapshotWhiteNoiseMiddleware (middleware.py) serves the files under CATALOG_SNAPSHOT_URL with
+  far-future immutable caching, picking up versions written after the process started
+- manifest.json, written last, names the current version. /catalog/manifest/ serves it with a
+  short max-age, clients read it and then fetch the versioned file from any cache
+Writes queue a rebuild CATALOG_SNAPSHOT_DELAY seconds later through schedule_catalog_snapshot
+(tasks.py), later writes join the queued one. celery-beat also rebuilds every
+CATALOG_SNAPSHOT_INTERVAL. The last CATALOG_SNAPSHOT_KEEP versions stay on disk for clients
+holding an older manifest. The directory must be shared by the web and celery containers.
+"""
+
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_PREFIX = "catalog."
+SNAPSHOT_SUFFIX = ".json"
+REBUILD_QUEUED_KEY = "catalog:snapshot:rebuild-queued"
+REBUILD_LOCK_KEY = "catalog:snapshot:rebuild-lock"
+
+#Published courses with their tag names, rating totals and lessons, in a fixed number of queries
+def render_catalog():
+    courses = list(Courses.objects.filter(isPublished=True).select_related('ratingAggregate').order_by('courseID'))
+
+    lessons = defaultdict(list)
+    videos = Prefetch('uploaded_set', queryset=Uploaded.objects.filter(videoID__isnull=False).only('fileID', 'lessonID', 'videoID').order_by('fileID'))
+    for lesson in Lessons.objects.filter(courseID__isPublished=True).order_by('lessonID').prefetch_related(videos):
+        lessons[lesson.courseID_id].append({
+            "lessonID": lesson.lessonID,
+            "lessonName": lesson.lessonName,
+            "lessonDescription": lesson.lessonDescription,
+            "videoIDs": [upload.videoID for upload in lesson.uploaded_set.all()],
+        })
+
+    tags = defaultdict(list)
+    links = CourseTag.objects.filter(courseID__isPublished=True).order_by('tagID__tagName')
+    for course_id, tag_name in links.values_list('courseID', 'tagID__tagName'):
+        tags[course_id].append(tag_name)
+
+    catalog = []
+    for course in courses:
+        try:
+            aggregate = course.ratingAggregate
+        except CourseRatingAggregate.DoesNotExist:
+            aggregate = CourseRatingAggregate(courseID=course)
+        catalog.append({
+            **CourseSerializer(course).data,
+            "tags": tags[course.courseID],
+            "rating": {
+                "average": aggregate.average,
+                "count": aggregate.ratingCount,
+                "histogram": aggregate.histogram,
+            },
+            "lessons": lessons[course.courseID],
+        })
+    return {"courses": catalog}
+
+def _path(name):
+    return os.path.join(settings.CATALOG_SNAPSHOT_DIR, name)
+
+#Write data to the named file in one step, readers see the old or the new file, never half of one
+def _write_atomic(name, data):
+    path = _path(name)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+    return path
+
+#Write a snapshot version and its compressed copies, the copies are renamed into place first so whoever
+#finds the .json (SnapshotWhiteNoiseMiddleware) also finds every copy of it, complete
+def _write_snapshot(name, data):
+    path = _path(name)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    for compressed in Compressor(quiet=True).compress(temporary):
+        os.replace(compressed, path + compressed[len(temporary):])
+    os.replace(temporary, path)
+
+#Current manifest, None until the first snapshot is built
+def read_manifest():
+    try:
+        with open(_path(MANIFEST_NAME), "rb") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Catalog snapshot manifest unreadable: {e}")
+        return None
+
+#Render the catalog, write its version if it is new and point the manifest at it. Returns the manifest
+def build_snapshot():
+    os.makedirs(settings.CATALOG_SNAPSHOT_DIR, exist_ok=True)
+    data = json.dumps(render_catalog(), cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+    version = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{SNAPSHOT_PREFIX}{version}{SNAPSHOT_SUFFIX}"
+
+    if not os.path.exists(_path(name)):
+        _write_snapshot(name, data)
+    else:
+        os.utime(_path(name)) # Newest again, so pruning keeps it
+
+    manifest = {
+        "version": version,
+        "file": name,
+        "size": len(data),
+        "generatedAt": timezone.now().isoformat(),
+    }
+    _write_atomic(MANIFEST_NAME, json.dumps(manifest).encode())
+    prune_snapshots(keep=name)
+    logger.debug(f"Catalog_Snapshot_Built : {version}")
+    return manifest
+
+#Delete all but the newest CATALOG_SNAPSHOT_KEEP versions (and always keep the named one)
+def prune_snapshots(keep=None):
+    directory = settings.CATALOG_SNAPSHOT_DIR
+    names = [
+        name for name in os.listdir(directory)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    ]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    for name in names[settings.CATALOG_SNAPSHOT_KEEP:]:
+        if name == keep:
+            continue
+        for variant in (name, f"{name}.gz", f"{name}.br"):
+            try:
+                os.remove(os.path.join(directory, variant))
+            except FileNotFoundError:
+                pass
+
+#True when this caller should queue a rebuild, False when one is already queued
+def claim_rebuild():
+    try:
+        return cache.add(REBUILD_QUEUED_KEY, 1, settings.CATALOG_SNAPSHOT_DELAY + 60)
+    except Exception as e:
+        logger.error(f"Catalog snapshot rebuild claim failed: {e}")
+        return True
+
+#Called when a rebuild starts, later writes queue the next one
+def release_rebuild():
+    try:
+        cache.delete(REBUILD_QUEUED_KEY)
+    except Exception as e:
+        logger.error(f"Catalog snapshot rebuild release failed: {e}")
+
+#Only one build at a time, so an older render never replaces the manifest of a newer one
+def acquire_build_lock():
+    try:
+        return cache.add(REBUILD_LOCK_KEY, 1, settings.CATALOG_SNAPSHOT_LOCK_SECONDS)
+    except Exception as e:
+        logger.error(f"Catalog snapshot lock failed: {e}")
+        return True
+
+def release_build_lock():
+    try:
+        cache.delete(REBUILD_LOCK_KEY)
+    except Exception as e:
+        logger.error(f"Catalog snapshot lock release failed: {e}")
@@ -0,0 +1,83 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import CatalogChange, Topics, Courses, Lessons, Rating, Tags, TopicTag, CourseTag, LessonTag, Uploaded
+
+logger = logging.getLogger("django")
+
+"""
+Append only change log of the catalog, so clients sync through /changes/?since=<seq> in O(changes)
+instead of fetching every listing again.
+- Every create, update and delete of a logged model is a CatalogChange row, written by the signal
+  handlers in signals.py once the transaction commits. A row whose response shows another row is
+  logged as updated along with it: a course for its ratings, a lesson for its uploads, a tag for
+  its usage count. The bulk writers that skip the handlers log their rows themselves: rating
+  drains and rebuilds their courses, video metadata refreshes the uploads and lessons showing the videos
+- seq increases with every entry. Entries are only served once CATALOG_CHANGES_SETTLE_SECONDS
+  old, so an insert that commits after a later sequence number was handed out is not skipped
+- /changes/ attaches the current serialized row to the entries of rows that still exist, so only
+  the latest entry of a row matters. compact_changes (run by celery-beat) deletes the entries
+  followed by a newer one for the same row: a client syncing from any seq still sees the latest
+  change of every row changed after it, and the log stays about as long as the catalog plus its
+  tombstones
+The 0012 migration logs every existing row as created, so since=0 is a full sync.
+"""
+
+#Logged models by the name of their endpoint
+LOGGED_MODELS = {
+    "topics": Topics,
+    "courses": Courses,
+    "lessons": Lessons,
+    "ratings": Rating,
+    "tags": Tags,
+    "topic-tags": TopicTag,
+    "course-tags": CourseTag,
+    "lesson-tags": LessonTag,
+    "uploaded": Uploaded,
+}
+MODEL_NAMES = {model: name for name, model in LOGGED_MODELS.items()}
+
+#Log action on the given rows of model once the transaction commits
+def record_changes(model, object_ids, action):
+    name = MODEL_NAMES[model]
+    object_ids = sorted({object_id for object_id in object_ids if object_id is not None})
+    if not object_ids:
+        return
+    # robust: a failure to log must not fail a write that already committed
+    transaction.on_commit(lambda: CatalogChange.objects.bulk_create([
+        CatalogChange(modelName=name, objectID=object_id, action=action) for object_id in object_ids
+    ]), robust=True)
+
+#Up to limit entries after since, oldest first, stopping at the first one that has not settled
+def changes_since(since, limit):
+    settled = timezone.now() - timedelta(seconds=settings.CATALOG_CHANGES_SETTLE_SECONDS)
+    changes = []
+    for change in CatalogChange.objects.filter(seq__gt=since).order_by('seq')[:limit]:
+        if change.changedAt > settled:
+            break
+        changes.append(change)
+    return changes
+
+#Delete the entries followed by a newer one for the same row, batch_size entries at a time
+#Returns the number of entries deleted
+def compact_changes(batch_size):
+    newer = CatalogChange.objects.filter(
+        modelName=OuterRef('modelName'), objectID=OuterRef('objectID'), seq__gt=OuterRef('seq')
+    )
+    deleted = 0
+    last_seq = 0
+    while True:
+        # Keyset batches over the log, each one a single DELETE
+        seqs = list(CatalogChange.objects.filter(seq__gt=last_seq).order_by('seq').values_list('seq', flat=True)[:batch_size])
+        if not seqs:
+            break
+        last_seq = seqs[-1]
+        count, _ = CatalogChange.objects.filter(seq__gte=seqs[0], seq__lte=last_seq).filter(Exists(newer)).delete()
+        deleted += count
+        logger.debug(f"Catalog_Changes_Compacted : {deleted}")
+    return deleted
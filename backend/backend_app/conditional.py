@@ -0,0 +1,69 @@
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+"""
+Conditional GET for the catalog endpoints, so clients and proxies revalidate instead of re-downloading.
+Catalog rows carry updatedAt, and parents are touched when a child they show changes (a lesson
+when one of its uploads does). The validators of a response come from one aggregate query over
+the rows it shows: how many there are and the latest of their timestamps. Edits move the latest
+timestamp, deletes change the count. That gives
+- ETag: weak, a hash of the count, the latest timestamp and the request path (page and filters)
+- Last-Modified: the latest timestamp
+A request whose If-None-Match or If-Modified-Since still matches gets a 304 before anything is
+serialized. Anonymous requests for rows that are all published get Cache-Control: public so a
+CDN can answer them for CATALOG_MAX_AGE. Everything else is private and revalidated every time.
+"""
+
+#etag: weak ETag, last_modified: unix time or None, public: may be shared by caches when asked anonymously
+Validators = namedtuple("Validators", ["etag", "last_modified", "public"])
+
+#Validators for a response showing queryset, timestamp_fields are lookups of the timestamps it depends on,
+#private is a Q matching rows that must not be cached publicly, extra_timestamps are other datetimes it shows
+def validate(request, queryset, timestamp_fields=("updatedAt",), private=None, extra_timestamps=()):
+    aggregates = {f"latest{index}": Max(field) for index, field in enumerate(timestamp_fields)}
+    aggregates["rows"] = Count("pk", distinct=True)
+    if private is not None:
+        aggregates["private"] = Count("pk", filter=private, distinct=True)
+    values = queryset.order_by().aggregate(**aggregates)
+
+    timestamps = [values[f"latest{index}"] for index in range(len(timestamp_fields))] + list(extra_timestamps)
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    latest = max(timestamps) if timestamps else None
+    state = f"{values['rows']}:{latest.isoformat() if latest else ''}:{request.get_full_path()}"
+    return Validators(
+        f'W/"{hashlib.sha1(state.encode()).hexdigest()}"',
+        int(latest.timestamp()) if latest else None,
+        not values.get("private")
+    )
+
+def is_anonymous(request):
+    user = getattr(request, "user", None)
+    return "Authorization" not in request.headers and not (user is not None and user.is_authenticated)
+
+#304 when the client's copy is current, otherwise build(), with validators and caching headers either way
+def conditional_response(request, validators, build):
+    response = get_conditional_response(request, etag=validators.etag, last_modified=validators.last_modified)
+    if response is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        # Kept with cached copies of the response (see catalog_cache.py)
+        response.cache_validators = validators
+
+    response.headers["ETag"] = validators.etag
+    if validators.last_modified is not None:
+        response.headers["Last-Modified"] = http_date(validators.last_modified)
+    if validators.public and is_anonymous(request):
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_MAX_AGE,
+            stale_while_revalidate=settings.CATALOG_STALE_WHILE_REVALIDATE
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Accept", "Authorization", "Cookie"])
+    return response
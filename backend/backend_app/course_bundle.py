@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .caching import cache_get, cache_set, record_hit, record_miss, cache_stats
+from .catalog_cache import get_versions, course_version
+from .models import Courses, CourseRatingAggregate, Lessons, Tags, Uploaded, VideoMetadata
+from .serializers import CourseSerializer, LessonSerializer, UPLOAD_SUMMARY_FIELDS
+
+logger = logging.getLogger("django")
+
+"""
+Everything a course page shows, built in a fixed number of queries and cached as one unit.
+- course: the course as CourseSerializer shows it
+- lessons: its lessons in lessonID order with their upload summaries and stored video metadata
+- tags: names of the course's tags, sorted
+- rating: average, count and 1-5 histogram from the course's CourseRatingAggregate
+The queries are the course joined with its rating aggregate, the lessons, their uploads, the tag
+names and the video metadata, however many lessons there are. The cached copy is keyed by the
+course's course:<id> version counter (see catalog_cache.py), which the handlers in signals.py and the
+bulk writers (video metadata refreshes, rating rebuilds) bump, so a change moves the bundle to a new
+key and the old copy just expires after COURSE_BUNDLE_CACHE_TTL.
+"""
+
+CACHE_NAME = "course_bundle"
+
+def _bundle_key(course_id, version):
+    return f"course:{course_id}:bundle:{version}"
+
+#Build the bundle from the database, None if the course does not exist
+def build_bundle(course_id):
+    course = Courses.objects.select_related('ratingAggregate').filter(pk=course_id).first()
+    if course is None:
+        return None
+    try:
+        aggregate = course.ratingAggregate
+    except CourseRatingAggregate.DoesNotExist:
+        aggregate = CourseRatingAggregate(courseID=course)
+
+    lessons = list(
+        Lessons.objects.filter(courseID=course).order_by('lessonID').prefetch_related(
+            Prefetch('uploaded_set', queryset=Uploaded.objects.only(*UPLOAD_SUMMARY_FIELDS).order_by('fileID'))
+        )
+    )
+    video_ids = {upload.videoID for lesson in lessons for upload in lesson.uploaded_set.all() if upload.videoID}
+    video_metadata = VideoMetadata.objects.in_bulk(video_ids) if video_ids else {}
+    tags = list(Tags.objects.filter(coursetag__courseID=course).order_by('tagName').values_list('tagName', flat=True))
+
+    return {
+        "course": CourseSerializer(course).data,
+        # No request in the context, download URLs stay relative so any host can serve the cached copy
+        "lessons": LessonSerializer(lessons, many=True, context={"video_metadata": video_metadata}).data,
+        "tags": tags,
+        "rating": {
+            "average": aggregate.average,
+            "count": aggregate.ratingCount,
+            "histogram": aggregate.histogram,
+        },
+    }
+
+#Cached bundle for the course, built on a miss
+def get_bundle(course_id):
+    versions = get_versions([course_version(course_id)])
+    if versions is None:
+        return build_bundle(course_id) # Cache unavailable
+    key = _bundle_key(course_id, versions[0])
+    bundle = cache_get(key)
+    if bundle is not None:
+        record_hit(CACHE_NAME)
+        return bundle
+    record_miss(CACHE_NAME)
+    bundle = build_bundle(course_id)
+    if bundle is not None:
+        cache_set(key, bundle, settings.COURSE_BUNDLE_CACHE_TTL)
+    return bundle
+
+def course_bundle_stats():
+    return cache_stats(CACHE_NAME)
@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+"""
+Local stand-in for the parts of the YouTube Data API the backend lists and uploads videos with,
+used by the benchmark commands and the tests together with youtube.configure_client(base_url=...).
+- video_count: number of videos on the fake channel, named vid00000000, vid00000001, ...
+  (11 characters like real IDs, so they survive extract_video_id)
+- latency: seconds every request waits before answering, to mimic the real round trip
+- page_size: videos per search page
+PUT and DELETE on videos (the edit and delete views) always succeed, the PUT echoes its body.
+Resumable uploads follow the real protocol: POST starts a session and answers with its URL in
+Location, every PUT answers 308 with the committed Range until the last byte is in, then 200.
+- commit_limit: most bytes kept from each PUT, so a chunk can be committed only in part
+- failing_puts: number of upload PUTs answered with a 503 before any bytes are kept
+- upload_ranges: Content-Range of every upload PUT, None when the request had none
+"""
+class FakeYouTubeServer:
+    def __init__(self, video_count, latency=0.05, page_size=50):
+        self.video_count = video_count
+        self.latency = latency
+        self.page_size = page_size
+        self.request_count = 0
+        self.sessions = {}
+        self.commit_limit = None
+        self.failing_puts = 0
+        self.upload_ranges = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def video_id(self, index):
+        return f"vid{index:08d}"
+
+    def search(self, query):
+        start = int(query.get("pageToken", ["0"])[0])
+        end = min(start + self.page_size, self.video_count)
+        body = {"items": [{"id": {"videoId": self.video_id(i)}} for i in range(start, end)]}
+        if end < self.video_count:
+            body["nextPageToken"] = str(end)
+        return body
+
+    #Changes whenever the channel size changes, like a real search page etag
+    def etag(self, query):
+        return f'"{query.get("pageToken", ["0"])[0]}-{self.video_count}"'
+
+    def videos(self, query):
+        ids = [video_id for video_id in query.get("id", [""])[0].split(",") if video_id]
+        return {"items": [{
+            "id": video_id,
+            "snippet": {
+                "title": f"Video {video_id}",
+                "description": "Benchmark video",
+                "channelId": "fake-channel",
+                "channelTitle": "Fake Channel",
+                "publishedAt": "2025-01-01T00:00:00Z",
+                "thumbnails": {"default": {"url": f"https://i.ytimg.com/vi/{video_id}/default.jpg"}},
+            },
+            "contentDetails": {"duration": "PT10M"},
+            "statistics": {"viewCount": "1"},
+            "status": {"privacyStatus": "public"},
+        } for video_id in ids]}
+
+    def start_session(self):
+        session_id = len(self.sessions)
+        self.sessions[session_id] = {"received": bytearray(), "size": None}
+        return session_id
+
+    def uploaded_video_id(self, session_id):
+        return f"upload{session_id:05d}"
+
+    #308 with the committed bytes while incomplete, 200 with the video once every byte is in
+    def upload_status(self, session_id):
+        session = self.sessions[session_id]
+        received = len(session["received"])
+        if session["size"] is not None and received >= session["size"]:
+            return 200, {"id": self.uploaded_video_id(session_id)}, {}
+        return 308, None, {"Range": f"bytes=0-{received - 1}"} if received else {}
+
+    #Answer to a PUT on a session url, returns (status, body, headers)
+    def upload(self, session_id, content_range, data):
+        if session_id not in self.sessions:
+            return 404, {"error": {"message": "Not Found"}}, {}
+        session = self.sessions[session_id]
+        if content_range and content_range.startswith("bytes */"):
+            # Status query
+            session["size"] = int(content_range.rsplit("/", 1)[1])
+            return self.upload_status(session_id)
+
+        self.upload_ranges.append(content_range)
+        if self.failing_puts:
+            self.failing_puts -= 1
+            return 503, {"error": {"message": "Backend Error"}}, {}
+        if content_range:
+            span, size = content_range[len("bytes "):].split("/")
+            start = int(span.split("-")[0])
+        else:
+            start, size = 0, len(data)
+        session["size"] = int(size)
+        # Bytes that do not continue the committed ones are dropped, like the real API
+        if start == len(session["received"]):
+            session["received"] += data if self.commit_limit is None else data[:self.commit_limit]
+        return self.upload_status(session_id)
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" #keep-alive, like the real API
+            disable_nagle_algorithm = True #headers and body are separate writes
+
+            #Count the request, wait out the latency and read the body
+            def begin(self):
+                with fake._lock:
+                    fake.request_count += 1
+                time.sleep(fake.latency)
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def do_GET(self):
+                self.begin()
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.endswith("/search"):
+                    etag = fake.etag(query)
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_json(304, None, etag)
+                    else:
+                        self.send_json(200, fake.search(query), etag)
+                elif url.path.endswith("/channels"):
+                    self.send_json(200, {"items": [{"id": "fake-channel"}]})
+                elif url.path.endswith("/videos"):
+                    self.send_json(200, fake.videos(query))
+                else:
+                    self.send_json(404, {"error": {"message": "Not Found"}})
+
+            def do_POST(self):
+                self.begin()
+                url = urlparse(self.path)
+                if url.path.endswith("/upload/youtube/v3/videos"):
+                    with fake._lock:
+                        session_id = fake.start_session()
+                    location = f"http://{self.headers['Host']}/upload/session/{session_id}"
+                    self.send_json(200, {}, headers={"Location": location})
+                else:
+                    self.send_json(404, {"error": {"message": "Not Found"}})
+
+            def do_PUT(self):
+                data = self.begin()
+                url = urlparse(self.path)
+                if url.path.startswith("/upload/session/"):
+                    with fake._lock:
+                        status, body, headers = fake.upload(
+                            int(url.path.rsplit("/", 1)[1]), self.headers.get("Content-Range"), bytes(data)
+                        )
+                    self.send_json(status, body, headers=headers)
+                elif url.path.endswith("/videos"):
+                    self.send_json(200, json.loads(data or b"{}"))
+                else:
+                    self.send_json(404, {"error": {"message": "Not Found"}})
+
+            def do_DELETE(self):
+                self.begin()
+                if urlparse(self.path).path.endswith("/videos"):
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                else:
+                    self.send_json(404, {"error": {"message": "Not Found"}})
+
+            def send_json(self, status, body, etag=None, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if etag:
+                    self.send_header("ETag", etag)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
@@ -0,0 +1,79 @@
+import statistics
+import threading
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from backend_app.models import UserInfo, Instructor, Courses, CourseRatingAggregate
+from backend_app.ratings import rating_buffer, buffered_rating_count, RATING_BUFFER_KEY
+from backend_app.tasks import drain_rating_buffer
+
+class Command(BaseCommand):
+    help = 'Compare ratings/sec and p99 latency of direct and Redis-buffered rating ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ratings', type=int, default=2000, help='Ratings submitted per mode')
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent clients submitting ratings')
+
+    #Every client posts its share of ratings to one course, like a class rating it at the end of a session
+    def submit(self, course_id, total, clients):
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+
+        def client_loop(index):
+            client = Client()
+            mine = []
+            for number in range(index, total, clients):
+                start = time.perf_counter()
+                response = client.post('/api/ratings/', {'courseID': course_id, 'rating': number % 5 + 1}, content_type='application/json')
+                mine.append(time.perf_counter() - start)
+                if response.status_code not in (201, 202):
+                    failures.append(response.status_code)
+            with lock:
+                latencies.extend(mine)
+            connection.close()
+
+        threads = [threading.Thread(target=client_loop, args=(index,)) for index in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, latencies, failures
+
+    def report(self, mode, total, elapsed, latencies, failures, settled):
+        p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode:>8} : {total / elapsed:8.1f} ratings/s acknowledged : p50 {statistics.median(latencies) * 1000:7.2f} ms : "
+            f"p99 {p99 * 1000:7.2f} ms : {total / settled:8.1f} ratings/s stored : {len(failures)} failed"
+        ))
+
+    def handle(self, *args, **options):
+        total, clients = options['ratings'], options['clients']
+        user = UserInfo.objects.create(username='bench', password='bench', email=f'bench-{time.time_ns()}@example.com')
+        course = Courses.objects.create(
+            instructorID=Instructor.objects.create(userID=user), courseName='Rating benchmark', courseDescription='Benchmark'
+        )
+        try:
+            with override_settings(RATING_INGEST_MODE='direct'):
+                elapsed, latencies, failures = self.submit(course.pk, total, clients)
+            self.report('direct', total, elapsed, latencies, failures, elapsed)
+
+            # The drain a worker would run, started when the buffer first fills like the real trigger
+            rating_buffer().delete(RATING_BUFFER_KEY)
+            with override_settings(RATING_INGEST_MODE='buffered'), mock.patch.object(drain_rating_buffer, 'apply_async'):
+                start = time.perf_counter()
+                elapsed, latencies, failures = self.submit(course.pk, total, clients)
+                while buffered_rating_count():
+                    drain_rating_buffer()
+                settled = time.perf_counter() - start
+            self.report('buffered', total, elapsed, latencies, failures, settled)
+
+            aggregate = CourseRatingAggregate.objects.get(courseID=course)
+            self.stdout.write(f"Aggregate after both runs: {aggregate.ratingCount} ratings, average {aggregate.average}")
+        finally:
+            user.delete()
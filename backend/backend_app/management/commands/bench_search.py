@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend_app.models import UserInfo, Instructor, Courses, Lessons, Tags, LessonTag
+from backend_app.search import search_enabled, full_text_search, contains_search, update_lesson_vectors
+
+WORDS = (
+    "python java rust sql algebra calculus physics chemistry biology history economics design drawing "
+    "music guitar piano cooking baking finance marketing statistics probability geometry robotics "
+    "networks security databases compilers graphics animation writing poetry grammar spanish french "
+    "german japanese astronomy geology ecology nutrition fitness yoga photography film editing"
+).split()
+
+class Command(BaseCommand):
+    help = 'Time ranked full text search against icontains matching over a synthetic lesson catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=100000, help='Lessons in the synthetic catalog')
+        parser.add_argument('--per-course', type=int, default=50, help='Lessons per course')
+        parser.add_argument('--queries', type=int, default=50, help='Queries timed per mode')
+        parser.add_argument('--page-size', type=int, default=20, help='Results fetched per query')
+        parser.add_argument('--seed', type=int, default=481)
+
+    def text(self, rng, words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    #Courses, lessons and one tag per lesson, written with bulk_create so no signal fires
+    def build_catalog(self, rng, instructor, lesson_count, per_course):
+        tags = Tags.objects.bulk_create([Tags(tagName=f"bench-{word}-{time.time_ns()}") for word in WORDS])
+        lesson_ids = []
+        for start in range(0, lesson_count, per_course * 100):
+            with transaction.atomic():
+                courses = Courses.objects.bulk_create([
+                    Courses(instructorID=instructor, courseName=self.text(rng, 3), courseDescription=self.text(rng, 20))
+                    for _ in range(min(100, -(-(lesson_count - start) // per_course)))
+                ])
+                lessons = Lessons.objects.bulk_create([
+                    Lessons(courseID=course, lessonName=self.text(rng, 4), lessonDescription=self.text(rng, 40))
+                    for course in courses for _ in range(per_course)
+                ][:lesson_count - start])
+                LessonTag.objects.bulk_create([LessonTag(lessonID=lesson, tagID=rng.choice(tags)) for lesson in lessons])
+            lesson_ids.extend(lesson.pk for lesson in lessons)
+        return tags, lesson_ids
+
+    def time_queries(self, searcher, queries, page_size):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            list(searcher("lessons", query)[:page_size])
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, mode, timings):
+        p99 = statistics.quantiles(timings, n=100)[98] if len(timings) > 1 else timings[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode:>10} : p50 {statistics.median(timings) * 1000:8.2f} ms : p99 {p99 * 1000:8.2f} ms : "
+            f"{len(timings) / sum(timings):8.1f} queries/s"
+        ))
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('The full text search benchmark needs PostgreSQL')
+        rng = random.Random(options['seed'])
+        user = UserInfo.objects.create(username='bench', password='bench', email=f'bench-{time.time_ns()}@example.com')
+        instructor = Instructor.objects.create(userID=user)
+        tags = []
+        try:
+            start = time.perf_counter()
+            tags, lesson_ids = self.build_catalog(rng, instructor, options['lessons'], options['per_course'])
+            self.stdout.write(f"Built {len(lesson_ids)} lessons in {time.perf_counter() - start:.1f} s")
+            start = time.perf_counter()
+            update_lesson_vectors(lesson_ids)
+            self.stdout.write(f"Indexed them in {time.perf_counter() - start:.1f} s")
+
+            # Single words and two word phrases, both spread over the whole catalog
+            queries = [
+                rng.choice(WORDS) if number % 2 else f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+                for number in range(options['queries'])
+            ]
+            self.report('fulltext', self.time_queries(full_text_search, queries, options['page_size']))
+            self.report('icontains', self.time_queries(contains_search, queries, options['page_size']))
+        finally:
+            start = time.perf_counter()
+            user.delete()
+            Tags.objects.filter(pk__in=[tag.pk for tag in tags]).delete()
+            self.stdout.write(f"Removed the catalog in {time.perf_counter() - start:.1f} s")
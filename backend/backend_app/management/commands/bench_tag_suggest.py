@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend_app.models import Tags
+from backend_app.search import search_enabled
+from backend_app.tag_suggest import suggest_tags
+
+WORDS = (
+    "python java rust sql algebra calculus physics chemistry biology history economics design drawing "
+    "music guitar piano cooking baking finance marketing statistics probability geometry robotics "
+    "networks security databases compilers graphics animation writing poetry grammar spanish french "
+    "german japanese astronomy geology ecology nutrition fitness yoga photography film editing"
+).split()
+
+#Tags are written and deleted in batches of this many
+BATCH_SIZE = 5000
+
+class Command(BaseCommand):
+    help = 'Time tag autocomplete (prefix and fuzzy matches) over a synthetic catalog of tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=100000, help='Tags in the synthetic catalog')
+        parser.add_argument('--queries', type=int, default=200, help='Queries timed per kind')
+        parser.add_argument('--limit', type=int, default=10, help='Suggestions asked for per query')
+        parser.add_argument('--seed', type=int, default=481)
+
+    #Two words and a number, usage counts skewed so a few tags are used a lot
+    def build_tags(self, rng, count):
+        run = time.time_ns() % 100000
+        tags = []
+        for start in range(0, count, BATCH_SIZE):
+            tags.extend(Tags.objects.bulk_create([
+                Tags(
+                    tagName=f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{run}-{number}",
+                    usageCount=int(rng.paretovariate(1.5)) - 1
+                )
+                for number in range(start, min(start + BATCH_SIZE, count))
+            ]))
+        return [tag.pk for tag in tags]
+
+    #A word with one letter dropped, the kind of typo fuzzy matching is for
+    def typo(self, rng, word):
+        position = rng.randrange(len(word))
+        return word[:position] + word[position + 1:]
+
+    def time_queries(self, queries, limit):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            suggest_tags(query, limit)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, kind, timings):
+        p99 = statistics.quantiles(timings, n=100)[98] if len(timings) > 1 else timings[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind:>10} : p50 {statistics.median(timings) * 1000:8.2f} ms : p99 {p99 * 1000:8.2f} ms : "
+            f"{len(timings) / sum(timings):8.1f} queries/s"
+        ))
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('The tag autocomplete benchmark needs PostgreSQL')
+        rng = random.Random(options['seed'])
+        tag_ids = []
+        try:
+            start = time.perf_counter()
+            tag_ids = self.build_tags(rng, options['tags'])
+            self.stdout.write(f"Built {len(tag_ids)} tags in {time.perf_counter() - start:.1f} s")
+
+            # What an author has typed so far, and misspelled words that only fuzzy matching finds
+            prefixes = [rng.choice(WORDS)[:rng.randint(1, 5)] for _ in range(options['queries'])]
+            typos = [self.typo(rng, rng.choice(WORDS)) for _ in range(options['queries'])]
+            self.report('prefix', self.time_queries(prefixes, options['limit']))
+            self.report('fuzzy', self.time_queries(typos, options['limit']))
+        finally:
+            start = time.perf_counter()
+            for position in range(0, len(tag_ids), BATCH_SIZE):
+                Tags.objects.filter(pk__in=tag_ids[position:position + BATCH_SIZE]).delete()
+            self.stdout.write(f"Removed the tags in {time.perf_counter() - start:.1f} s")
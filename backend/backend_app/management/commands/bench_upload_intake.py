@@ -0,0 +1,96 @@
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+
+from backend_app.spool import SpoolingUploadHandler, spool_upload, discard_spooled
+
+BOUNDARY = "BenchUploadBoundary"
+
+class Command(BaseCommand):
+    help = 'Compare peak memory and requests/sec of the old and streaming video upload intake'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=64, help='Size of the uploaded file in MiB')
+        parser.add_argument('--requests', type=int, default=5, help='Requests per mode for the throughput run')
+
+    #Write a multipart body to disk so building the request does not count towards server memory
+    def build_body(self, directory, size):
+        path = os.path.join(directory, "body")
+        block = os.urandom(1024 * 1024)
+        with open(path, "wb") as body:
+            body.write((
+                f"--{BOUNDARY}\r\n"
+                f'Content-Disposition: form-data; name="title"\r\n\r\nBenchmark\r\n'
+                f"--{BOUNDARY}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="bench.mp4"\r\n'
+                f"Content-Type: video/mp4\r\n\r\n"
+            ).encode())
+            written = 0
+            while written < size:
+                piece = block[:size - written]
+                body.write(piece)
+                written += len(piece)
+            body.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+        return path
+
+    def make_request(self, body_path, body):
+        return WSGIRequest({
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": "/api/upload/video/",
+            "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+            "CONTENT_LENGTH": str(os.path.getsize(body_path)),
+            "wsgi.input": body,
+        })
+
+    #What upload_video used to do: default handlers, read the file and base64 it for Celery
+    def legacy_intake(self, request):
+        request.upload_handlers = [MemoryFileUploadHandler(request), TemporaryFileUploadHandler(request)]
+        file = request.FILES["file"]
+        file_base64 = base64.b64encode(file.read()).decode()
+        return len(file_base64)
+
+    #What upload_video does now: stream to disk while hashing, then move into the spool
+    def streaming_intake(self, request):
+        request.upload_handlers = [SpoolingUploadHandler(request)]
+        handle = spool_upload(request.FILES["file"])
+        discard_spooled(handle)
+        return handle["size"]
+
+    def run_once(self, intake, body_path):
+        with open(body_path, "rb") as body:
+            request = self.make_request(body_path, body)
+            intake(request)
+            for file in request.FILES.values():
+                file.close()
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        modes = [("legacy", self.legacy_intake), ("streaming", self.streaming_intake)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            body_path = self.build_body(directory, size)
+            self.stdout.write(f"Upload size: {options['size_mb']} MiB, {options['requests']} requests per mode")
+
+            for name, intake in modes:
+                #Peak traced Python memory for a single request
+                tracemalloc.start()
+                self.run_once(intake, body_path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                #Throughput without tracing overhead
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    self.run_once(intake, body_path)
+                elapsed = time.perf_counter() - start
+
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name:>10} : peak memory {peak / (1024 * 1024):8.2f} MiB : "
+                    f"{options['requests'] / elapsed:6.2f} requests/sec"
+                ))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend_app.views import fetch_search_page, fetch_video_details, fetch_youtube_videos
+from backend_app.youtube import configure_client
+from ._fake_youtube import FakeYouTubeServer
+
+class Command(BaseCommand):
+    help = 'Compare sequential and pipelined channel listing against a local fake YouTube API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000], help='Channel sizes to list')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds of latency per fake API request')
+        parser.add_argument('--runs', type=int, default=3, help='Runs per channel size, the best is reported')
+
+    #How fetch_youtube_videos used to list a channel: search page, then its details, one after the other
+    def sequential_listing(self, access_token):
+        videos = []
+        page_token = None
+        while True:
+            data = fetch_search_page(access_token, page_token, 50).json()
+            video_ids = [item["id"]["videoId"] for item in data.get("items", [])]
+            if video_ids:
+                videos.extend(fetch_video_details(access_token, video_ids))
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return videos
+
+    def pipelined_listing(self, access_token):
+        return fetch_youtube_videos(access_token)["videos"]
+
+    def best_time(self, listing, runs):
+        best, videos = None, None
+        for _ in range(runs):
+            start = time.perf_counter()
+            videos = listing("bench-token")
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, videos
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Fake API latency {options['latency'] * 1000:.0f} ms per request, best of {options['runs']} runs")
+        try:
+            for count in options['counts']:
+                with FakeYouTubeServer(count, latency=options['latency']) as server:
+                    configure_client(base_url=server.base_url)
+                    sequential, expected = self.best_time(self.sequential_listing, options['runs'])
+                    pipelined, videos = self.best_time(self.pipelined_listing, options['runs'])
+
+                if [video["id"] for video in videos] != [video["id"] for video in expected]:
+                    self.stdout.write(self.style.ERROR(f"{count} videos : pipelined listing returned a different order"))
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f"{count:>6} videos : sequential {sequential * 1000:8.1f} ms : "
+                    f"pipelined {pipelined * 1000:8.1f} ms : speedup {sequential / pipelined:4.2f}x"
+                ))
+        finally:
+            configure_client()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backend_app.tasks import build_catalog_snapshot
+
+#Write the static snapshot of the published catalog, run at startup by entrypoint.sh
+class Command(BaseCommand):
+    help = 'Render the published catalog into the versioned, precompressed snapshot behind /catalog/manifest/'
+
+    def handle(self, *args, **options):
+        manifest = build_catalog_snapshot()
+        if manifest is None:
+            self.stdout.write(self.style.WARNING('Another build is running, nothing to do'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Catalog snapshot {manifest["version"]} ({manifest["size"]} bytes) is current'))
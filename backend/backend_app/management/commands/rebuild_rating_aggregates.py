@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backend_app.ratings import rebuild_rating_aggregates
+
+#Recount the aggregates from the Rating table, for ratings changed without signals (raw SQL, QuerySet.update, fixtures)
+class Command(BaseCommand):
+    help = 'Rebuild every course rating aggregate (count, sum, histogram) from the Rating table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses', help='Only rebuild this course, can be repeated')
+        parser.add_argument('--batch-size', type=int, default=500, help='Courses per aggregate query')
+
+    def handle(self, *args, **options):
+        written = rebuild_rating_aggregates(options['courses'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} course rating aggregates'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backend_app.search import search_enabled, update_course_vectors, update_lesson_vectors
+
+#Rewrite every search vector, after bulk imports or a change of SEARCH_CONFIG
+class Command(BaseCommand):
+    help = 'Rebuild the full text search vectors of every course and lesson (PostgreSQL only)'
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            self.stdout.write(self.style.WARNING('Search vectors are only kept on PostgreSQL, nothing to do'))
+            return
+        courses = update_course_vectors()
+        lessons = update_lesson_vectors()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search vectors of {courses} courses and {lessons} lessons'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backend_app.tasks import rebuild_tag_index
+
+#Rewrite the tag inverted index from the database, run at startup by entrypoint.sh
+class Command(BaseCommand):
+    help = 'Rebuild the Redis index of tags to published courses used by /courses/by-tags/'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_tag_index()
+        if indexed is None:
+            self.stdout.write(self.style.WARNING('Another rebuild is running, nothing to do'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Indexed the tags of {indexed} published courses'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend_app.tag_suggest import rebuild_tag_usage
+
+#Recount Tags.usageCount from the link tables, for links changed without signals (raw SQL, QuerySet.update, fixtures)
+class Command(BaseCommand):
+    help = 'Rebuild the usage count of every tag from the TopicTag, CourseTag and LessonTag tables'
+
+    def handle(self, *args, **options):
+        counted = rebuild_tag_usage()
+        self.stdout.write(self.style.SUCCESS(f'Recounted the usage of {counted} tags'))
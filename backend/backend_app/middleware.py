@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+from .catalog_snapshot import SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX
+
+"""
+WhiteNoiseMiddleware that also serves the catalog snapshots (see catalog_snapshot.py).
+WhiteNoise lists the static files once at startup, snapshots are written afterwards by celery,
+so files under CATALOG_SNAPSHOT_URL are looked up on disk per request instead. Their names
+contain a hash of their contents, so they are cached forever (public, immutable), with the
+precompressed .br/.gz copies picked by Accept-Encoding like any other static file.
+"""
+
+class SnapshotWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.snapshot_prefix = ensure_leading_trailing_slash(settings.CATALOG_SNAPSHOT_URL)
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.snapshot_prefix):
+            static_file = self.find_snapshot(request.path_info)
+            if static_file is not None:
+                return self.serve(static_file, request)
+        return super().__call__(request)
+
+    #The snapshot file for url, None if there is no such version (any more). The manifest is not a snapshot
+    def find_snapshot(self, url):
+        name = url[len(self.snapshot_prefix):]
+        if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)) or "/" in name:
+            return None
+        if not self.url_is_canonical(url):
+            return None
+        try:
+            return self.get_static_file(os.path.join(settings.CATALOG_SNAPSHOT_DIR, name), url)
+        except MissingFileError:
+            return None
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.snapshot_prefix):
+            return True
+        return super().immutable_file_test(path, url)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0002_populate_initial_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('jobID', models.AutoField(primary_key=True, serialize=False)),
+                ('spoolPath', models.CharField(max_length=255, unique=True)),
+                ('fileSize', models.BigIntegerField()),
+                ('sessionURL', models.TextField(blank=True, null=True)),
+                ('bytesSent', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('videoID', models.CharField(blank=True, max_length=32, null=True)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('updatedAt', models.DateTimeField(auto_now=True)),
+                ('lessonID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend_app.lessons')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0003_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoMetadata',
+            fields=[
+                ('videoID', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('description', models.TextField(blank=True, default='')),
+                ('thumbnailURL', models.CharField(blank=True, max_length=500, null=True)),
+                ('channelID', models.CharField(blank=True, max_length=64, null=True)),
+                ('channelTitle', models.CharField(blank=True, max_length=255, null=True)),
+                ('publishedAt', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.CharField(blank=True, max_length=32, null=True)),
+                ('viewCount', models.BigIntegerField(default=0)),
+                ('likeCount', models.BigIntegerField(default=0)),
+                ('commentCount', models.BigIntegerField(default=0)),
+                ('privacyStatus', models.CharField(blank=True, max_length=20, null=True)),
+                ('embeddable', models.BooleanField(default=True)),
+                ('available', models.BooleanField(default=True)),
+                ('fetchedAt', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+import logging
+import re
+
+from django.db import migrations, models
+
+logger = logging.getLogger("django")
+
+# Same patterns as backend_app.youtube.extract_video_id, frozen here for the migration
+VIDEO_URL_PATTERNS = [
+    re.compile(r'(?:youtube\.com\/watch\?v=|youtu.be\/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])'),
+    re.compile(r'youtube\.com\/shorts\/([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])')
+]
+
+def extract_video_id(youtube_url):
+    for pattern in VIDEO_URL_PATTERNS:
+        match = pattern.search(youtube_url)
+        if match:
+            return match.group(1)
+    return None
+
+def populate_video_ids(apps, schema_editor):
+    Uploaded = apps.get_model('backend_app', 'Uploaded')
+    linked = set()
+    for upload in Uploaded.objects.exclude(videoURL__isnull=True).exclude(videoURL="").order_by('fileID').only('fileID', 'lessonID', 'videoURL'):
+        video_id = extract_video_id(upload.videoURL)
+        if video_id is None:
+            continue
+        # Links of a video already on the lesson are duplicates, only the oldest one gets the videoID
+        # The others are kept with a NULL videoID, which the unique constraint ignores, and are
+        # logged so they can be merged or removed by hand (saving one again fails the constraint)
+        if (upload.lessonID_id, video_id) in linked:
+            logger.warning(f"Duplicate_Video_Link_Kept_Without_VideoID : fileID {upload.fileID} : lessonID {upload.lessonID_id} : {upload.videoURL}")
+            continue
+        linked.add((upload.lessonID_id, video_id))
+        Uploaded.objects.filter(fileID=upload.fileID).update(videoID=video_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0004_videometadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploaded',
+            name='videoID',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.RunPython(populate_video_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='uploaded',
+            constraint=models.UniqueConstraint(fields=('lessonID', 'videoID'), name='unique_lesson_video'),
+        ),
+    ]
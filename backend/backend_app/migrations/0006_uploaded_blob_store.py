@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:53
+
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+from django.utils.module_loading import import_string
+
+# Same layout as backend_app.blobstore (storage from settings.BLOB_STORAGE, ab/cd/abcd... paths),
+# frozen here for the migration
+def get_blob_storage():
+    config = settings.BLOB_STORAGE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+def blob_path(content_hash):
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+def write_blob(storage, file, content_hash):
+    path = blob_path(content_hash)
+    if not storage.exists(path):
+        saved = storage.save(path, file)
+        if saved != path:
+            storage.delete(saved)
+
+# Move every Uploaded.fileBlob into the content addressed blob store, one row at a time
+# (the Blob lock rows of put_blob come later, in 0013)
+def move_blobs_to_store(apps, schema_editor):
+    Uploaded = apps.get_model('backend_app', 'Uploaded')
+    storage = get_blob_storage()
+    with_blobs = Uploaded.objects.filter(fileBlob__isnull=False).values_list('fileID', flat=True)
+    for file_id in list(with_blobs):
+        blob = bytes(Uploaded.objects.filter(fileID=file_id).values_list('fileBlob', flat=True).get())
+        content_hash, size = hashlib.sha256(blob).hexdigest(), len(blob)
+        write_blob(storage, ContentFile(blob), content_hash)
+        Uploaded.objects.filter(fileID=file_id).update(
+            contentHash=content_hash,
+            fileSize=size,
+            contentType='application/octet-stream',
+        )
+
+def restore_blobs_from_store(apps, schema_editor):
+    Uploaded = apps.get_model('backend_app', 'Uploaded')
+    storage = get_blob_storage()
+    with_hashes = Uploaded.objects.filter(contentHash__isnull=False).values_list('fileID', 'contentHash')
+    for file_id, content_hash in list(with_hashes):
+        with storage.open(blob_path(content_hash), 'rb') as blob:
+            Uploaded.objects.filter(fileID=file_id).update(fileBlob=blob.read())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0005_uploaded_videoid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploaded',
+            name='contentHash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploaded',
+            name='contentType',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploaded',
+            name='fileSize',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_blobs_to_store, restore_blobs_from_store),
+        migrations.RemoveField(
+            model_name='uploaded',
+            name='fileBlob',
+        ),
+    ]
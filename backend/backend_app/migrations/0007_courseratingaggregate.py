@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+HISTOGRAM_FIELDS = {1: 'oneStar', 2: 'twoStars', 3: 'threeStars', 4: 'fourStars', 5: 'fiveStars'}
+
+# One aggregate row per existing course, counted from its ratings
+# Ratings outside 1-5 have no histogram bucket and are left out of the count and sum too (0014 removes them)
+def build_aggregates(apps, schema_editor):
+    Courses = apps.get_model('backend_app', 'Courses')
+    CourseRatingAggregate = apps.get_model('backend_app', 'CourseRatingAggregate')
+    in_range = Q(rating__rating__range=(1, 5))
+    totals = Courses.objects.values('courseID').annotate(
+        ratingCount=Count('rating', filter=in_range),
+        ratingSum=Coalesce(Sum('rating__rating', filter=in_range), 0),
+        **{field: Count('rating', filter=Q(rating__rating=rating)) for rating, field in HISTOGRAM_FIELDS.items()}
+    )
+    CourseRatingAggregate.objects.bulk_create(
+        [CourseRatingAggregate(courseID_id=row.pop('courseID'), **row) for row in totals],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0006_uploaded_blob_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRatingAggregate',
+            fields=[
+                ('courseID', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ratingAggregate', serialize=False, to='backend_app.courses')),
+                ('ratingCount', models.IntegerField(default=0)),
+                ('ratingSum', models.IntegerField(default=0)),
+                ('oneStar', models.IntegerField(default=0)),
+                ('twoStars', models.IntegerField(default=0)),
+                ('threeStars', models.IntegerField(default=0)),
+                ('fourStars', models.IntegerField(default=0)),
+                ('fiveStars', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_aggregates, migrations.RunPython.noop),
+    ]
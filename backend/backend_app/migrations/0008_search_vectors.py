@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+COURSE_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['searchVector'], name='courses_search_vector')
+LESSON_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['searchVector'], name='lessons_search_vector')
+
+# GIN indexes and tsvectors only exist on PostgreSQL, other databases keep the plain columns
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('backend_app', 'Courses'), COURSE_INDEX)
+    schema_editor.add_index(apps.get_model('backend_app', 'Lessons'), LESSON_INDEX)
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('backend_app', 'Courses'), COURSE_INDEX)
+    schema_editor.remove_index(apps.get_model('backend_app', 'Lessons'), LESSON_INDEX)
+
+# Same vectors as backend_app.search (name A, tag names B, description C), frozen here for the migration
+def tag_names(through, link_field):
+    return Coalesce(
+        Subquery(
+            through.objects.filter(**{link_field: OuterRef('pk')}).order_by().values(link_field)
+            .annotate(names=StringAgg('tagID__tagName', delimiter=' ')).values('names')
+        ),
+        Value(''),
+        output_field=TextField()
+    )
+
+def weighted_vector(name_field, through, link_field, description_field):
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector(name_field, weight='A', config=config)
+        + SearchVector(tag_names(through, link_field), weight='B', config=config)
+        + SearchVector(description_field, weight='C', config=config)
+    )
+
+# Fill the vectors of the existing courses and lessons
+def build_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    apps.get_model('backend_app', 'Courses').objects.update(searchVector=weighted_vector(
+        'courseName', apps.get_model('backend_app', 'CourseTag'), 'courseID', 'courseDescription'
+    ))
+    apps.get_model('backend_app', 'Lessons').objects.update(searchVector=weighted_vector(
+        'lessonName', apps.get_model('backend_app', 'LessonTag'), 'lessonID', 'lessonDescription'
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0007_courseratingaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courses',
+            name='searchVector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessons',
+            name='searchVector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='courses', index=COURSE_INDEX),
+                migrations.AddIndex(model_name='lessons', index=LESSON_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+    ]
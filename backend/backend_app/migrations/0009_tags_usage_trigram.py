@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+TAG_NAME_INDEX = django.contrib.postgres.indexes.GinIndex(
+    django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('tagName'), name='gin_trgm_ops'),
+    name='tags_name_trgm'
+)
+
+# Trigram indexes only exist on PostgreSQL, other databases match tag names without one
+# The index is kept out of the model state, so later migrations that remake the tags table
+# on SQLite do not try to create it there
+def create_tag_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('backend_app', 'Tags'), TAG_NAME_INDEX)
+
+def drop_tag_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('backend_app', 'Tags'), TAG_NAME_INDEX)
+
+# Same count as backend_app.tag_suggest.usage_count, frozen here for the migration
+def usage_count(link_models):
+    counts = [
+        Coalesce(
+            Subquery(
+                link_model.objects.filter(tagID=OuterRef('pk')).order_by().values('tagID')
+                .annotate(links=Count('pk')).values('links')
+            ),
+            Value(0),
+            output_field=IntegerField()
+        )
+        for link_model in link_models
+    ]
+    return sum(counts[1:], counts[0])
+
+# Count the links of the existing tags
+def count_tag_usage(apps, schema_editor):
+    apps.get_model('backend_app', 'Tags').objects.update(usageCount=usage_count([
+        apps.get_model('backend_app', name) for name in ('TopicTag', 'CourseTag', 'LessonTag')
+    ]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0008_search_vectors'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='tags',
+            name='usageCount',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(create_tag_name_index, drop_tag_name_index),
+        migrations.RunPython(count_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Same queries as backend_app.topic_browse, frozen here for the migration
+TOPIC_COURSES_SQL = """
+SELECT
+    tt."topicID_id" || '-' || c."courseID" AS "id",
+    tt."topicID_id" AS "topicID_id",
+    c."courseID" AS "courseID_id",
+    COALESCE(a."ratingCount", 0) AS "ratingCount",
+    COALESCE(a."ratingSum", 0) AS "ratingSum"
+FROM backend_app_topictag tt
+JOIN backend_app_coursetag ct ON ct."tagID_id" = tt."tagID_id"
+JOIN backend_app_courses c ON c."courseID" = ct."courseID_id" AND c."isPublished"
+LEFT JOIN backend_app_courseratingaggregate a ON a."courseID_id" = c."courseID"
+GROUP BY tt."topicID_id", c."courseID", a."ratingCount", a."ratingSum"
+"""
+
+TOPIC_SUMMARY_SQL = """
+SELECT
+    "topicID_id" AS "topicID_id",
+    COUNT(*) AS "courseCount",
+    SUM("ratingCount") AS "ratingCount",
+    SUM("ratingSum") AS "ratingSum"
+FROM backend_app_topiccourse
+GROUP BY "topicID_id"
+"""
+
+# (name, query, unique index columns, other index columns), summary after the rows it sums
+VIEWS = (
+    ('backend_app_topiccourse', TOPIC_COURSES_SQL, '"id"', '"topicID_id", "courseID_id"'),
+    ('backend_app_topiccoursesummary', TOPIC_SUMMARY_SQL, '"topicID_id"', None),
+)
+
+def view_kind(schema_editor):
+    return 'MATERIALIZED VIEW' if schema_editor.connection.vendor == 'postgresql' else 'TABLE'
+
+# Materialized views on PostgreSQL, plain tables elsewhere (see backend_app/topic_browse.py)
+def create_topic_course_views(apps, schema_editor):
+    kind = view_kind(schema_editor)
+    for name, query, unique_columns, columns in VIEWS:
+        schema_editor.execute(f"CREATE {kind} {name} AS {query}")
+        # REFRESH ... CONCURRENTLY needs a unique index
+        schema_editor.execute(f"CREATE UNIQUE INDEX {name}_unique ON {name} ({unique_columns})")
+        if columns:
+            schema_editor.execute(f"CREATE INDEX {name}_lookup ON {name} ({columns})")
+
+def drop_topic_course_views(apps, schema_editor):
+    kind = view_kind(schema_editor)
+    for name, _, _, _ in reversed(VIEWS):
+        schema_editor.execute(f"DROP {kind} IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0009_tags_usage_trigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicCourse',
+            fields=[
+                ('id', models.CharField(max_length=24, primary_key=True, serialize=False)),
+                ('ratingCount', models.IntegerField()),
+                ('ratingSum', models.IntegerField()),
+                ('courseID', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='backend_app.courses')),
+                ('topicID', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='backend_app.topics')),
+            ],
+            options={
+                'db_table': 'backend_app_topiccourse',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TopicCourseSummary',
+            fields=[
+                ('topicID', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='backend_app.topics')),
+                ('courseCount', models.IntegerField()),
+                ('ratingCount', models.IntegerField()),
+                ('ratingSum', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'backend_app_topiccoursesummary',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_topic_course_views, drop_topic_course_views),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+# Logged models by the name of their endpoint, as backend_app.changes.LOGGED_MODELS had them here
+LOGGED_MODELS = {
+    'topics': 'Topics',
+    'courses': 'Courses',
+    'lessons': 'Lessons',
+    'ratings': 'Rating',
+    'tags': 'Tags',
+    'topic-tags': 'TopicTag',
+    'course-tags': 'CourseTag',
+    'lesson-tags': 'LessonTag',
+    'uploaded': 'Uploaded',
+}
+
+# Every existing catalog row logged as created, so syncing from seq 0 covers the whole catalog
+def log_existing_rows(apps, schema_editor):
+    CatalogChange = apps.get_model('backend_app', 'CatalogChange')
+    for name, model_name in LOGGED_MODELS.items():
+        rows = apps.get_model('backend_app', model_name).objects.order_by('pk').values_list('pk', flat=True)
+        CatalogChange.objects.bulk_create(
+            [CatalogChange(modelName=name, objectID=pk, action='created') for pk in rows],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0011_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelName', models.CharField(max_length=20)),
+                ('objectID', models.IntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('changedAt', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelName', 'objectID', 'seq'], name='catalog_change_object')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
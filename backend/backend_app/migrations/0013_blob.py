@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+# A lock row for every blob already referenced
+def create_blob_rows(apps, schema_editor):
+    Blob = apps.get_model('backend_app', 'Blob')
+    hashes = apps.get_model('backend_app', 'Uploaded').objects.filter(contentHash__isnull=False).values_list('contentHash', flat=True).distinct()
+    Blob.objects.bulk_create([Blob(contentHash=content_hash) for content_hash in hashes], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0012_catalogchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('contentHash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunPython(create_blob_rows, migrations.RunPython.noop),
+    ]
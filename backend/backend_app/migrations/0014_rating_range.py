@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger("django")
+
+HISTOGRAM_FIELDS = {1: 'oneStar', 2: 'twoStars', 3: 'threeStars', 4: 'fourStars', 5: 'fiveStars'}
+
+# Ratings outside 1-5 would fail the new check constraint. They have no meaning a clamp could
+# recover, so each one is logged and deleted, and the aggregates of their courses are counted again
+# (0007 used to count them). The deletion is not undone on the way back
+def remove_out_of_range_ratings(apps, schema_editor):
+    Rating = apps.get_model('backend_app', 'Rating')
+    Courses = apps.get_model('backend_app', 'Courses')
+    CourseRatingAggregate = apps.get_model('backend_app', 'CourseRatingAggregate')
+    invalid = Rating.objects.exclude(rating__range=(1, 5))
+    course_ids = set()
+    for rating_id, course_id, rating in invalid.values_list('id', 'courseID', 'rating'):
+        logger.warning(f"Out_Of_Range_Rating_Removed : id {rating_id} : courseID {course_id} : rating {rating}")
+        course_ids.add(course_id)
+    if not course_ids:
+        return
+    invalid.delete()
+
+    totals = Courses.objects.filter(courseID__in=course_ids).values('courseID').annotate(
+        ratingCount=Count('rating'),
+        ratingSum=Coalesce(Sum('rating__rating'), 0),
+        **{field: Count('rating', filter=Q(rating__rating=rating)) for rating, field in HISTOGRAM_FIELDS.items()}
+    )
+    for row in totals:
+        CourseRatingAggregate.objects.update_or_create(courseID_id=row.pop('courseID'), defaults=row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_app', '0013_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_out_of_range_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.CheckConstraint(condition=models.Q(('rating__range', (1, 5))), name='rating_between_1_and_5'),
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.hashers import make_password
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .youtube import extract_video_id
 
 # --- USER RELATED MODELS ---
 
@@ -49,10 +52,12 @@ class Instructor(models.Model):
 Used to categorize/ group/ organize courses based on a specific subject
 - topicID: Primary key for topics, automatically generated as an auto-incrementing field
 - topicName: The name of the topic, must be unique and cannot be null
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 """
 class Topics(models.Model):
     topicID = models.AutoField(primary_key=True)
     topicName = models.CharField(max_length=100, unique=True, null=False)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"topicID : {self.topicID} : topicName : {self.topicName}"
@@ -64,6 +69,8 @@ Courses model represents the information about a course
 - courseName: The name of the course, cannot be null
 - courseDecription: The description of the course, cannot be null
 - isPublished: A boolean field indicating whether the course is published
+- searchVector: Weighted full text vector of the name, tag names and description (see search.py), PostgreSQL only
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 """
 class Courses(models.Model):
     instructorID = models.ForeignKey(Instructor, on_delete=models.CASCADE, null=False)  
@@ -71,6 +78,13 @@ class Courses(models.Model):
     courseName = models.CharField(max_length=100, null=False)  
     courseDescription = models.TextField(null=False)  
     isPublished = models.BooleanField(default=False)  
+    searchVector = SearchVectorField(null=True, editable=False)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['searchVector'], name='courses_search_vector'),
+        ]
 
     def __str__(self):
         return f"courseID : {self.courseID} : courseName : {self.courseName} : instructorID : {self.instructorID.instructorID} : isPublished : {self.isPublished}"
@@ -81,12 +95,21 @@ Lessons model can be associated with a course or created independently
 - lessonID: Primary key for the lesson, automatically generated as an auto-incrementing field
 - lessonName: The name of the lesson, cannot be null
 - lessonDescription: A description of the lesson, cannot be null
+- searchVector: Weighted full text vector of the name, tag names and description (see search.py), PostgreSQL only
+- updatedAt: Last change to the lesson or one of its uploads, validators of the catalog endpoints (see conditional.py)
 """
 class Lessons(models.Model):
     courseID = models.ForeignKey(Courses, on_delete=models.CASCADE, null=True, blank=True)  
     lessonID = models.AutoField(primary_key=True)
     lessonName = models.CharField(max_length=100, null=False) 
     lessonDescription = models.TextField(null=False) 
+    searchVector = SearchVectorField(null=True, editable=False)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['searchVector'], name='lessons_search_vector'),
+        ]
 
     def __str__(self):
         return f"lessonName : {self.lessonName} : lessonID : {self.lessonID} : courseID : {self.courseID.courseID if self.courseID is not None else 'Not Found'}"
@@ -95,24 +118,85 @@ class Lessons(models.Model):
 Rating models represents a rating given to a course by a user
 - courseID: Foreign Key linking to the Courses model, indicating which course is being rated
 - rating: An integer field for the rating, valid ratings are between 1 and 5
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 """
 class Rating(models.Model):
     courseID = models.ForeignKey(Courses, on_delete=models.CASCADE)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        # The signal handlers change the course's aggregate, which commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            # The validators only run in serializers, the aggregate has a field for each value
+            models.CheckConstraint(condition=models.Q(rating__range=(1, 5)), name='rating_between_1_and_5'),
+        ]
 
     def __str__(self):
         return f"Course : {self.courseID.courseName} : Rating : {self.rating}"
 
+"""
+CourseRatingAggregate model keeps the totals of a course's ratings so reads never scan Rating
+It is kept up to date by the Rating signal handlers (see ratings.py) and can be rebuilt with
+the rebuild_rating_aggregates management command
+- courseID: One to one link to the Courses model, also the Primary Key
+- ratingCount: Number of ratings given to the course
+- ratingSum: Sum of those ratings, the average is ratingSum / ratingCount
+- oneStar, twoStars, threeStars, fourStars, fiveStars: Number of ratings of each value
+- updatedAt: Last change to the totals, validators of the catalog endpoints (see conditional.py)
+"""
+class CourseRatingAggregate(models.Model):
+    courseID = models.OneToOneField(Courses, on_delete=models.CASCADE, primary_key=True, related_name='ratingAggregate')
+    ratingCount = models.IntegerField(default=0)
+    ratingSum = models.IntegerField(default=0)
+    oneStar = models.IntegerField(default=0)
+    twoStars = models.IntegerField(default=0)
+    threeStars = models.IntegerField(default=0)
+    fourStars = models.IntegerField(default=0)
+    fiveStars = models.IntegerField(default=0)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    #Histogram field for each rating value
+    HISTOGRAM_FIELDS = {1: 'oneStar', 2: 'twoStars', 3: 'threeStars', 4: 'fourStars', 5: 'fiveStars'}
+
+    @property
+    def average(self):
+        return round(self.ratingSum / self.ratingCount, 2) if self.ratingCount else None
+
+    @property
+    def histogram(self):
+        return {rating: getattr(self, field) for rating, field in self.HISTOGRAM_FIELDS.items()}
+
+    def __str__(self):
+        return f"Course : {self.courseID_id} : Ratings : {self.ratingCount} : Average : {self.average}"
+
 # --- TAG RELATED MODELS ---
 
 """
 Tags models represents a tag that can be applied to topics, courses, and lessons (for searchable)
 - tagID: Primary Key for the tag, automatically generated as an auto-incrementing field
-- tagName: The name of the tag, must be unique and cannot be null
+- tagName: The name of the tag, must be unique and cannot be null, UPPER(tagName) is trigram indexed on PostgreSQL for autocomplete (by migration 0009 only, the index is not in Meta.indexes)
+- usageCount: Number of TopicTag, CourseTag and LessonTag rows using the tag, kept up to date by signals (see tag_suggest.py)
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 """
 class Tags(models.Model):
     tagID = models.AutoField(primary_key=True)
     tagName = models.CharField(max_length=100, unique=True, null=False)
+    usageCount = models.IntegerField(default=0, editable=False)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        # usageCount only changes through in place updates, never write back a stale copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'usageCount'
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Tag : {self.tagName}"
@@ -122,12 +206,14 @@ TopicTag models represents the many-to-many relationship between topics and tags
 - topicTagID: Primary Key, automatically generated as an auto-incrementing field
 - topicID: Foreign Key linking to the Topics model
 - tagID: Foreign Key linking to the Tags model
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 - unqiue_together: Ensures that each topics can only be associated with a specific tag once
 """
 class TopicTag(models.Model):
     topicTagID = models.AutoField(primary_key=True)  
     topicID = models.ForeignKey(Topics, on_delete=models.CASCADE)
     tagID = models.ForeignKey(Tags, on_delete=models.CASCADE)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('topicID', 'tagID')
@@ -140,12 +226,14 @@ CourseTag model represents the many-to-many relationship between courses and tag
 - courseTagID: Primary Key, automatically generated as an auto-incrementing field
 - courseID: Foreign Key linking to the Courses model
 - tagID: Foreign Key linking to the Tags model
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 - unique_together: Ensures that each course can only be assoicated with a specific tag once
 """
 class CourseTag(models.Model):
     courseTagID = models.AutoField(primary_key=True)  
     courseID = models.ForeignKey(Courses, on_delete=models.CASCADE)
     tagID = models.ForeignKey(Tags, on_delete=models.CASCADE)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('courseID', 'tagID')  
@@ -158,12 +246,14 @@ LessonTag model represents the many-to-many relationship between lessons and tag
 - lessonTagID: Primary Key, automatically generated as an auto-incrementing field
 - lessonID: Foreign Key linking to the Lessons model
 - tagID: Foreign Key linking to the Tags model
+- updatedAt: Last change to the row, validators of the catalog endpoints (see conditional.py)
 - unqiue_together: Ensures that each lesson can only be associated with a specific tag once
 """
 class LessonTag(models.Model):
     lessonTagID = models.AutoField(primary_key=True)  
     lessonID = models.ForeignKey(Lessons, on_delete=models.CASCADE)
     tagID = models.ForeignKey(Tags, on_delete=models.CASCADE)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('lessonID', 'tagID')
@@ -171,21 +261,190 @@ class LessonTag(models.Model):
     def __str__(self):
         return f"lessonTagID : {self.lessonTagID} : Lesson : {self.lessonID.lessonName} : Tag : {self.tagID.tagName}"
 
+"""
+TopicCourse model is a read only row of the topic -> published course browse index (see topic_browse.py)
+A topic reaches a course when one of the topic's tags is also one of the course's tags
+- id: "<topicID>-<courseID>", Primary Key
+- topicID: The topic, Foreign Key to the Topics model
+- courseID: The published course, Foreign Key to the Courses model
+- ratingCount, ratingSum: The course's rating totals when the index was last refreshed
+"""
+class TopicCourse(models.Model):
+    id = models.CharField(max_length=24, primary_key=True)
+    topicID = models.ForeignKey(Topics, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    courseID = models.ForeignKey(Courses, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    ratingCount = models.IntegerField()
+    ratingSum = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'backend_app_topiccourse'
+
+    def __str__(self):
+        return f"Topic : {self.topicID_id} : Course : {self.courseID_id}"
+
+"""
+TopicCourseSummary model holds the read only totals of a topic's published courses (see topic_browse.py)
+Topics without published courses have no row
+- topicID: One to one link to the Topics model, also the Primary Key
+- courseCount: Number of published courses in the topic
+- ratingCount, ratingSum: Totals of the ratings given to those courses, the average is ratingSum / ratingCount
+"""
+class TopicCourseSummary(models.Model):
+    topicID = models.OneToOneField(Topics, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='+')
+    courseCount = models.IntegerField()
+    ratingCount = models.IntegerField()
+    ratingSum = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'backend_app_topiccoursesummary'
+
+    @property
+    def average(self):
+        return round(self.ratingSum / self.ratingCount, 2) if self.ratingCount else None
+
+    def __str__(self):
+        return f"Topic : {self.topicID_id} : Courses : {self.courseCount} : Average : {self.average}"
+
+"""
+CatalogChange model is one entry of the append only catalog change log behind /changes/ (see changes.py)
+- seq: Primary Key, the increasing sequence number clients sync from
+- modelName: Endpoint of the changed row (courses, lessons, tags, course-tags, ...)
+- objectID: Primary key of the changed row
+- action: created, updated or deleted
+- changedAt: When the change was logged, after its transaction committed
+"""
+class CatalogChange(models.Model):
+    ACTION_CREATED = "created"
+    ACTION_UPDATED = "updated"
+    ACTION_DELETED = "deleted"
+    ACTION_CHOICES = [
+        (ACTION_CREATED, "Created"),
+        (ACTION_UPDATED, "Updated"),
+        (ACTION_DELETED, "Deleted"),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    modelName = models.CharField(max_length=20)
+    objectID = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changedAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Newer entries for the same row, looked up by compaction
+            models.Index(fields=['modelName', 'objectID', 'seq'], name='catalog_change_object'),
+        ]
+
+    def __str__(self):
+        return f"seq : {self.seq} : {self.modelName} : {self.objectID} : {self.action}"
+
 # --- UPLOAD RELATED MODELS ---
 
+"""
+Blob model is the lock row of a file in the blob store (see blobstore.py)
+Storing a file together with its Uploaded row, and deleting a blob no row references any more,
+both lock it first, so a blob is never deleted between another upload finding it and referencing it
+- contentHash: Primary Key, the SHA-256 the blob is stored under
+"""
+class Blob(models.Model):
+    contentHash = models.CharField(max_length=64, primary_key=True)
+
+    def __str__(self):
+        return f"Blob : {self.contentHash}"
+
 #An entity that allows for one Lesson to have multiple Uploaded Files or Videos
 class Uploaded(models.Model):
     lessonID = models.ForeignKey(Lessons, on_delete=models.CASCADE, null=False) #Foreign Key to Lessons to designate File to a Lesson
     fileID = models.AutoField(primary_key=True) #Auto Increment, Primary Key, for File Identification
     #Below is one or the other, one will be null, the other will be full
     videoURL = models.CharField(max_length=100, null=True, blank=True) #For YT Embed if Page contains one
-    fileBlob = models.BinaryField(null=True, blank=True) #For File Blob if Page contains one
+    #For a File if Page contains one, the bytes live in the blob store (blobstore.py) under contentHash
+    contentHash = models.CharField(max_length=64, null=True, blank=True, db_index=True) #SHA-256 of the file
+    fileSize = models.BigIntegerField(null=True, blank=True) #Size of the file in bytes
+    contentType = models.CharField(max_length=100, null=True, blank=True) #MIME type of the file
+    videoID = models.CharField(max_length=32, null=True, blank=True, db_index=True) #YT video ID parsed from videoURL on save
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True) #Last change, validators of the catalog endpoints (see conditional.py)
+
+    def save(self, *args, **kwargs):
+        # Keep the parsed video ID in step with the URL
+        self.videoID = extract_video_id(self.videoURL) if self.videoURL else None
+        super().save(*args, **kwargs)
 
     class Meta:
         constraints = [
-            
+            # The same video can only be linked to a lesson once
+            models.UniqueConstraint(fields=['lessonID', 'videoID'], name='unique_lesson_video'),
         ]
         
     def __str__(self):
-        return f"Lesson : {self.lessonID.lessonID if self.lessonID is not None else 'Not Found'} : Has File ID : {self.fileID} : Of Type {'Video' if self.videoURL is not None else 'File'} : {self.videoURL if self.videoURL is not None else self.fileBlob}"
-    
\ No newline at end of file
+        return f"Lesson : {self.lessonID.lessonID if self.lessonID is not None else 'Not Found'} : Has File ID : {self.fileID} : Of Type {'Video' if self.videoURL is not None else 'File'} : {self.videoURL if self.videoURL is not None else self.contentHash}"
+    
+"""
+UploadJob model tracks a video being sent to YouTube so an interrupted upload can resume
+- jobID: Primary Key for the job, automatically generated as an auto-incrementing field
+- lessonID: Foreign Key linking to the Lessons model the video will be attached to
+- spoolPath: Path of the spooled file being uploaded (see spool.py), unique per job
+- fileSize: Total size of the video in bytes
+- sessionURL: Resumable session URI returned by YouTube, null until the session is started
+- bytesSent: Number of bytes YouTube has confirmed so far
+- status: Current state of the job (pending, uploading, complete or failed)
+- videoID: YouTube video ID once the upload completes
+- updatedAt: Last time the job made progress, used to detect a concurrently running attempt
+"""
+class UploadJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_UPLOADING = "uploading"
+    STATUS_COMPLETE = "complete"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_UPLOADING, "Uploading"),
+        (STATUS_COMPLETE, "Complete"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    jobID = models.AutoField(primary_key=True)
+    lessonID = models.ForeignKey(Lessons, on_delete=models.CASCADE)
+    spoolPath = models.CharField(max_length=255, unique=True)
+    fileSize = models.BigIntegerField()
+    sessionURL = models.TextField(null=True, blank=True)
+    bytesSent = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    videoID = models.CharField(max_length=32, null=True, blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"jobID : {self.jobID} : Lesson : {self.lessonID_id} : Status : {self.status} : Sent : {self.bytesSent}/{self.fileSize}"
+
+"""
+VideoMetadata model is a local copy of YouTube details for videos linked through Uploaded.videoURL,
+refreshed in the background so lesson pages never have to call the YouTube API
+- videoID: Primary Key, the YouTube video ID
+- title, description, thumbnailURL, channelID, channelTitle, publishedAt, duration: from the video snippet/contentDetails
+- viewCount, likeCount, commentCount: from the video statistics
+- privacyStatus, embeddable: from the video status
+- available: False when YouTube no longer returns the video (deleted or private)
+- fetchedAt: Last refresh, null until the first one. Refreshes go stalest first
+"""
+class VideoMetadata(models.Model):
+    videoID = models.CharField(max_length=32, primary_key=True)
+    title = models.CharField(max_length=255, blank=True, default="")
+    description = models.TextField(blank=True, default="")
+    thumbnailURL = models.CharField(max_length=500, null=True, blank=True)
+    channelID = models.CharField(max_length=64, null=True, blank=True)
+    channelTitle = models.CharField(max_length=255, null=True, blank=True)
+    publishedAt = models.DateTimeField(null=True, blank=True)
+    duration = models.CharField(max_length=32, null=True, blank=True)
+    viewCount = models.BigIntegerField(default=0)
+    likeCount = models.BigIntegerField(default=0)
+    commentCount = models.BigIntegerField(default=0)
+    privacyStatus = models.CharField(max_length=20, null=True, blank=True)
+    embeddable = models.BooleanField(default=True)
+    available = models.BooleanField(default=True)
+    fetchedAt = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"videoID : {self.videoID} : title : {self.title} : fetchedAt : {self.fetchedAt}"
@@ -0,0 +1,75 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+"""
+Keyset pagination used by every API listing.
+Pages are ordered by the primary key, which is indexed and never changes, and the next page
+is found with "pk > last seen" instead of an OFFSET, so a page costs the same however deep
+it is and rows added while paging are not skipped or repeated.
+- page_size: rows per page, settings.REST_FRAMEWORK["PAGE_SIZE"] unless ?page_size= asks for another
+- max_page_size: hard limit on ?page_size=, settings.API_MAX_PAGE_SIZE
+"""
+class KeysetPagination(CursorPagination):
+    ordering = "pk"
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+"""
+Keyset pagination for ranked results (search), ordered by rank, best first, then primary key.
+The cursor holds the (rank, pk) of the last row sent and the next page continues with
+"rank < last rank, or the same rank and pk > last pk", so ties never need an OFFSET.
+Querysets must be annotated with rank and ordered by ("-rank", "pk"). Only next links are given.
+"""
+class RankedKeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            rank, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return float(rank), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, row):
+        return base64.urlsafe_b64encode(json.dumps([row.rank, row.pk]).encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            rank, pk = cursor
+            queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, pk__gt=pk))
+        rows = list(queryset[:page_size + 1])
+        self.next_row = rows[page_size - 1] if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_row is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_row))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
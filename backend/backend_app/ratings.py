@@ -0,0 +1,149 @@
+import json
+import logging
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .catalog_cache import bump_versions, course_version
+from .changes import record_changes
+from .models import Courses, CourseRatingAggregate, Rating, CatalogChange
+
+logger = logging.getLogger("django")
+
+"""
+Upkeep of CourseRatingAggregate, the per course count, sum and histogram of ratings.
+Single ratings change it through the Rating signal handlers in signals.py, which call
+apply_rating_deltas in the same transaction as the rating write (Rating.save wraps both, and
+deletes signal inside the delete's transaction). The update is one
+UPDATE ... SET field = field + delta, so concurrent writers never lose each other's changes.
+Bulk writes (QuerySet.update, bulk_create) skip signals, their callers apply the deltas
+themselves or run rebuild_rating_aggregates afterwards.
+
+With RATING_INGEST_MODE = "buffered", RatingViewAll.create only validates a rating and appends
+it to a Redis list (buffer_ratings). The drain_rating_buffer task then writes the buffer in
+batches: one bulk_create and one aggregate UPDATE per course per batch, instead of a
+transaction and a contended aggregate row update per rating. A batch is removed from the
+list only after its transaction commits, so a crashed drain writes it again (at least once).
+"""
+
+RATING_BUFFER_KEY = "ratings:buffer"
+RATING_DRAIN_LOCK_KEY = "ratings:buffer:drain"
+
+#Change a course's aggregate by deltas, a {rating value: change in number of ratings} mapping
+def apply_rating_deltas(course_id, deltas):
+    deltas = {rating: change for rating, change in deltas.items() if change}
+    if not deltas:
+        return
+    changes = {
+        'ratingCount': F('ratingCount') + sum(deltas.values()),
+        'ratingSum': F('ratingSum') + sum(rating * change for rating, change in deltas.items()),
+        # QuerySet.update skips auto_now
+        'updatedAt': timezone.now(),
+    }
+    for rating, change in deltas.items():
+        field = CourseRatingAggregate.HISTOGRAM_FIELDS[rating]
+        changes[field] = F(field) + change
+
+    with transaction.atomic():
+        # Make sure the row exists, then change it in place
+        CourseRatingAggregate.objects.bulk_create([CourseRatingAggregate(courseID_id=course_id)], ignore_conflicts=True)
+        CourseRatingAggregate.objects.filter(courseID_id=course_id).update(**changes)
+
+#Deltas for many ratings at once, {course_id: {rating value: change}}
+def rating_deltas(ratings):
+    deltas = defaultdict(Counter)
+    for course_id, rating in ratings:
+        deltas[course_id][rating] += 1
+    return deltas
+
+@lru_cache(maxsize=None)
+def rating_buffer():
+    return redis.Redis.from_url(settings.RATING_BUFFER_URL)
+
+#Append validated (course_id, rating) pairs to the buffer, returns its length after the push
+def buffer_ratings(ratings):
+    return rating_buffer().rpush(RATING_BUFFER_KEY, *[json.dumps([course_id, rating]) for course_id, rating in ratings])
+
+def buffered_rating_count():
+    return rating_buffer().llen(RATING_BUFFER_KEY)
+
+#Raised when the drain lock expired while a batch was being written, the batch is rolled back
+class DrainLockLost(Exception):
+    pass
+
+#Write the oldest batch_size buffered ratings, returns (written, dropped)
+#Callers hold the drain lock, the list is only trimmed after the batch commits. A batch that outlived
+#the lock is rolled back (DrainLockLost), the drain that took the lock over reads the same ratings
+def drain_rating_batch(batch_size, lock=None):
+    client = rating_buffer()
+    raw = client.lrange(RATING_BUFFER_KEY, 0, batch_size - 1)
+    if not raw:
+        return 0, 0
+    ratings = [tuple(json.loads(item)) for item in raw]
+
+    # Courses deleted since the rating was accepted
+    existing = set(Courses.objects.filter(pk__in={course_id for course_id, _ in ratings}).values_list('pk', flat=True))
+    kept = [(course_id, rating) for course_id, rating in ratings if course_id in existing]
+    with transaction.atomic():
+        created = Rating.objects.bulk_create([Rating(courseID_id=course_id, rating=rating) for course_id, rating in kept])
+        for course_id, deltas in rating_deltas(kept).items():
+            apply_rating_deltas(course_id, deltas)
+        if kept:
+            # Bulk writes skip the signal handlers, refresh the cached course responses and log the changes here
+            versions = {course_version(course_id) for course_id, _ in kept} | {"courses"}
+            transaction.on_commit(lambda: bump_versions(versions))
+            record_changes(Rating, [rating.pk for rating in created], CatalogChange.ACTION_CREATED)
+            record_changes(Courses, {course_id for course_id, _ in kept}, CatalogChange.ACTION_UPDATED)
+        if lock is not None and not lock.owned():
+            raise DrainLockLost("Rating drain lock expired during a batch")
+    client.ltrim(RATING_BUFFER_KEY, len(raw), -1)
+
+    dropped = len(ratings) - len(kept)
+    if dropped:
+        logger.error(f"Dropped {dropped} buffered ratings for deleted courses")
+    logger.debug(f"Rating_Buffer_Drained : {len(kept)}")
+    return len(kept), dropped
+
+#Recompute aggregates from the Rating table, for every course or only course_ids. Returns the number of rows written
+def rebuild_rating_aggregates(course_ids=None, batch_size=500):
+    courses = Courses.objects.order_by('courseID')
+    if course_ids is not None:
+        courses = courses.filter(courseID__in=course_ids)
+    histogram = {
+        field: Count('rating', filter=Q(rating__rating=rating))
+        for rating, field in CourseRatingAggregate.HISTOGRAM_FIELDS.items()
+    }
+    totals = courses.values('courseID').annotate(
+        ratingCount=Count('rating'),
+        ratingSum=Coalesce(Sum('rating__rating'), 0),
+        **histogram
+    )
+
+    written = 0
+    last_id = 0
+    fields = ['ratingCount', 'ratingSum', *CourseRatingAggregate.HISTOGRAM_FIELDS.values(), 'updatedAt']
+    while True:
+        # Keyset batches over the courses, each one a single aggregate query and upsert
+        batch = list(totals.filter(courseID__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]['courseID']
+        batch_ids = [row['courseID'] for row in batch]
+        CourseRatingAggregate.objects.bulk_create(
+            [CourseRatingAggregate(courseID_id=row.pop('courseID'), **row) for row in batch],
+            update_conflicts=True,
+            unique_fields=['courseID'],
+            update_fields=fields
+        )
+        # The upsert skips the signal handlers, move the cached responses of these courses and log them here
+        bump_versions({course_version(course_id) for course_id in batch_ids} | {"courses"})
+        record_changes(Courses, batch_ids, CatalogChange.ACTION_UPDATED)
+        written += len(batch)
+        logger.debug(f"Rating_Aggregates_Rebuilt : {written}")
+    return written
@@ -0,0 +1,102 @@
+import logging
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Courses, Lessons, CourseTag, LessonTag
+
+logger = logging.getLogger("django")
+
+"""
+Full text search over courses and lessons, used by the /search/ endpoint.
+On PostgreSQL every course and lesson keeps a weighted tsvector in searchVector (GIN indexed):
+- A: courseName / lessonName
+- B: names of its tags, through CourseTag / LessonTag
+- C: courseDescription / lessonDescription
+The vectors are rewritten by the signal handlers in signals.py whenever one of those changes,
+and rebuild_search_vectors rewrites them all. Queries use websearch syntax ("a b", "a or b",
+"-a", quoted phrases) and are ranked with ts_rank.
+Other databases (SQLite in development) have no vectors and fall back to icontains matching,
+ranking name matches above tag and description matches.
+"""
+
+def search_enabled():
+    return connection.vendor == "postgresql"
+
+#Names of the row's tags as one string, through is CourseTag or LessonTag
+def _tag_names(through, link_field):
+    return Coalesce(
+        Subquery(
+            through.objects.filter(**{link_field: OuterRef("pk")}).order_by().values(link_field)
+            .annotate(names=StringAgg("tagID__tagName", delimiter=" ")).values("names")
+        ),
+        Value(""),
+        output_field=TextField()
+    )
+
+def course_vector():
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector("courseName", weight="A", config=config)
+        + SearchVector(_tag_names(CourseTag, "courseID"), weight="B", config=config)
+        + SearchVector("courseDescription", weight="C", config=config)
+    )
+
+def lesson_vector():
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector("lessonName", weight="A", config=config)
+        + SearchVector(_tag_names(LessonTag, "lessonID"), weight="B", config=config)
+        + SearchVector("lessonDescription", weight="C", config=config)
+    )
+
+#Rewrite the vectors of the given courses (all when None) in one UPDATE, returns the rows changed
+def update_course_vectors(course_ids=None):
+    if not search_enabled():
+        return 0
+    courses = Courses.objects.all() if course_ids is None else Courses.objects.filter(pk__in=course_ids)
+    return courses.update(searchVector=course_vector())
+
+def update_lesson_vectors(lesson_ids=None):
+    if not search_enabled():
+        return 0
+    lessons = Lessons.objects.all() if lesson_ids is None else Lessons.objects.filter(pk__in=lesson_ids)
+    return lessons.update(searchVector=lesson_vector())
+
+#Fields and tag relation searched for each kind of result
+SEARCH_TARGETS = {
+    "courses": (Courses, "courseName", "courseDescription", "coursetag__tagID__tagName"),
+    "lessons": (Lessons, "lessonName", "lessonDescription", "lessontag__tagID__tagName"),
+}
+
+#Matching rows annotated with rank and ordered best first, ready for RankedKeysetPagination
+def search(kind, text):
+    return full_text_search(kind, text) if search_enabled() else contains_search(kind, text)
+
+def full_text_search(kind, text):
+    model = SEARCH_TARGETS[kind][0]
+    query = SearchQuery(text, search_type="websearch", config=settings.SEARCH_CONFIG)
+    return (
+        model.objects.filter(searchVector=query)
+        # ts_rank is a float4, as a float8 it survives the trip through the page cursor exactly
+        .annotate(rank=Cast(SearchRank(F("searchVector"), query), FloatField()))
+        .order_by("-rank", "pk")
+    )
+
+#No vectors outside PostgreSQL, rank by where the text was found
+def contains_search(kind, text):
+    model, name_field, description_field, tag_field = SEARCH_TARGETS[kind]
+    matches = model.objects.filter(pk__in=model.objects.filter(
+        Q(**{f"{name_field}__icontains": text})
+        | Q(**{f"{description_field}__icontains": text})
+        | Q(**{f"{tag_field}__icontains": text})
+    ).values("pk"))
+    return matches.annotate(rank=Case(
+        When(**{f"{name_field}__icontains": text}, then=Value(1.0)),
+        default=Value(0.5),
+        output_field=FloatField()
+    )).order_by("-rank", "pk")
@@ -1,5 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import UserInfo, Instructor, Topics, Tags, Courses, Lessons, Rating, TopicTag, CourseTag, LessonTag, Uploaded
+from rest_framework.reverse import reverse
+from .models import UserInfo, Instructor, Topics, Tags, Courses, Lessons, Rating, CourseRatingAggregate, TopicTag, CourseTag, LessonTag, Uploaded, VideoMetadata
+from .youtube import extract_video_id
+from .blobstore import put_blob
 
 class UserInfoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,22 +21,121 @@ class TopicSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class CourseSerializer(serializers.ModelSerializer):
+    #Read from CourseRatingAggregate, querysets should select_related('ratingAggregate')
+    ratingAverage = serializers.SerializerMethodField()
+    ratingCount = serializers.SerializerMethodField()
+
     class Meta:
         model = Courses
+        exclude = ['searchVector']
+
+    def get_rating_aggregate(self, obj):
+        try:
+            return obj.ratingAggregate
+        except CourseRatingAggregate.DoesNotExist:
+            return None
+
+    def get_ratingAverage(self, obj):
+        aggregate = self.get_rating_aggregate(obj)
+        return aggregate.average if aggregate is not None else None
+
+    def get_ratingCount(self, obj):
+        aggregate = self.get_rating_aggregate(obj)
+        return aggregate.ratingCount if aggregate is not None else 0
+
+class VideoMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoMetadata
         fields = '__all__'
 
-class UploadedSerializer(serializers.ModelSerializer):
+#Columns an upload summary reads, listings load only these (never file contents)
+UPLOAD_SUMMARY_FIELDS = ['fileID', 'lessonID', 'videoURL', 'videoID', 'contentHash', 'fileSize', 'contentType']
+
+#What lesson and course listings show for an upload, the bytes are fetched from downloadURL
+class UploadedSummarySerializer(serializers.ModelSerializer):
+    kind = serializers.SerializerMethodField()
+    downloadURL = serializers.SerializerMethodField()
+    #Stored YouTube details, views put them in the context as {videoID: VideoMetadata}
+    metadata = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Uploaded
+        fields = UPLOAD_SUMMARY_FIELDS + ['kind', 'downloadURL', 'metadata']
+
+    def get_kind(self, obj):
+        if obj.videoURL:
+            return 'video'
+        return 'file' if obj.contentHash else None
+
+    def get_downloadURL(self, obj):
+        if not obj.contentHash:
+            return None
+        return reverse('download_file', args=[obj.fileID], request=self.context.get('request'))
+
+    def get_metadata(self, obj):
+        if not obj.videoID:
+            return None
+        metadata = self.context.get("video_metadata", {}).get(obj.videoID)
+        return VideoMetadataSerializer(metadata).data if metadata is not None else None
+
+class UploadedSerializer(UploadedSummarySerializer):
+    #File to attach, its bytes go to the blob store and only the hash is kept on the row
+    file = serializers.FileField(write_only=True, required=False)
+
     class Meta:
         model = Uploaded
         fields = '__all__'
+        read_only_fields = ['videoID', 'contentHash', 'fileSize', 'contentType'] # filled on save
+        validators = [] # videoID is not in the input, see validate
+
+    def validate(self, attrs):
+        # The same video can only be linked to a lesson once
+        video_url = attrs.get('videoURL', getattr(self.instance, 'videoURL', None))
+        lesson = attrs.get('lessonID', getattr(self.instance, 'lessonID', None))
+        video_id = extract_video_id(video_url) if video_url else None
+        if video_id is not None:
+            duplicates = Uploaded.objects.filter(lessonID=lesson, videoID=video_id)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError({'videoURL': 'This video is already linked to the lesson.'})
+        return attrs
+
+    #Swap an uploaded file for its blob store hash, size and content type
+    def store_file(self, validated_data):
+        file = validated_data.pop('file', None)
+        if file is not None:
+            validated_data['contentHash'], validated_data['fileSize'] = put_blob(file)
+            validated_data['contentType'] = file.content_type or 'application/octet-stream'
+        return validated_data
+
+    # The blob and the row referencing it are stored in one transaction (see put_blob)
+    def create(self, validated_data):
+        with transaction.atomic():
+            return super().create(self.store_file(validated_data))
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super().update(instance, self.store_file(validated_data))
 
 class LessonSerializer(serializers.ModelSerializer):
-    uploads = UploadedSerializer(source='uploaded_set', many=True, read_only=True)
+    uploads = UploadedSummarySerializer(source='uploaded_set', many=True, read_only=True)
     
     class Meta:
         model = Lessons
         fields = ['lessonID', 'courseID', 'lessonName', 'lessonDescription', 'uploads']
 
+#Search results, querysets are annotated with rank (see search.py)
+class CourseSearchResultSerializer(CourseSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+class LessonSearchResultSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Lessons
+        fields = ['lessonID', 'courseID', 'lessonName', 'lessonDescription', 'rank']
+
 class RatingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
@@ -43,6 +146,14 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tags
         fields = '__all__'
 
+#Autocomplete results, match is "prefix" or "similar" (see tag_suggest.py)
+class TagSuggestionSerializer(serializers.ModelSerializer):
+    match = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Tags
+        fields = ['tagID', 'tagName', 'usageCount', 'match']
+
 class TopicTagSerializer(serializers.ModelSerializer):
     class Meta:
         model = TopicTag
@@ -0,0 +1,338 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .blobstore import release_blob
+from .catalog_cache import bump_versions, course_version
+from .changes import record_changes
+from .models import Topics, Courses, CourseRatingAggregate, Lessons, Rating, Tags, TopicTag, CourseTag, LessonTag, Uploaded, CatalogChange
+from .ratings import apply_rating_deltas
+from .search import search_enabled, update_course_vectors, update_lesson_vectors
+from .tag_index import reindex_courses
+from .tag_suggest import apply_usage_deltas
+from .tasks import schedule_topic_courses_refresh, schedule_catalog_snapshot
+
+#True when a delete cascades from another model instead of being asked for directly
+def is_cascade(sender, origin=None, **kwargs):
+    return origin is not None and getattr(origin, 'model', type(origin)) is not sender
+
+#Values of the saved row the handlers below compare a save with, as {attribute: column}
+#Lessons and tag links can be moved to another course, lesson or tag, and uploads get new content
+PREVIOUS_FIELDS = {
+    Lessons: {'_previous_course_id': 'courseID'},
+    Uploaded: {'_previous_content_hash': 'contentHash', '_previous_lesson_id': 'lessonID'},
+    TopicTag: {'_previous_tag_id': 'tagID'},
+    CourseTag: {'_previous_course_id': 'courseID', '_previous_tag_id': 'tagID'},
+    LessonTag: {'_previous_lesson_id': 'lessonID', '_previous_tag_id': 'tagID'},
+}
+
+#Load the saved row once per save for all of them, None on a new row
+@receiver(pre_save, sender=Lessons)
+@receiver(pre_save, sender=Uploaded)
+@receiver(pre_save, sender=TopicTag)
+@receiver(pre_save, sender=CourseTag)
+@receiver(pre_save, sender=LessonTag)
+def remember_previous_values(sender, instance, **kwargs):
+    fields = PREVIOUS_FIELDS[sender]
+    previous = None
+    if instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).values(*fields.values()).first()
+    for attribute, column in fields.items():
+        setattr(instance, attribute, previous[column] if previous else None)
+
+# --- BLOB STORE ---
+
+#Delete a blob once no Uploaded row points at it, after the transaction commits
+def release_blob_later(content_hash):
+    transaction.on_commit(lambda: release_blob(content_hash))
+
+@receiver(post_save, sender=Uploaded)
+def release_replaced_blob(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_content_hash', None)
+    if previous and previous != instance.contentHash:
+        release_blob_later(previous)
+
+@receiver(post_delete, sender=Uploaded)
+def release_deleted_blob(sender, instance, **kwargs):
+    if instance.contentHash:
+        release_blob_later(instance.contentHash)
+
+# --- RATING AGGREGATES ---
+
+@receiver(post_save, sender=Courses)
+def create_rating_aggregate(sender, instance, created, **kwargs):
+    if created:
+        CourseRatingAggregate.objects.get_or_create(courseID=instance)
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk is not None:
+        instance._previous_rating = (
+            Rating.objects.filter(pk=instance.pk).values_list('courseID', 'rating').first()
+        )
+
+@receiver(post_save, sender=Rating)
+def count_saved_rating(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous == (instance.courseID_id, instance.rating):
+        return
+    if previous is not None:
+        apply_rating_deltas(previous[0], {previous[1]: -1})
+    apply_rating_deltas(instance.courseID_id, {instance.rating: 1})
+
+@receiver(post_delete, sender=Rating)
+def count_deleted_rating(sender, instance, **kwargs):
+    if is_cascade(sender, **kwargs):
+        return # Deleted along with its course, which takes the aggregate with it
+    apply_rating_deltas(instance.courseID_id, {instance.rating: -1})
+
+# --- SEARCH ---
+
+#Text fields that make up the search vectors, other saves leave them alone
+COURSE_SEARCH_FIELDS = {'courseName', 'courseDescription'}
+LESSON_SEARCH_FIELDS = {'lessonName', 'lessonDescription'}
+
+def changes_search_text(update_fields, search_fields):
+    return update_fields is None or bool(search_fields & set(update_fields))
+
+@receiver(post_save, sender=Courses)
+def index_course(sender, instance, update_fields=None, **kwargs):
+    if changes_search_text(update_fields, COURSE_SEARCH_FIELDS):
+        update_course_vectors([instance.pk])
+
+@receiver(post_save, sender=Lessons)
+def index_lesson(sender, instance, update_fields=None, **kwargs):
+    if changes_search_text(update_fields, LESSON_SEARCH_FIELDS):
+        update_lesson_vectors([instance.pk])
+
+#A tag link deleted along with its course or lesson, rather than its tag, needs no reindex
+def deleted_with_owner(sender, origin=None, **kwargs):
+    return is_cascade(sender, origin=origin) and getattr(origin, 'model', type(origin)) is not Tags
+
+@receiver([post_save, post_delete], sender=CourseTag)
+def index_course_tags(sender, instance, **kwargs):
+    if not deleted_with_owner(sender, **kwargs):
+        update_course_vectors([instance.courseID_id])
+
+@receiver([post_save, post_delete], sender=LessonTag)
+def index_lesson_tags(sender, instance, **kwargs):
+    if not deleted_with_owner(sender, **kwargs):
+        update_lesson_vectors([instance.lessonID_id])
+
+@receiver(post_save, sender=Tags)
+def index_renamed_tag(sender, instance, created, **kwargs):
+    if not created and search_enabled():
+        update_course_vectors(CourseTag.objects.filter(tagID=instance).values('courseID'))
+        update_lesson_vectors(LessonTag.objects.filter(tagID=instance).values('lessonID'))
+
+# --- TAG INDEX ---
+
+#Update the tag index entries of the given courses once the change is committed
+def reindex_tags(course_ids):
+    course_ids = {course_id for course_id in course_ids if course_id is not None}
+    if course_ids:
+        transaction.on_commit(lambda: reindex_courses(course_ids))
+
+#Course of each given lesson, read now while the lessons still exist
+def lesson_courses(lesson_ids):
+    return list(Lessons.objects.filter(pk__in=lesson_ids).values_list('courseID', flat=True))
+
+@receiver([post_save, post_delete], sender=Courses)
+def index_course_tags_on_publish(sender, instance, **kwargs):
+    # Covers publishing, unpublishing and deleting, only published courses are indexed
+    reindex_tags([instance.pk])
+
+@receiver(post_save, sender=Lessons)
+def index_moved_lesson(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_course_id', None)
+    if not created and previous != instance.courseID_id:
+        reindex_tags([instance.courseID_id, previous])
+
+@receiver(post_delete, sender=Lessons)
+def index_deleted_lesson(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        reindex_tags([instance.courseID_id])
+
+@receiver([post_save, post_delete], sender=CourseTag)
+def index_course_tag(sender, instance, **kwargs):
+    if not deleted_with_owner(sender, **kwargs):
+        reindex_tags([instance.courseID_id, getattr(instance, '_previous_course_id', None)])
+
+@receiver([post_save, post_delete], sender=LessonTag)
+def index_lesson_tag(sender, instance, **kwargs):
+    if not deleted_with_owner(sender, **kwargs):
+        reindex_tags(lesson_courses([instance.lessonID_id, getattr(instance, '_previous_lesson_id', None)]))
+
+# --- TAG USAGE ---
+
+@receiver(post_save, sender=TopicTag)
+@receiver(post_save, sender=CourseTag)
+@receiver(post_save, sender=LessonTag)
+def count_saved_tag_link(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_tag_id', None)
+    if created or previous != instance.tagID_id:
+        apply_usage_deltas({previous: -1, instance.tagID_id: 1})
+
+@receiver(post_delete, sender=TopicTag)
+@receiver(post_delete, sender=CourseTag)
+@receiver(post_delete, sender=LessonTag)
+def count_deleted_tag_link(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is Tags:
+        return # Deleted along with its tag, there is no count left to change
+    apply_usage_deltas({instance.tagID_id: -1})
+
+# --- TOPIC BROWSE ---
+
+def refresh_topic_courses_later():
+    transaction.on_commit(schedule_topic_courses_refresh)
+
+@receiver([post_save, post_delete], sender=TopicTag)
+@receiver([post_save, post_delete], sender=CourseTag)
+def topic_links_changed(sender, instance, **kwargs):
+    refresh_topic_courses_later()
+
+@receiver(post_save, sender=Courses)
+def course_publish_changed(sender, instance, created, update_fields=None, **kwargs):
+    # A new course is unpublished and has no tags yet
+    if not created and (update_fields is None or 'isPublished' in update_fields):
+        refresh_topic_courses_later()
+
+@receiver(post_delete, sender=Courses)
+def course_removed_from_topics(sender, instance, **kwargs):
+    refresh_topic_courses_later()
+
+# --- CATALOG RESPONSE CACHE ---
+# Also the versions of the course bundles (see course_bundle.py)
+# Rows deleted along with their parent (is_cascade) are left to the parent's handler, which bumps
+# the same versions once. A cascaded upload would otherwise look up the course of a lesson being deleted
+
+#Move the cached responses depending on the given versions to new keys once the change is committed
+def bump_catalog(names):
+    names = set(names)
+    if names:
+        transaction.on_commit(lambda: bump_versions(names))
+
+#Versions covering a course's detail and lessons, plus the course list when it shows the change
+def course_versions(course_ids, listed=False):
+    names = {course_version(course_id) for course_id in course_ids if course_id is not None}
+    if listed and names:
+        names.add("courses")
+    return names
+
+@receiver([post_save, post_delete], sender=Courses)
+def course_cache_changed(sender, instance, **kwargs):
+    bump_catalog(course_versions([instance.pk], listed=True))
+
+@receiver([post_save, post_delete], sender=Lessons)
+def lesson_cache_changed(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        bump_catalog(course_versions([instance.courseID_id, getattr(instance, '_previous_course_id', None)]))
+
+@receiver([post_save, post_delete], sender=Uploaded)
+def upload_cache_changed(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        bump_catalog(course_versions(Lessons.objects.filter(pk=instance.lessonID_id).values_list('courseID', flat=True)))
+
+@receiver([post_save, post_delete], sender=Rating)
+def rating_cache_changed(sender, instance, **kwargs):
+    # The course list and detail show the rating average and count
+    if not is_cascade(sender, **kwargs):
+        previous = getattr(instance, '_previous_rating', None)
+        bump_catalog(course_versions([instance.courseID_id, previous[0] if previous else None], listed=True))
+
+#The course bundle shows the names of the course's tags, a deleted tag takes its links along
+@receiver([post_save, post_delete], sender=CourseTag)
+def course_tag_cache_changed(sender, instance, **kwargs):
+    if not deleted_with_owner(sender, **kwargs):
+        bump_catalog(course_versions([instance.courseID_id, getattr(instance, '_previous_course_id', None)]))
+
+@receiver(post_save, sender=Tags)
+def tag_cache_renamed(sender, instance, created, **kwargs):
+    if not created:
+        bump_catalog(course_versions(CourseTag.objects.filter(tagID=instance).values_list('courseID', flat=True)))
+
+@receiver([post_save, post_delete], sender=Topics)
+def topic_cache_changed(sender, instance, **kwargs):
+    bump_catalog(["topics"])
+
+# --- CONDITIONAL GET ---
+
+#Lessons show their uploads, so an upload change moves the lesson's updatedAt too (see conditional.py)
+@receiver([post_save, post_delete], sender=Uploaded)
+def touch_upload_lessons(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        lesson_ids = {instance.lessonID_id, getattr(instance, '_previous_lesson_id', None)} - {None}
+        Lessons.objects.filter(pk__in=lesson_ids).update(updatedAt=timezone.now())
+
+# --- CHANGE LOG ---
+
+@receiver(post_save, sender=Topics)
+@receiver(post_save, sender=Courses)
+@receiver(post_save, sender=Lessons)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=TopicTag)
+@receiver(post_save, sender=CourseTag)
+@receiver(post_save, sender=LessonTag)
+@receiver(post_save, sender=Uploaded)
+def log_saved_row(sender, instance, created, **kwargs):
+    record_changes(sender, [instance.pk], CatalogChange.ACTION_CREATED if created else CatalogChange.ACTION_UPDATED)
+
+@receiver(post_delete, sender=Topics)
+@receiver(post_delete, sender=Courses)
+@receiver(post_delete, sender=Lessons)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=TopicTag)
+@receiver(post_delete, sender=CourseTag)
+@receiver(post_delete, sender=LessonTag)
+@receiver(post_delete, sender=Uploaded)
+def log_deleted_row(sender, instance, **kwargs):
+    record_changes(sender, [instance.pk], CatalogChange.ACTION_DELETED)
+
+#Courses show their rating totals
+@receiver([post_save, post_delete], sender=Rating)
+def log_rated_courses(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        previous = getattr(instance, '_previous_rating', None)
+        record_changes(Courses, [instance.courseID_id, previous[0] if previous else None], CatalogChange.ACTION_UPDATED)
+
+#Lessons show their uploads
+@receiver([post_save, post_delete], sender=Uploaded)
+def log_upload_lessons(sender, instance, **kwargs):
+    if not is_cascade(sender, **kwargs):
+        previous = getattr(instance, '_previous_lesson_id', None)
+        record_changes(Lessons, [instance.lessonID_id, previous], CatalogChange.ACTION_UPDATED)
+
+#Tags show how many links use them
+@receiver([post_save, post_delete], sender=TopicTag)
+@receiver([post_save, post_delete], sender=CourseTag)
+@receiver([post_save, post_delete], sender=LessonTag)
+def log_linked_tags(sender, instance, created=None, origin=None, **kwargs):
+    previous = getattr(instance, '_previous_tag_id', None)
+    if created is False and previous == instance.tagID_id:
+        return # Saved without changing its tag
+    if getattr(origin, 'model', type(origin)) is Tags:
+        return # Deleted along with its tag
+    record_changes(Tags, [instance.tagID_id, previous], CatalogChange.ACTION_UPDATED)
+
+# --- CATALOG SNAPSHOT ---
+
+#Queue a snapshot build once the change is committed, writes close together share one build
+def rebuild_catalog_snapshot_later():
+    transaction.on_commit(schedule_catalog_snapshot)
+
+@receiver([post_save, post_delete], sender=Courses)
+@receiver([post_save, post_delete], sender=Lessons)
+@receiver([post_save, post_delete], sender=Uploaded)
+@receiver([post_save, post_delete], sender=Rating)
+@receiver([post_save, post_delete], sender=CourseTag)
+def snapshot_rows_changed(sender, instance, **kwargs):
+    rebuild_catalog_snapshot_later()
+
+@receiver(post_save, sender=Tags)
+def snapshot_tag_renamed(sender, instance, created, **kwargs):
+    if not created:
+        rebuild_catalog_snapshot_later()
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+logger = logging.getLogger("django")
+
+"""
+Spooling of uploaded videos to storage shared by the web and celery containers.
+Instead of pushing file bytes through Redis, the web tier saves the file here and
+enqueues a small handle (a plain dict so it stays JSON serializable for Celery):
+- path: name of the spooled file inside the spool storage
+- size: size of the file in bytes
+- sha256: hex digest of the file contents
+- filename: original name of the uploaded file
+- content_type: content type given by the client
+"""
+
+#Storage backend is swappable through settings.UPLOAD_SPOOL_STORAGE (BACKEND + OPTIONS)
+@lru_cache(maxsize=None)
+def get_spool_storage():
+    config = settings.UPLOAD_SPOOL_STORAGE
+    storage_class = import_string(config["BACKEND"])
+    return storage_class(**config.get("OPTIONS", {}))
+
+#Wraps an uploaded file so the checksum is computed while storage reads it
+class _HashingFile(File):
+    def __init__(self, file):
+        super().__init__(file, name=file.name)
+        self.sha256 = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.sha256.update(chunk)
+            yield chunk
+
+def _spool_name(filename):
+    extension = os.path.splitext(get_valid_filename(filename or ""))[1][:10]
+    return f"{uuid.uuid4().hex}{extension}"
+
+#Raised while a request body is being read once it goes past settings.UPLOAD_MAX_SIZE
+class UploadTooLarge(Exception):
+    pass
+
+#Upload handler that streams multipart file data to disk in fixed-size chunks,
+#hashing it on the way in and refusing bodies larger than settings.UPLOAD_MAX_SIZE
+#before they are read. Only one chunk is in memory at a time.
+class SpoolingUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = settings.UPLOAD_SPOOL_CHUNK_SIZE
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        #Content-Length covers the whole body so this rejects oversized uploads up front
+        if content_length > settings.UPLOAD_MAX_SIZE:
+            raise UploadTooLarge(f"Upload of {content_length} bytes is over the {settings.UPLOAD_MAX_SIZE} byte limit")
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_SIZE:
+            self.upload_interrupted()
+            raise UploadTooLarge(f"Upload is over the {settings.UPLOAD_MAX_SIZE} byte limit")
+        self.sha256.update(raw_data)
+        super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+#Save an uploaded file to the spool, returning the handle to enqueue
+def spool_upload(file):
+    storage = get_spool_storage()
+    if getattr(file, "sha256", None):
+        #Already hashed by SpoolingUploadHandler, filesystem storage just moves the temp file
+        path = storage.save(_spool_name(file.name), file)
+        sha256 = file.sha256
+    else:
+        hashing_file = _HashingFile(file)
+        path = storage.save(_spool_name(file.name), hashing_file)
+        sha256 = hashing_file.sha256.hexdigest()
+    handle = {
+        "path": path,
+        "size": storage.size(path),
+        "sha256": sha256,
+        "filename": file.name,
+        "content_type": getattr(file, "content_type", None) or "video/mp4",
+    }
+    logger.debug(f"Spooled_Upload : {handle}")
+    return handle
+
+#Open a spooled file for binary reading, making sure it is the file that was enqueued
+def open_spooled(handle):
+    storage = get_spool_storage()
+    size = storage.size(handle["path"])
+    if size != handle["size"]:
+        raise ValueError(f"Spooled file {handle['path']} is {size} bytes, expected {handle['size']}")
+    return storage.open(handle["path"], "rb")
+
+#Remove a spooled file once it is no longer needed, never raising
+def discard_spooled(handle):
+    if not handle:
+        return
+    try:
+        get_spool_storage().delete(handle["path"])
+        logger.debug(f"Discarded_Spooled_Upload : {handle['path']}")
+    except Exception as e:
+        logger.error(f"Failed to discard spooled upload {handle}: {e}")
@@ -0,0 +1,232 @@
+import logging
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Courses, CourseTag, LessonTag
+
+logger = logging.getLogger("django")
+
+"""
+Inverted index of tags to published courses, used by /courses/by-tags/ to filter and facet
+without joining CourseTag per request. It lives in Redis (TAG_INDEX_URL) as sets, under the
+generation named by tags:index:generation:
+- tags:index:<generation>:tag:<tagID>: IDs of the published courses carrying the tag
+- tags:index:<generation>:course:<courseID>: IDs of the tags a published course carries
+A course carries a tag through its own CourseTag rows or the LessonTag rows of its lessons.
+The signal handlers in signals.py call reindex_courses after every commit that changes a
+course, a lesson's course or a tag link. It recomputes those courses' tag sets from the
+database and applies the difference in one Lua script per course (REINDEX_SCRIPT), reading
+the indexed set and rewriting both sides at once, so concurrent reindexes of a course never
+leave it in a tag set its course set does not list. The last one to run wins, and the next
+change to the course corrects an older read that ran last.
+build_tag_index writes a new generation next to the live one and swaps it in atomically.
+Courses reindexed while it runs are recorded in tags:index:changed and reindexed into the new
+generation after the swap, so no update committed during a rebuild is lost. The old generation
+expires shortly after, giving requests that already read its name time to finish.
+The rebuild_tag_index task runs it at startup (entrypoint.sh), from celery-beat as a safety net,
+and whenever a request finds the index missing. Until then, or while Redis is down, requests
+are answered from the database.
+"""
+
+TAG_INDEX_GENERATION_KEY = "tags:index:generation"
+TAG_INDEX_NEXT_GENERATION_KEY = "tags:index:next-generation"
+TAG_INDEX_BUILDING_KEY = "tags:index:building"
+TAG_INDEX_CHANGED_KEY = "tags:index:changed"
+TAG_INDEX_REBUILD_KEY = "tags:index:rebuild-queued"
+TAG_INDEX_LOCK_KEY = "tags:rebuild-lock"
+#Courses written per pipeline by build_tag_index
+BUILD_BATCH_SIZE = 1000
+#Seconds a replaced generation stays readable
+OLD_GENERATION_TTL = 60
+
+#KEYS: generation, building, changed. ARGV: course ID, then the IDs of the tags it carries now
+#Applies the difference to the live generation, and records the course while a rebuild runs
+REINDEX_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SADD', KEYS[3], ARGV[1])
+end
+local generation = redis.call('GET', KEYS[1])
+if not generation then
+    return 0
+end
+local prefix = 'tags:index:' .. generation .. ':'
+local course_key = prefix .. 'course:' .. ARGV[1]
+local current = {}
+for i = 2, #ARGV do
+    current[ARGV[i]] = true
+end
+for _, tag_id in ipairs(redis.call('SMEMBERS', course_key)) do
+    if not current[tag_id] then
+        redis.call('SREM', prefix .. 'tag:' .. tag_id, ARGV[1])
+    end
+end
+redis.call('DEL', course_key)
+for i = 2, #ARGV do
+    redis.call('SADD', prefix .. 'tag:' .. ARGV[i], ARGV[1])
+    redis.call('SADD', course_key, ARGV[i])
+end
+return 1
+"""
+
+#KEYS: generation. ARGV: SINTER or SUNION, then tag IDs. Returns false or [generation, course IDs]
+FILTER_SCRIPT = """
+local generation = redis.call('GET', KEYS[1])
+if not generation then
+    return false
+end
+local keys = {}
+for i = 2, #ARGV do
+    keys[#keys + 1] = 'tags:index:' .. generation .. ':tag:' .. ARGV[i]
+end
+return {generation, redis.call(ARGV[1], unpack(keys))}
+"""
+
+class TagIndexNotBuilt(Exception):
+    pass
+
+def _tag_key(generation, tag_id):
+    return f"tags:index:{generation}:tag:{tag_id}"
+
+def _course_key(generation, course_id):
+    return f"tags:index:{generation}:course:{course_id}"
+
+@lru_cache(maxsize=None)
+def tag_index():
+    return redis.Redis.from_url(settings.TAG_INDEX_URL)
+
+@lru_cache(maxsize=None)
+def _script(source):
+    return tag_index().register_script(source)
+
+#{course_id: set of tag IDs} for published courses (all, or those in course_ids), from the database
+def course_tag_sets(course_ids=None):
+    course_tags = CourseTag.objects.filter(courseID__isPublished=True)
+    lesson_tags = LessonTag.objects.filter(lessonID__courseID__isPublished=True)
+    if course_ids is not None:
+        course_tags = course_tags.filter(courseID__in=course_ids)
+        lesson_tags = lesson_tags.filter(lessonID__courseID__in=course_ids)
+    tag_sets = defaultdict(set)
+    for course_id, tag_id in course_tags.values_list('courseID', 'tagID').iterator():
+        tag_sets[course_id].add(tag_id)
+    for course_id, tag_id in lesson_tags.values_list('lessonID__courseID', 'tagID').iterator():
+        tag_sets[course_id].add(tag_id)
+    return tag_sets
+
+#Bring the index entries of course_ids in line with the database, never raising
+def reindex_courses(course_ids):
+    course_ids = sorted({course_id for course_id in course_ids if course_id is not None})
+    if not course_ids:
+        return
+    try:
+        tag_sets = course_tag_sets(course_ids)
+        reindex = _script(REINDEX_SCRIPT)
+        keys = [TAG_INDEX_GENERATION_KEY, TAG_INDEX_BUILDING_KEY, TAG_INDEX_CHANGED_KEY]
+        with tag_index().pipeline(transaction=False) as pipe:
+            for course_id in course_ids:
+                reindex(keys=keys, args=[course_id, *sorted(tag_sets.get(course_id, ()))], client=pipe)
+            pipe.execute()
+        logger.debug(f"Tag_Index_Reindexed : {course_ids}")
+    except redis.RedisError as e:
+        logger.error(f"Tag index update failed for courses {course_ids}: {e}")
+
+#Write the whole index from the database as a new generation and swap it in
+#Returns the number of published courses with tags. Callers hold the rebuild lock (see tasks.rebuild_tag_index)
+def build_tag_index():
+    client = tag_index()
+    generation = client.incr(TAG_INDEX_NEXT_GENERATION_KEY)
+    # Courses reindexed from here on are reindexed again once the new generation is live,
+    # changes committed before are in the snapshot below
+    with client.pipeline() as pipe:
+        pipe.delete(TAG_INDEX_CHANGED_KEY)
+        pipe.set(TAG_INDEX_BUILDING_KEY, generation, ex=settings.TAG_INDEX_LOCK_SECONDS)
+        pipe.execute()
+    tag_sets = course_tag_sets()
+
+    courses_by_tag = defaultdict(list)
+    course_ids = list(tag_sets)
+    for start in range(0, len(course_ids), BUILD_BATCH_SIZE):
+        with client.pipeline(transaction=False) as pipe:
+            for course_id in course_ids[start:start + BUILD_BATCH_SIZE]:
+                pipe.sadd(_course_key(generation, course_id), *tag_sets[course_id])
+                for tag_id in tag_sets[course_id]:
+                    courses_by_tag[tag_id].append(course_id)
+            pipe.execute()
+    tag_ids = list(courses_by_tag)
+    for start in range(0, len(tag_ids), BUILD_BATCH_SIZE):
+        with client.pipeline(transaction=False) as pipe:
+            for tag_id in tag_ids[start:start + BUILD_BATCH_SIZE]:
+                pipe.sadd(_tag_key(generation, tag_id), *courses_by_tag[tag_id])
+            pipe.execute()
+
+    # One MULTI: requests and reindexes move to the new generation together
+    with client.pipeline() as pipe:
+        pipe.get(TAG_INDEX_GENERATION_KEY)
+        pipe.set(TAG_INDEX_GENERATION_KEY, generation)
+        pipe.delete(TAG_INDEX_BUILDING_KEY)
+        pipe.smembers(TAG_INDEX_CHANGED_KEY)
+        pipe.delete(TAG_INDEX_CHANGED_KEY)
+        previous, _, _, changed, _ = pipe.execute()
+    reindex_courses(int(course_id) for course_id in changed)
+
+    if previous is not None:
+        expire_generation(previous.decode())
+    client.delete(TAG_INDEX_REBUILD_KEY)
+    logger.debug(f"Tag_Index_Built : {len(tag_sets)} : generation {generation} : {len(changed)} changed during the build")
+    return len(tag_sets)
+
+#Let the keys of a replaced generation expire after OLD_GENERATION_TTL seconds
+def expire_generation(generation):
+    client = tag_index()
+    keys = list(client.scan_iter(match=f"tags:index:{generation}:*", count=BUILD_BATCH_SIZE))
+    for start in range(0, len(keys), BUILD_BATCH_SIZE):
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys[start:start + BUILD_BATCH_SIZE]:
+                pipe.expire(key, OLD_GENERATION_TTL)
+            pipe.execute()
+
+#True for the first caller asking for a rebuild while none is queued, so requests queue it once
+def claim_rebuild():
+    return bool(tag_index().set(TAG_INDEX_REBUILD_KEY, 1, nx=True, ex=settings.TAG_INDEX_LOCK_SECONDS))
+
+#Most common tags among the matches, besides the ones asked for, as [(tag_id, course count)]
+def tag_facets(tag_sets, tag_ids):
+    counts = Counter(tag_id for tags in tag_sets.values() for tag_id in tags if tag_id not in tag_ids)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:settings.TAG_FACET_LIMIT]
+
+#Published courses carrying all (match_all) or any of tag_ids, as (set of course IDs, facets)
+#Raises TagIndexNotBuilt, or redis.RedisError when Redis is unavailable
+def filter_courses(tag_ids, match_all=True):
+    found = _script(FILTER_SCRIPT)(
+        keys=[TAG_INDEX_GENERATION_KEY],
+        args=["SINTER" if match_all else "SUNION", *tag_ids]
+    )
+    if not found:
+        raise TagIndexNotBuilt()
+    generation, matches = found
+    generation = generation.decode()
+    course_ids = sorted(int(course_id) for course_id in matches)
+
+    with tag_index().pipeline(transaction=False) as pipe:
+        for course_id in course_ids:
+            pipe.smembers(_course_key(generation, course_id))
+        tag_sets = {
+            course_id: {int(tag_id) for tag_id in tags}
+            for course_id, tags in zip(course_ids, pipe.execute())
+        }
+    return set(course_ids), tag_facets(tag_sets, set(tag_ids))
+
+#filter_courses answered from the database, reading only the courses carrying one of tag_ids
+def filter_courses_from_database(tag_ids, match_all=True):
+    tag_ids = set(tag_ids)
+    candidates = Courses.objects.filter(
+        Q(coursetag__tagID__in=tag_ids) | Q(lessons__lessontag__tagID__in=tag_ids)
+    ).values('pk')
+    tag_sets = {
+        course_id: tags for course_id, tags in course_tag_sets(candidates).items()
+        if (tag_ids <= tags if match_all else tag_ids & tags)
+    }
+    return set(tag_sets), tag_facets(tag_sets, tag_ids)
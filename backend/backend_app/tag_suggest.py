@@ -0,0 +1,73 @@
+import logging
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
+
+from .models import Tags, TopicTag, CourseTag, LessonTag
+from .search import search_enabled
+
+logger = logging.getLogger("django")
+
+"""
+Tag autocomplete for /tags/suggest/, so authors pick an existing tag instead of creating a near duplicate.
+- Prefix matches come first, most used first. Tags.usageCount counts the TopicTag, CourseTag and
+  LessonTag rows using the tag, kept up to date by the signal handlers in signals.py and rebuilt
+  with the rebuild_tag_usage command
+- The rest are fuzzy matches, most similar first (pg_trgm, at least pg_trgm.similarity_threshold)
+On PostgreSQL both are served by one trigram GIN index on UPPER(tagName), which answers the
+case insensitive LIKE 'text%' and the % similarity operator without scanning the table.
+Other databases (SQLite in development) use plain substring matches instead of fuzzy ones.
+"""
+
+TAG_LINK_MODELS = (TopicTag, CourseTag, LessonTag)
+
+#Change the usage counts of tags, {tag_id: change in number of links}
+def apply_usage_deltas(deltas):
+    for tag_id, change in deltas.items():
+        if tag_id is not None and change:
+            Tags.objects.filter(pk=tag_id).update(usageCount=F('usageCount') + change, updatedAt=timezone.now())
+
+#Number of links to the outer tag across the tag link tables
+def usage_count(link_models=TAG_LINK_MODELS):
+    counts = [
+        Coalesce(
+            Subquery(
+                link_model.objects.filter(tagID=OuterRef('pk')).order_by().values('tagID')
+                .annotate(links=Count('pk')).values('links')
+            ),
+            Value(0),
+            output_field=IntegerField()
+        )
+        for link_model in link_models
+    ]
+    return sum(counts[1:], counts[0])
+
+#Recount every tag's usage from the link tables in one UPDATE, returns the number of tags
+def rebuild_tag_usage():
+    return Tags.objects.update(usageCount=usage_count(), updatedAt=timezone.now())
+
+#Up to limit tags for the typed text, each with match set to "prefix" or "similar"
+def suggest_tags(text, limit):
+    matches = list(Tags.objects.filter(tagName__istartswith=text).order_by('-usageCount', 'tagName')[:limit])
+    for tag in matches:
+        tag.match = "prefix"
+    if len(matches) >= limit:
+        return matches
+
+    others = Tags.objects.exclude(pk__in=[tag.pk for tag in matches])
+    if search_enabled():
+        # Upper so the filter reads the UPPER(tagName) trigram index, similarity itself ignores case
+        others = (
+            others.annotate(upper_name=Upper('tagName'))
+            .filter(upper_name__trigram_similar=text.upper())
+            .annotate(similarity=TrigramSimilarity('tagName', text))
+            .order_by('-similarity', '-usageCount', 'tagName')
+        )
+    else:
+        others = others.filter(tagName__icontains=text).order_by('-usageCount', 'tagName')
+    for tag in others[:limit - len(matches)]:
+        tag.match = "similar"
+        matches.append(tag)
+    return matches
@@ -1,8 +1,22 @@
-import base64
 import logging
-from .models import Uploaded, Lessons
+import time
+from datetime import timedelta
+from .models import Uploaded, Lessons, UploadJob, VideoMetadata, CatalogChange
+from .spool import open_spooled, discard_spooled
+from .youtube import youtube_client, extract_video_id, parse_video
+from .video_cache import invalidate_for_token
+from .ratings import rating_buffer, drain_rating_batch, buffered_rating_count, DrainLockLost, RATING_DRAIN_LOCK_KEY
+from .tag_index import tag_index, build_tag_index, TAG_INDEX_LOCK_KEY
+from .changes import compact_changes, record_changes
+from .catalog_cache import bump_versions, course_version
+from . import topic_browse, catalog_snapshot
 from celery import shared_task
+from redis.exceptions import LockError
 import requests
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
 from dotenv import load_dotenv
 from django.conf import settings
 
@@ -11,19 +25,21 @@ load_dotenv()
 
 @shared_task
 def link_uploaded(lesson_id, video_url):
-    if "https://www.youtube.com/watch?v=" not in video_url and "https://youtu.be/" not in video_url:
+    video_id = extract_video_id(video_url)
+    if ("https://www.youtube.com/watch?v=" not in video_url and "https://youtu.be/" not in video_url) or video_id is None:
         logger.debug("Improperly formatted youtube link")
         return 13 # Data Invalid
 
     lesson = Lessons.objects.get(lessonID=lesson_id)
-    upload = Uploaded.objects.create(lessonID=lesson, videoURL=video_url)
-    logger.debug(f"Upload_Status {upload}")
+    #Linking a video the lesson already has is a no-op
+    upload, created = Uploaded.objects.get_or_create(lessonID=lesson, videoID=video_id, defaults={"videoURL": video_url})
+    logger.debug(f"Upload_Status {upload} : Created : {created}")
     return 0 #good
 
 @shared_task
 def ensure_playlist_exists(playlist_name, access_token):
     #Create a header for auth and type for multi-use
-    url="https://youtube.googleapis.com/youtube/v3/playlists"
+    url="/youtube/v3/playlists"
     headers={
         "Authorization":f"Bearer {access_token}", #Use our ClientID with UserAuth
         "Accept": "application/json"
@@ -54,7 +70,7 @@ def ensure_playlist_exists(playlist_name, access_token):
     )
     '''
 
-    playlist_response = requests.get(
+    playlist_response = youtube_client().get(
         url,
         headers=headers,
         params=params
@@ -93,14 +109,15 @@ def ensure_playlist_exists(playlist_name, access_token):
                 }
             }
 
-            #create playlist with post
-            playlist_create_response = requests.post(
-                "https://www.googleapis.com/youtube/v3/playlists",
+            #create playlist with post, not retried so a slow response cannot create it twice
+            playlist_create_response = youtube_client().post(
+                "/youtube/v3/playlists",
                 params={
                     "part":"snippet, status"
                 },
                 headers=headers,
-                json=data
+                json=data,
+                retry=False
             )
 
             if playlist_create_response.status_code == 200:
@@ -110,109 +127,518 @@ def ensure_playlist_exists(playlist_name, access_token):
     logger.debug(f"Playlist_ID : {playlist_id}")
     return playlist_id
 
-@shared_task
-def upload_to_youtube(file_base64, file_size, title, description, access_token, lesson_id, playlist):
-    if(lesson_id is None):
-        return "Error lesson id none"
-    try:
-        # https://developers.google.com/youtube/v3/docs/videos/insert#.net
-        # Documentations on insert/upload YT functionality
-        metadata = {
-            "snippet":{
-                "title":title,
-                "description":description,
-                "tags":["Test"], #Will need to swap out for user provided course tags CHANGE
-                "categoryId": "27", #educational lock
-            },
-            "status":{
-                "madeForKids":False, #Might not function as intended anymore CHANGE
-                "privacyStatus": "public",
-            }
-        }
-        headers = {
-            "Authorization":f"Bearer {access_token}" #Use our ClientID with UserAuth
+#YouTube requires every chunk but the last to be a multiple of 256 KiB
+RESUMABLE_CHUNK_UNIT = 256 * 1024
+
+#Raised for upload failures worth retrying later (network errors, 5xx, expired sessions)
+class RetryableUploadError(Exception):
+    pass
+
+#Chunk size for resumable uploads, 0 sends the whole file as one streamed request
+def get_upload_chunk_size():
+    chunk_size = int(settings.YOUTUBE_UPLOAD_CHUNK_SIZE)
+    if chunk_size < 0 or chunk_size % RESUMABLE_CHUNK_UNIT != 0:
+        raise ValueError(f"YOUTUBE_UPLOAD_CHUNK_SIZE must be a multiple of {RESUMABLE_CHUNK_UNIT} bytes, got {chunk_size}")
+    return chunk_size
+
+#Next byte to send from the Range header of a 308 (resume incomplete) response
+def next_upload_offset(response):
+    range_header = response.headers.get("Range")
+    if not range_header:
+        return 0 #Nothing committed yet
+    return int(range_header.rsplit("-", 1)[1]) + 1
+
+#Ask YouTube how much of a resumable session it has, returns the raw response
+#308 means incomplete (see next_upload_offset), 200/201 means already finished
+def query_upload_status(resumable_url, file_size):
+    return youtube_client().put(
+        resumable_url,
+        headers={
+            "Content-Length": "0",
+            "Content-Range": f"bytes */{file_size}"
         }
+    )
 
-        #Post request to youtube to get resumable URL
-        init_response = requests.post(
-            "https://www.googleapis.com/upload/youtube/v3/videos",
-            params={
-                "part":"snippet, status", 
-                "uploadType":"resumable"
-            },
-            headers=headers,
-            json=metadata
-        )
+#Send file_data to a resumable session url starting at offset, returns the final response
+#Only one chunk is held in memory at a time so worker memory is flat regardless of file size
+#on_progress is called with the committed offset after every chunk
+#Chunks are not retried by the client, a failed chunk is resumed by upload_to_youtube instead
+def send_resumable_upload(resumable_url, file_data, file_size, content_type, offset=0, chunk_size=None, on_progress=None):
+    if chunk_size is None:
+        chunk_size = get_upload_chunk_size()
+    client = youtube_client()
+    timeout = (settings.YOUTUBE_CONNECT_TIMEOUT, settings.YOUTUBE_UPLOAD_TIMEOUT)
 
-        if init_response.status_code != 200:
-            raise Exception(f"Error intiating upload: {init_response.text}")
-        resumable_url = init_response.headers['Location']
+    if chunk_size == 0:
+        #Streaming mode, requests reads the file object in small blocks
+        file_data.seek(offset)
+        headers = {"Content-Type": content_type, "Content-Length": str(file_size - offset)}
+        if offset:
+            headers["Content-Range"] = f"bytes {offset}-{file_size - 1}/{file_size}"
+        return client.put(resumable_url, headers=headers, data=file_data, timeout=timeout, retry=False)
 
-        #decode b64 to binary
-        file_data = base64.b64decode(file_base64)
-        #Use resumable URL to upload video binary data
-        upload_response = requests.put(
+    while True:
+        file_data.seek(offset)
+        chunk = file_data.read(chunk_size)
+        end = offset + len(chunk) - 1
+        response = client.put(
             resumable_url,
             headers={
-                "Content-Type": "video/mp4",
-                "Content-Length": str(file_size)
+                "Content-Type": content_type,
+                "Content-Length": str(len(chunk)),
+                "Content-Range": f"bytes {offset}-{end}/{file_size}" if chunk else f"bytes */{file_size}"
             },
-            data=file_data
+            data=chunk,
+            timeout=timeout,
+            retry=False
         )
+        if response.status_code != 308:
+            return response
+
+        new_offset = next_upload_offset(response)
+        logger.debug(f"Upload_Progress : {new_offset}/{file_size}")
+        if new_offset >= file_size or not chunk:
+            raise RetryableUploadError(f"Upload stalled at byte {new_offset} of {file_size}")
+        offset = new_offset
+        if on_progress is not None:
+            on_progress(offset)
+
+#Start a new resumable session for the job, storing the session URI before sending any bytes
+def start_upload_session(job, metadata, headers):
+    #Post request to youtube to get resumable URL
+    init_response = youtube_client().post(
+        "/upload/youtube/v3/videos",
+        params={
+            "part":"snippet, status", 
+            "uploadType":"resumable"
+        },
+        headers=headers,
+        json=metadata
+    )
+
+    if init_response.status_code >= 500:
+        raise RetryableUploadError(f"Error intiating upload: {init_response.text}")
+    if init_response.status_code != 200:
+        raise Exception(f"Error intiating upload: {init_response.text}")
+
+    job.sessionURL = init_response.headers['Location']
+    job.bytesSent = 0
+    job.status = UploadJob.STATUS_UPLOADING
+    job.save(update_fields=["sessionURL", "bytesSent", "status", "updatedAt"])
+
+#Find where an existing session left off, returns (offset, finished response or None)
+#Drops the session from the job when YouTube no longer knows it so a new one is started
+def resume_upload_session(job):
+    status_response = query_upload_status(job.sessionURL, job.fileSize)
+    if status_response.status_code in (200, 201):
+        return job.fileSize, status_response
+    if status_response.status_code == 308:
+        return next_upload_offset(status_response), None
+    if status_response.status_code in (404, 410):
+        logger.debug(f"Upload_Session_Expired : {job}")
+        job.sessionURL = None
+        job.bytesSent = 0
+        job.save(update_fields=["sessionURL", "bytesSent", "updatedAt"])
+        return 0, None
+    raise RetryableUploadError(f"Error checking upload status: {status_response.status_code}")
+
+#Result code of an upload whose job another attempt is still running
+UPLOAD_IN_PROGRESS = 4
+
+#Raised when another delivery of the same upload holds the job's lease
+class UploadLeaseHeld(Exception):
+    pass
+
+#One attempt at sending a spooled video and linking it to the lesson, returns the upload result code
+#Raises UploadLeaseHeld while another attempt owns the job, and RetryableUploadError or a requests error
+#when a later attempt can continue from the committed byte. The spooled file is left to the caller
+def attempt_youtube_upload(upload_handle, title, description, access_token, lesson_id, playlist):
+    job, created = UploadJob.objects.get_or_create(
+        spoolPath=upload_handle["path"],
+        defaults={"lessonID_id": int(lesson_id), "fileSize": upload_handle["size"]}
+    )
+    logger.debug(f"Upload_Job : {job} : Created : {created}")
+    if job.status == UploadJob.STATUS_COMPLETE:
+        #Redelivered after the upload already finished
+        return 0
+
+    lease = timedelta(seconds=settings.YOUTUBE_UPLOAD_LEASE_SECONDS)
+    if not created and job.status == UploadJob.STATUS_UPLOADING and timezone.now() - job.updatedAt < lease:
+        raise UploadLeaseHeld(f"Upload job {job.jobID} is held by another attempt")
+
+    # https://developers.google.com/youtube/v3/docs/videos/insert#.net
+    # Documentations on insert/upload YT functionality
+    metadata = {
+        "snippet":{
+            "title":title,
+            "description":description,
+            "tags":["Test"], #Will need to swap out for user provided course tags CHANGE
+            "categoryId": "27", #educational lock
+        },
+        "status":{
+            "madeForKids":False, #Might not function as intended anymore CHANGE
+            "privacyStatus": "public",
+        }
+    }
+    headers = {
+        "Authorization":f"Bearer {access_token}" #Use our ClientID with UserAuth
+    }
+
+    offset, upload_response = 0, None
+    if job.sessionURL:
+        offset, upload_response = resume_upload_session(job)
+        logger.debug(f"Upload_Resume_Offset : {offset}")
+    if not job.sessionURL:
+        start_upload_session(job, metadata, headers)
+
+    def save_progress(new_offset):
+        job.bytesSent = new_offset
+        job.save(update_fields=["bytesSent", "updatedAt"])
+
+    if upload_response is None:
+        save_progress(offset)
+        #Use resumable URL to upload video binary data in chunks from the spooled file
+        with open_spooled(upload_handle) as file_data:
+            upload_response = send_resumable_upload(
+                job.sessionURL,
+                file_data,
+                upload_handle["size"],
+                upload_handle["content_type"],
+                offset=offset,
+                on_progress=save_progress
+            )
+    
+    if upload_response.status_code >= 500:
+        raise RetryableUploadError(f"Error uploading video: {upload_response.text}")
+    if upload_response.status_code not in (200, 201):
+        raise Exception(f"Error uploading video: {upload_response.text}")
+
+    response_dict = upload_response.json()
+    video_id = response_dict.get("id")
+    logger.debug(f'Youtube_Link https://www.youtube.com/watch?v={video_id}')
+
+    #Record the video and finish the job together so a redelivery never links it twice
+    with transaction.atomic():
+        lesson = Lessons.objects.get(lessonID=int(lesson_id))
+        upload, _ = Uploaded.objects.get_or_create(
+            lessonID=lesson,
+            videoID=video_id,
+            defaults={"videoURL": "https://www.youtube.com/watch?v="+video_id}
+        )
+        job.status = UploadJob.STATUS_COMPLETE
+        job.bytesSent = job.fileSize
+        job.videoID = video_id
+        job.save(update_fields=["status", "bytesSent", "videoID", "updatedAt"])
+    logger.debug(f"Upload_Status {upload}")
+    #The channel's cached video list is missing the new video
+    invalidate_for_token(access_token)
+
+    #If a playlist is given
+    #CHANGE if fixing playlist feature
+    playlist = None
+    if playlist is not None and playlist != "":
+        #Get id of playlist to add to
+        playlist_id = ensure_playlist_exists(playlist_name=playlist, access_token=access_token)
+        #add uploaded video to playlist via both IDs
         
-        if upload_response.status_code != 200:
-            raise Exception(f"Error uploading video: {upload_response.text}")
-
-        response_dict = upload_response.json()
-        video_id = response_dict.get("id")
-        logger.debug(f'Youtube_Link https://www.youtube.com/watch?v={video_id}')
-
-        lesson_id = int(lesson_id)
-        lesson = Lessons.objects.get(lessonID=lesson_id)
-        upload = Uploaded.objects.create(lessonID=lesson, videoURL="https://www.youtube.com/watch?v="+video_id)
-        logger.debug(f"Upload_Status {upload}")
-
-        #If a playlist is given
-        #CHANGE if fixing playlist feature
-        playlist = None
-        if playlist is not None and playlist != "":
-            #Get id of playlist to add to
-            playlist_id = ensure_playlist_exists(playlist_name=playlist, access_token=access_token)
-            #add uploaded video to playlist via both IDs
-            
-            if playlist_id is not None:
-                #setup data
-                playlist_data = {
-                    "snippet": {
-                        "playlistId": playlist_id,
-                        "resourceId": {
-                            "kind": "youtube#video",
-                            "videoId": video_id
-                        }
+        if playlist_id is not None:
+            #setup data
+            playlist_data = {
+                "snippet": {
+                    "playlistId": playlist_id,
+                    "resourceId": {
+                        "kind": "youtube#video",
+                        "videoId": video_id
                     }
                 }
+            }
 
-                #Post video into playlist
-                playlist_response = requests.post(
-                    "https://www.googleapis.com/youtube/v3/playlistItems",
-                    params={
-                        "part": "snippet"
-                    },
-                    headers=headers,
-                    json=playlist_data
-                )
-
-                logger.debug("Playlist_Response")
-                logger.debug(playlist_response)
-
-                #Make sure work or return unique code (2)
-                if playlist_response.status_code != 200:
-                    return 2
-            else:
-                return 3
-            
-        return 0
-    
+            #Post video into playlist
+            playlist_response = youtube_client().post(
+                "/youtube/v3/playlistItems",
+                params={
+                    "part": "snippet"
+                },
+                headers=headers,
+                json=playlist_data,
+                retry=False
+            )
+
+            logger.debug("Playlist_Response")
+            logger.debug(playlist_response)
+
+            #Make sure work or return unique code (2)
+            if playlist_response.status_code != 200:
+                return 2
+        else:
+            return 3
+        
+    return 0
+
+#The attempt stopped but a later one continues the job, it is waiting again rather than uploading
+def release_upload_job(upload_handle):
+    UploadJob.objects.filter(spoolPath=upload_handle["path"]).update(status=UploadJob.STATUS_PENDING, updatedAt=timezone.now())
+
+#No attempt follows, fail the job unless it completed and remove the spooled file
+def finish_upload(upload_handle):
+    UploadJob.objects.filter(spoolPath=upload_handle["path"]).exclude(status=UploadJob.STATUS_COMPLETE).update(
+        status=UploadJob.STATUS_FAILED, updatedAt=timezone.now()
+    )
+    discard_spooled(upload_handle)
+
+#acks_late with reject_on_worker_lost puts the message back on the queue if the worker dies
+#mid upload, the UploadJob row then lets the next attempt continue from the committed byte
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def upload_to_youtube(self, upload_handle, title, description, access_token, lesson_id, playlist):
+    #upload_handle references the spooled file (see spool.py), it is removed once done
+    if(lesson_id is None):
+        discard_spooled(upload_handle)
+        return "Error lesson id none"
+
+    retrying = False
+    try:
+        return attempt_youtube_upload(upload_handle, title, description, access_token, lesson_id, playlist)
+    except UploadLeaseHeld as e:
+        #Another delivery of this task is still making progress, check back after the lease
+        retrying = True #Leave the job and spooled file to the attempt that owns them
+        logger.debug(f"Upload_Lease_Held : {str(e)}")
+        if self.request.is_eager:
+            return UPLOAD_IN_PROGRESS
+        raise self.retry(countdown=settings.YOUTUBE_UPLOAD_LEASE_SECONDS, max_retries=None)
+    except (RetryableUploadError, requests.RequestException) as e:
+        #Keep the spooled file and session, the retry continues from the committed byte
+        if self.request.retries < settings.YOUTUBE_UPLOAD_MAX_RETRIES:
+            retrying = True
+            release_upload_job(upload_handle)
+            countdown = settings.YOUTUBE_UPLOAD_RETRY_DELAY * (2 ** self.request.retries)
+            logger.debug(f"Upload_Retry {self.request.retries} in {countdown}s : {str(e)}")
+            raise self.retry(exc=e, countdown=countdown, max_retries=settings.YOUTUBE_UPLOAD_MAX_RETRIES)
+        logger.debug(f"Upload Error {str(e)}")
+        return 1
     except Exception as e:
         logger.debug(f"Upload Error {str(e)}")
         return 1
+    finally:
+        if not retrying:
+            finish_upload(upload_handle)
+
+#Upload in the web process when the task cannot be queued. Celery would wait minutes between retries,
+#here YOUTUBE_UPLOAD_SYNC_ATTEMPTS attempts follow each other after a short backoff so the request stays bounded
+def upload_to_youtube_now(upload_handle, title, description, access_token, lesson_id, playlist):
+    attempts = settings.YOUTUBE_UPLOAD_SYNC_ATTEMPTS
+    finished = True
+    try:
+        for attempt in range(attempts):
+            try:
+                return attempt_youtube_upload(upload_handle, title, description, access_token, lesson_id, playlist)
+            except (RetryableUploadError, requests.RequestException) as e:
+                logger.debug(f"Upload_Sync_Retry {attempt} : {str(e)}")
+                if attempt == attempts - 1:
+                    return 1
+                release_upload_job(upload_handle)
+                time.sleep(min(settings.YOUTUBE_BACKOFF_MAX, settings.YOUTUBE_BACKOFF * (2 ** attempt)))
+    except UploadLeaseHeld:
+        finished = False #Left to the attempt that owns the job
+        return UPLOAD_IN_PROGRESS
+    except Exception as e:
+        logger.debug(f"Upload Error {str(e)}")
+        return 1
+    finally:
+        if finished:
+            finish_upload(upload_handle)
+
+#videos.list accepts at most 50 IDs per request
+VIDEO_METADATA_BATCH_SIZE = 50
+
+#Add an empty VideoMetadata row for every linked video that does not have one yet
+def track_linked_videos():
+    untracked = list(
+        Uploaded.objects.filter(videoID__isnull=False)
+        .exclude(videoID__in=VideoMetadata.objects.values("videoID"))
+        .values_list("videoID", flat=True).distinct()
+    )
+    VideoMetadata.objects.bulk_create(
+        [VideoMetadata(videoID=video_id) for video_id in untracked],
+        ignore_conflicts=True
+    )
+    video_metadata_changed(untracked)
+
+#Bulk writes to VideoMetadata skip the signal handlers, move the cached responses of the courses showing
+#these videos and log their uploads and lessons, which show the metadata in the change feed
+def video_metadata_changed(video_ids):
+    if not video_ids:
+        return
+    uploads = list(Uploaded.objects.filter(videoID__in=video_ids).values_list("fileID", "lessonID", "lessonID__courseID"))
+    if uploads:
+        bump_versions({course_version(course_id) for _, _, course_id in uploads})
+        record_changes(Uploaded, [file_id for file_id, _, _ in uploads], CatalogChange.ACTION_UPDATED)
+        record_changes(Lessons, [lesson_id for _, lesson_id, _ in uploads], CatalogChange.ACTION_UPDATED)
+
+#Copy a parse_video dict onto a VideoMetadata row
+def apply_video_details(metadata, video):
+    metadata.title = (video["title"] or "")[:255]
+    metadata.description = video["description"] or ""
+    metadata.thumbnailURL = video["thumbnail_url"]
+    metadata.channelID = video["channel_id"]
+    metadata.channelTitle = video["channel_title"]
+    metadata.publishedAt = parse_datetime(video["published_at"]) if video["published_at"] else None
+    metadata.duration = video["duration"]
+    metadata.viewCount = int(video["view_count"] or 0)
+    metadata.likeCount = int(video["like_count"] or 0)
+    metadata.commentCount = int(video["comment_count"] or 0)
+    metadata.privacyStatus = video["privacy_status"]
+    metadata.embeddable = video["embeddable"]
+    metadata.available = True
+
+#Refresh up to max_batches batches of the stalest video metadata, 50 videos per API call
+#Run by celery-beat (CELERY_BEAT_SCHEDULE) with the server API key, no user token needed
+@shared_task
+def refresh_video_metadata(max_batches=None):
+    if not settings.YOUTUBE_API_KEY:
+        logger.debug("Video_Metadata_Skipped : No YOUTUBE_API_KEY")
+        return 0
+    max_batches = max_batches or settings.VIDEO_METADATA_REFRESH_BATCHES
+
+    track_linked_videos()
+    stale_before = timezone.now() - timedelta(seconds=settings.VIDEO_METADATA_MAX_AGE)
+    stalest = list(
+        VideoMetadata.objects
+        .filter(Q(fetchedAt__isnull=True) | Q(fetchedAt__lt=stale_before))
+        .order_by(F("fetchedAt").asc(nulls_first=True))[:max_batches * VIDEO_METADATA_BATCH_SIZE]
+    )
+
+    refreshed = 0
+    for start in range(0, len(stalest), VIDEO_METADATA_BATCH_SIZE):
+        batch = {metadata.videoID: metadata for metadata in stalest[start:start + VIDEO_METADATA_BATCH_SIZE]}
+        response = youtube_client().get(
+            "/youtube/v3/videos",
+            params={
+                "part": "snippet,contentDetails,statistics,status",
+                "id": ",".join(batch),
+                "key": settings.YOUTUBE_API_KEY
+            },
+            headers={"Accept": "application/json"}
+        )
+        if response.status_code != 200:
+            #Quota or key problem, the rest stays stale until the next run
+            logger.error(f"Video metadata refresh failed: {response.status_code} {response.text}")
+            break
+
+        fetched_at = timezone.now()
+        found = {video["id"]: video for video in map(parse_video, response.json().get("items", []))}
+        for video_id, metadata in batch.items():
+            if video_id in found:
+                apply_video_details(metadata, found[video_id])
+            else:
+                metadata.available = False
+            metadata.fetchedAt = fetched_at
+        VideoMetadata.objects.bulk_update(batch.values(), [
+            "title", "description", "thumbnailURL", "channelID", "channelTitle", "publishedAt", "duration",
+            "viewCount", "likeCount", "commentCount", "privacyStatus", "embeddable", "available", "fetchedAt"
+        ])
+        video_metadata_changed(list(batch))
+        refreshed += len(batch)
+
+    logger.debug(f"Video_Metadata_Refreshed : {refreshed}")
+    return refreshed
+
+#Write buffered ratings (see ratings.py) until the buffer is empty or max_batches batches were written
+#Queued by RatingViewAll.create when it buffers into an empty list, and by celery-beat as a safety net
+@shared_task
+def drain_rating_buffer(max_batches=None):
+    lock = rating_buffer().lock(RATING_DRAIN_LOCK_KEY, timeout=settings.RATING_BUFFER_LOCK_SECONDS)
+    if not lock.acquire(blocking=False):
+        logger.debug("Rating_Buffer_Drain_Skipped : Another drain is running")
+        return 0
+
+    written = 0
+    lost = False
+    try:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            # Every batch starts with the full lock time, a lock that already expired stops the drain
+            lock.extend(settings.RATING_BUFFER_LOCK_SECONDS, replace_ttl=True)
+            count, dropped = drain_rating_batch(settings.RATING_BUFFER_BATCH_SIZE, lock)
+            if not count and not dropped:
+                break
+            written += count
+            batches += 1
+    except (LockError, DrainLockLost) as e:
+        # Another drain may own the buffer now, it carries on from the last committed batch
+        logger.error(f"Rating buffer drain stopped after losing its lock: {e}")
+        lost = True
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            pass # Expired, the batches written so far are committed
+
+    if written:
+        schedule_catalog_snapshot() # Bulk writes skip the signal handlers
+    #Ratings pushed while the last batch was being written did not queue a drain
+    if not lost and buffered_rating_count():
+        drain_rating_buffer.apply_async(countdown=settings.RATING_BUFFER_FLUSH_DELAY)
+    return written
+
+#Rebuild the tag inverted index (see tag_index.py), returns the number of courses indexed or None if skipped
+#Run at startup, by celery-beat as a safety net and when a request finds the index missing
+@shared_task
+def rebuild_tag_index():
+    lock = tag_index().lock(TAG_INDEX_LOCK_KEY, timeout=settings.TAG_INDEX_LOCK_SECONDS)
+    if not lock.acquire(blocking=False):
+        logger.debug("Tag_Index_Rebuild_Skipped : Another rebuild is running")
+        return None
+    try:
+        return build_tag_index()
+    finally:
+        lock.release()
+
+#Refresh the topic -> course browse views (see topic_browse.py)
+#Run by celery-beat and queued through schedule_topic_courses_refresh when tag links change
+@shared_task
+def refresh_topic_courses():
+    topic_browse.release_refresh()
+    topic_browse.refresh_topic_courses()
+
+#Queue a refresh TOPIC_COURSES_REFRESH_DELAY seconds from now unless one is already waiting
+def schedule_topic_courses_refresh():
+    if not topic_browse.claim_refresh():
+        return
+    try:
+        refresh_topic_courses.apply_async(countdown=settings.TOPIC_COURSES_REFRESH_DELAY)
+    except Exception as e:
+        # Beat still refreshes on schedule
+        logger.error(f"Could not queue a topic courses refresh: {e}")
+        topic_browse.release_refresh()
+
+#Drop catalog change log entries superseded by a newer one for the same row (see changes.py)
+#Run by celery-beat, returns the number of entries deleted
+@shared_task
+def compact_catalog_changes():
+    return compact_changes(settings.CATALOG_CHANGES_COMPACT_BATCH)
+
+#Render the published catalog into a new static snapshot (see catalog_snapshot.py), returns its manifest or None if skipped
+#Run by celery-beat and queued through schedule_catalog_snapshot after catalog writes
+@shared_task
+def build_catalog_snapshot():
+    catalog_snapshot.release_rebuild()
+    if not catalog_snapshot.acquire_build_lock():
+        # The running build may have read the catalog before the latest writes
+        logger.debug("Catalog_Snapshot_Skipped : Another build is running")
+        schedule_catalog_snapshot()
+        return None
+    try:
+        return catalog_snapshot.build_snapshot()
+    finally:
+        catalog_snapshot.release_build_lock()
+
+#Queue a snapshot build CATALOG_SNAPSHOT_DELAY seconds from now unless one is already waiting
+def schedule_catalog_snapshot():
+    if not catalog_snapshot.claim_rebuild():
+        return
+    try:
+        build_catalog_snapshot.apply_async(countdown=settings.CATALOG_SNAPSHOT_DELAY)
+    except Exception as e:
+        # Beat still rebuilds on schedule
+        logger.error(f"Could not queue a catalog snapshot build: {e}")
+        catalog_snapshot.release_rebuild()
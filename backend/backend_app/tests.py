@@ -1,3 +1,1755 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import redis
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from redis.exceptions import LockNotOwnedError
+from celery.exceptions import Retry
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .blobstore import get_blob_storage, put_blob, open_blob, blob_exists
+from .spool import get_spool_storage, spool_upload, open_spooled, discard_spooled, SpoolingUploadHandler, UploadTooLarge
+from .pagination import KeysetPagination
+from .ratings import rating_buffer, buffered_rating_count, rebuild_rating_aggregates, RATING_BUFFER_KEY
+from .tasks import upload_to_youtube, send_resumable_upload, get_upload_chunk_size, RESUMABLE_CHUNK_UNIT, drain_rating_buffer, refresh_video_metadata, track_linked_videos, rebuild_tag_index, refresh_topic_courses, compact_catalog_changes, build_catalog_snapshot, schedule_catalog_snapshot
+from . import tag_index, topic_browse, catalog_cache, video_cache
+from .models import UserInfo, Instructor, Topics, Courses, Lessons, Uploaded, UploadJob, Rating, CourseRatingAggregate, Tags, TopicTag, CourseTag, LessonTag, VideoMetadata, CatalogChange, Blob
+from .serializers import UPLOAD_SUMMARY_FIELDS
+from .youtube import extract_video_id, configure_client, youtube_client, YouTubeClient
+from .management.commands._fake_youtube import FakeYouTubeServer
+from .views import parse_byte_range, fetch_video_details, iter_youtube_video_pages, fetch_youtube_videos
+
+
+def redis_available(url):
+    try:
+        return redis.Redis.from_url(url, socket_connect_timeout=1).ping()
+    except redis.RedisError:
+        return False
+
+
+def make_course(name="Course"):
+    user = UserInfo.objects.create(username="teacher", password="password", email=f"{name.lower()}@example.com")
+    instructor = Instructor.objects.create(userID=user)
+    return Courses.objects.create(instructorID=instructor, courseName=name, courseDescription="Description")
+
+
+class FakeYouTubeMixin:
+    # Points the shared YouTube client at a local fake server (see _fake_youtube.py) for the test
+    def start_fake_youtube(self, video_count=0):
+        server = FakeYouTubeServer(video_count, latency=0)
+        server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        configure_client(base_url=server.base_url, backoff=0)
+        self.addCleanup(configure_client)
+        return server
+
+
+class ScriptedAdapter(BaseAdapter):
+    # Transport answering with the given statuses (or (status, headers), or exceptions to raise) in order
+    def __init__(self, answers):
+        super().__init__()
+        self.answers = list(answers)
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((request, kwargs))
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer if isinstance(answer, tuple) else (answer, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = b"{}"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class YouTubeClientTests(TestCase):
+    def request(self, answers, method="get", **kwargs):
+        adapter = ScriptedAdapter(answers)
+        client = YouTubeClient(base_url="https://youtube.test", transport=adapter, max_retries=3, backoff=0.5, backoff_max=4)
+        # The jitter picks the top of its range, so the sleeps are the backoff caps
+        with mock.patch("backend_app.youtube.time.sleep") as sleep, \
+                mock.patch("backend_app.youtube.random.uniform", side_effect=lambda low, high: high):
+            response = getattr(client, method)("/youtube/v3/videos", **kwargs)
+        return response, len(adapter.sent), [call.args[0] for call in sleep.call_args_list]
+
+    def test_429_and_5xx_are_retried_with_exponential_backoff(self):
+        response, sent, sleeps = self.request([503, 500, 429, 200])
+        self.assertEqual((response.status_code, sent, sleeps), (200, 4, [0.5, 1.0, 2.0]))
+
+    def test_last_answer_is_returned_once_retries_run_out(self):
+        response, sent, sleeps = self.request([503] * 5)
+        self.assertEqual((response.status_code, sent, sleeps), (503, 4, [0.5, 1.0, 2.0]))
+
+    def test_backoff_is_capped(self):
+        client = YouTubeClient(base_url="https://youtube.test", transport=ScriptedAdapter([]), backoff=0.5, backoff_max=4)
+        with mock.patch("backend_app.youtube.random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual(client.backoff_delay(10), 4)
+
+    def test_retry_after_is_honoured_up_to_the_cap(self):
+        response, sent, sleeps = self.request([(429, {"Retry-After": "3"}), (503, {"Retry-After": "60"}), 200])
+        self.assertEqual((response.status_code, sleeps), (200, [3.0, 4]))
+
+    def test_4xx_is_not_retried(self):
+        for status in (400, 401, 403, 404):
+            response, sent, sleeps = self.request([status])
+            self.assertEqual((response.status_code, sent, sleeps), (status, 1, []))
+
+    def test_connection_errors_are_retried_then_raised(self):
+        response, sent, sleeps = self.request([requests.ConnectionError("reset"), 200])
+        self.assertEqual((response.status_code, sent), (200, 2))
+        with self.assertRaises(requests.Timeout):
+            self.request([requests.Timeout("slow")] * 4)
+
+    def test_retry_false_sends_once(self):
+        response, sent, sleeps = self.request([503, 200], method="put", retry=False)
+        self.assertEqual((response.status_code, sent, sleeps), (503, 1, []))
+
+    def test_requests_get_the_configured_timeouts(self):
+        adapter = ScriptedAdapter([200])
+        YouTubeClient(base_url="https://youtube.test", transport=adapter).get("/youtube/v3/videos")
+        request, kwargs = adapter.sent[0]
+        self.assertEqual(request.url, "https://youtube.test/youtube/v3/videos")
+        self.assertEqual(kwargs["timeout"], (settings.YOUTUBE_CONNECT_TIMEOUT, settings.YOUTUBE_READ_TIMEOUT))
+
+    def test_one_session_per_process(self):
+        adapter = ScriptedAdapter([200, 200, 200])
+        self.addCleanup(configure_client)
+        client = configure_client(base_url="https://youtube.test", transport=adapter)
+        session = client.session
+        youtube_client().get("/youtube/v3/videos")
+        youtube_client().get("/youtube/v3/channels")
+        self.assertIs(youtube_client(), client)
+        self.assertIs(youtube_client().session, session)
+        self.assertEqual(len(adapter.sent), 2)
+        # A forked child builds its own client instead of sharing the parent's sockets
+        with mock.patch("backend_app.youtube.os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNot(youtube_client(), client)
+
+
+class SpoolTestCase(TestCase):
+    # Each test case gets its own spool directory
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, True)
+        settings_override = override_settings(UPLOAD_SPOOL_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": self.spool_dir},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_spool_storage.cache_clear()
+        self.addCleanup(get_spool_storage.cache_clear)
+
+    def spooled_files(self):
+        return os.listdir(self.spool_dir)
+
+
+class UploadSpoolTests(SpoolTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+
+    def post_video(self, content, **fields):
+        return self.client.post("/api/upload/video/", {
+            "file": SimpleUploadedFile("clip.mp4", content, "video/mp4"),
+            "title": "Title",
+            "description": "Description",
+            "lesson_id": self.lesson.lessonID,
+            "accessToken": "token",
+            **fields,
+        })
+
+    def test_upload_enqueues_a_handle_to_the_spooled_file(self):
+        content = os.urandom(300 * 1024)
+        with mock.patch("backend_app.views.upload_to_youtube") as task:
+            task.delay.return_value.id = "task-id"
+            response = self.post_video(content)
+        self.assertEqual((response.status_code, response.json()["task_id"]), (202, "task-id"))
+        task.delay.assert_called_once()
+        handle, title, description, access_token, lesson_id, playlist = task.delay.call_args.args
+        # Only the handle goes through the broker, never the file bytes
+        self.assertEqual(json.loads(json.dumps(handle)), handle)
+        self.assertEqual((handle["size"], handle["sha256"]), (len(content), hashlib.sha256(content).hexdigest()))
+        self.assertEqual((handle["filename"], handle["content_type"]), ("clip.mp4", "video/mp4"))
+        self.assertEqual((title, access_token, lesson_id), ("Title", "token", str(self.lesson.lessonID)))
+        self.assertEqual(self.spooled_files(), [handle["path"]])
+        with open_spooled(handle) as file:
+            self.assertEqual(file.read(), content)
+
+    def test_spooled_file_is_checked_and_discarded(self):
+        content = b"video" * 1000
+        handle = spool_upload(SimpleUploadedFile("clip.mp4", content, "video/mp4"))
+        self.assertEqual(handle["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertTrue(handle["path"].endswith(".mp4"))
+        with self.assertRaises(ValueError):
+            open_spooled({**handle, "size": len(content) + 1})
+        discard_spooled(handle)
+        discard_spooled(handle) # Already gone, never raises
+        discard_spooled(None)
+        self.assertEqual(self.spooled_files(), [])
+
+    def test_oversized_upload_is_refused_before_it_is_spooled(self):
+        with override_settings(UPLOAD_MAX_SIZE=1024), mock.patch("backend_app.views.upload_to_youtube") as task:
+            response = self.post_video(b"x" * 4096)
+        self.assertEqual(response.status_code, 413)
+        task.delay.assert_not_called()
+        self.assertEqual(self.spooled_files(), [])
+
+    def test_handler_hashes_the_file_while_it_streams_in(self):
+        content = os.urandom(2 * SpoolingUploadHandler.chunk_size + 1000)
+        handler = SpoolingUploadHandler()
+        handler.new_file("file", "clip.mp4", "video/mp4", len(content))
+        for start in range(0, len(content), handler.chunk_size):
+            handler.receive_data_chunk(content[start:start + handler.chunk_size], start)
+        file = handler.file_complete(len(content))
+        self.addCleanup(file.close)
+        self.assertEqual(file.sha256, hashlib.sha256(content).hexdigest())
+        # spool_upload takes the digest as is instead of reading the file again
+        with mock.patch("backend_app.spool._HashingFile", side_effect=AssertionError("hashed twice")):
+            handle = spool_upload(file)
+        self.assertEqual((handle["sha256"], handle["size"]), (file.sha256, len(content)))
+
+    def test_handler_stops_once_the_body_goes_past_the_limit(self):
+        handler = SpoolingUploadHandler()
+        with override_settings(UPLOAD_MAX_SIZE=1000):
+            with self.assertRaises(UploadTooLarge):
+                handler.handle_raw_input(None, {}, 1001, b"boundary")
+            # A body without an honest Content-Length is caught while it is read
+            handler.handle_raw_input(None, {}, 500, b"boundary")
+            handler.new_file("file", "clip.mp4", "video/mp4", None)
+            temporary = handler.file.temporary_file_path()
+            handler.receive_data_chunk(b"x" * 600, 0)
+            with self.assertRaises(UploadTooLarge):
+                handler.receive_data_chunk(b"x" * 600, 600)
+        self.assertFalse(os.path.exists(temporary))
+
+
+class ReadSizeFile(BytesIO):
+    # Remembers how many bytes every read asked for
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class ResumableUploadTests(FakeYouTubeMixin, TestCase):
+    def setUp(self):
+        self.youtube = self.start_fake_youtube()
+        self.content = os.urandom(2 * RESUMABLE_CHUNK_UNIT + 1000)
+
+    def start_session(self):
+        response = youtube_client().post("/upload/youtube/v3/videos", params={"uploadType": "resumable"}, json={})
+        return response.headers["Location"]
+
+    def test_chunks_are_bounded_and_contiguous(self):
+        file = ReadSizeFile(self.content)
+        progress = []
+        response = send_resumable_upload(
+            self.start_session(), file, len(self.content), "video/mp4",
+            chunk_size=RESUMABLE_CHUNK_UNIT, on_progress=progress.append
+        )
+        self.assertEqual(response.status_code, 200)
+        size = len(self.content)
+        self.assertEqual(self.youtube.upload_ranges, [
+            f"bytes 0-{RESUMABLE_CHUNK_UNIT - 1}/{size}",
+            f"bytes {RESUMABLE_CHUNK_UNIT}-{2 * RESUMABLE_CHUNK_UNIT - 1}/{size}",
+            f"bytes {2 * RESUMABLE_CHUNK_UNIT}-{size - 1}/{size}",
+        ])
+        self.assertEqual(progress, [RESUMABLE_CHUNK_UNIT, 2 * RESUMABLE_CHUNK_UNIT])
+        # Never more than one chunk read into memory
+        self.assertEqual(set(file.reads), {RESUMABLE_CHUNK_UNIT})
+        self.assertEqual(bytes(self.youtube.sessions[0]["received"]), self.content)
+
+    def test_chunk_size_zero_streams_one_request(self):
+        response = send_resumable_upload(self.start_session(), BytesIO(self.content), len(self.content), "video/mp4", chunk_size=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.youtube.upload_ranges, [None])
+        self.assertEqual(bytes(self.youtube.sessions[0]["received"]), self.content)
+
+    def test_failed_chunk_is_returned_to_the_caller(self):
+        self.youtube.failing_puts = 1
+        response = send_resumable_upload(self.start_session(), BytesIO(self.content), len(self.content), "video/mp4", chunk_size=RESUMABLE_CHUNK_UNIT)
+        # Not retried by the client, the file object may not be replayable
+        self.assertEqual((response.status_code, len(self.youtube.upload_ranges)), (503, 1))
+
+    def test_chunk_size_must_be_a_multiple_of_256k(self):
+        with override_settings(YOUTUBE_UPLOAD_CHUNK_SIZE=1000):
+            with self.assertRaises(ValueError):
+                get_upload_chunk_size()
+        with override_settings(YOUTUBE_UPLOAD_CHUNK_SIZE=0):
+            self.assertEqual(get_upload_chunk_size(), 0)
+
+
+class YouTubeListingTests(FakeYouTubeMixin, TestCase):
+    def setUp(self):
+        self.youtube = self.start_fake_youtube(video_count=7)
+        self.youtube.page_size = 3
+
+    def ids(self, pages):
+        return [[video["id"] for video in page] for page in pages]
+
+    def video_ids(self, *indexes):
+        return [self.youtube.video_id(index) for index in indexes]
+
+    def test_pages_come_back_in_search_order(self):
+
+        # The first page's details finish last
+        def slow_first_page(access_token, video_ids):
+            if video_ids[0] == self.youtube.video_id(0):
+                time.sleep(0.2)
+            return fetch_video_details(access_token, video_ids)
+
+        with mock.patch("backend_app.views.fetch_video_details", side_effect=slow_first_page):
+            pages = list(iter_youtube_video_pages("token", max_results=3))
+        self.assertEqual(self.ids(pages), [self.video_ids(0, 1, 2), self.video_ids(3, 4, 5), self.video_ids(6)])
+
+    def test_fetch_youtube_videos_joins_the_pages(self):
+        result = fetch_youtube_videos("token", max_results=3)
+        self.assertTrue(result["success"])
+        self.assertEqual([video["id"] for video in result["videos"]], self.video_ids(*range(7)))
+
+    def test_search_error_ends_the_listing(self):
+        response = mock.Mock(status_code=401)
+        response.json.return_value = {"error": {"message": "Invalid Credentials"}}
+        with mock.patch("backend_app.views.fetch_search_page", return_value=response):
+            result = fetch_youtube_videos("token")
+        self.assertEqual((result["success"], result["error_code"]), (False, "TOKEN_EXPIRED"))
+
+
+def login_staff(client):
+    client.force_login(get_user_model().objects.create_user("staff", password="password", is_staff=True))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class VideoCacheTests(FakeYouTubeMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.youtube = self.start_fake_youtube(video_count=3)
+        self.auth = {"HTTP_AUTHORIZATION": "Bearer token"}
+
+    def list_videos(self):
+        response = self.client.get("/api/youtube/videos/", **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [video["id"] for video in response.json()["videos"]]
+
+    def video_ids(self, *indexes):
+        return [self.youtube.video_id(index) for index in indexes]
+
+    def watch_url(self, index):
+        return f"https://www.youtube.com/watch?v={self.youtube.video_id(index)}"
+
+    def cached_videos(self):
+        return {video["id"]: video for video in video_cache.get_entry("fake-channel")["videos"]}
+
+    def stats(self):
+        login_staff(self.client)
+        return self.client.get("/api/youtube/cache-stats/").json()["stats"]
+
+    def test_fresh_list_is_served_without_asking_youtube(self):
+        self.assertEqual(self.list_videos(), self.video_ids(0, 1, 2))
+        requests_sent = self.youtube.request_count
+        self.assertEqual(self.list_videos(), self.video_ids(0, 1, 2))
+        self.assertEqual(self.youtube.request_count, requests_sent)
+        stats = self.stats()
+        self.assertEqual((stats["miss"], stats["hit"]), (1, 1))
+
+    def test_stale_list_is_revalidated_with_its_etag(self):
+        with override_settings(YOUTUBE_VIDEO_CACHE_TTL=0):
+            self.list_videos()
+            requests_sent = self.youtube.request_count
+            # Unchanged channel, only the conditional search page goes out and gets a 304
+            self.assertEqual(self.list_videos(), self.video_ids(0, 1, 2))
+            self.assertEqual(self.youtube.request_count, requests_sent + 1)
+            self.youtube.video_count = 4
+            self.assertEqual(self.list_videos(), self.video_ids(0, 1, 2, 3))
+        stats = self.stats()
+        self.assertEqual((stats["miss"], stats["revalidated"], stats["hit"]), (2, 1, 0))
+
+    def test_update_patches_the_cached_video(self):
+        self.list_videos()
+        response = self.client.post("/api/youtube/update/", json.dumps({
+            "youtube_url": self.watch_url(1), "title": "Renamed", "categoryId": "27"
+        }), content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 200)
+        videos = self.cached_videos()
+        self.assertEqual((videos[self.youtube.video_id(1)]["title"], videos[self.youtube.video_id(1)]["category_id"]), ("Renamed", "27"))
+        self.assertEqual(videos[self.youtube.video_id(0)]["title"], f"Video {self.youtube.video_id(0)}")
+
+    def test_delete_removes_the_cached_video(self):
+        self.list_videos()
+        response = self.client.post("/api/youtube/delete/", json.dumps({
+            "youtube_url": self.watch_url(1)
+        }), content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.list_videos(), self.video_ids(0, 2))
+
+    def stream(self):
+        response = self.client.get("/api/youtube/videos/?stream=1", **self.auth)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_stream_sends_one_video_per_line(self):
+        self.youtube.video_count = 5
+        self.youtube.page_size = 2
+        expected = self.video_ids(*range(5))
+        self.assertEqual([video["id"] for video in self.stream()], expected)
+        # The finished listing was cached, the next stream comes from it
+        requests_sent = self.youtube.request_count
+        self.assertEqual([video["id"] for video in self.stream()], expected)
+        self.assertEqual(self.youtube.request_count, requests_sent)
+
+    def test_stream_ends_with_an_error_line(self):
+        response = mock.Mock(status_code=403)
+        response.json.return_value = {"error": {"message": "Quota exceeded"}}
+        with mock.patch("backend_app.views.fetch_search_page", return_value=response):
+            self.assertEqual(self.stream(), [{"success": False, "error": "Quota exceeded"}])
+
+    def test_stats_are_for_staff_only(self):
+        self.assertEqual(self.client.get("/api/youtube/cache-stats/").status_code, 302)
+        self.client.force_login(get_user_model().objects.create_user("member", password="password"))
+        self.assertEqual(self.client.get("/api/youtube/cache-stats/").status_code, 302)
+        self.assertEqual(self.client.get("/api/cache-stats/").status_code, 302)
+        login_staff(self.client)
+        self.assertEqual(self.client.get("/api/youtube/cache-stats/").status_code, 200)
+        self.assertEqual(self.client.get("/api/cache-stats/").status_code, 200)
+
+
+@override_settings(YOUTUBE_API_KEY="key")
+class VideoMetadataRefreshTests(FakeYouTubeMixin, TestCase):
+    def setUp(self):
+        self.start_fake_youtube()
+        self.now = timezone.now()
+        # The sample data's linked videos were just refreshed, they stay out of the way
+        track_linked_videos()
+        VideoMetadata.objects.update(fetchedAt=self.now)
+        stale = self.now - timedelta(seconds=settings.VIDEO_METADATA_MAX_AGE)
+        # Never fetched, then stale from the oldest down, then fresh
+        self.never = [VideoMetadata.objects.create(videoID=f"new{number:08d}") for number in range(3)]
+        self.stale = [
+            VideoMetadata.objects.create(videoID=f"old{number:08d}", fetchedAt=stale - timedelta(minutes=200 - number))
+            for number in range(100)
+        ]
+        self.fresh = VideoMetadata.objects.create(videoID="fresh000000", fetchedAt=self.now)
+
+    def refresh(self, max_batches):
+        client = youtube_client()
+        with mock.patch.object(client, "get", wraps=client.get) as get:
+            refreshed = refresh_video_metadata(max_batches)
+        return refreshed, [call.kwargs["params"]["id"].split(",") for call in get.call_args_list]
+
+    def refreshed_ids(self):
+        return set(VideoMetadata.objects.filter(fetchedAt__gt=self.now).values_list("videoID", flat=True))
+
+    def test_batches_of_50_stalest_first(self):
+        refreshed, batches = self.refresh(max_batches=2)
+        self.assertEqual((refreshed, [len(batch) for batch in batches]), (100, [50, 50]))
+        expected = [metadata.videoID for metadata in self.never + self.stale[:97]]
+        self.assertEqual([video_id for batch in batches for video_id in batch], expected)
+        self.assertEqual(self.refreshed_ids(), set(expected))
+        self.assertEqual(VideoMetadata.objects.get(videoID="new00000000").title, "Video new00000000")
+
+    def test_the_rest_waits_for_the_next_run(self):
+        self.refresh(max_batches=2)
+        refreshed, batches = self.refresh(max_batches=2)
+        self.assertEqual((refreshed, batches), (3, [[metadata.videoID for metadata in self.stale[97:]]]))
+        self.assertNotIn("fresh000000", self.refreshed_ids())
+
+    def test_nothing_is_sent_without_an_api_key(self):
+        with override_settings(YOUTUBE_API_KEY=""):
+            self.assertEqual(self.refresh(max_batches=2), (0, []))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    YOUTUBE_UPLOAD_CHUNK_SIZE=RESUMABLE_CHUNK_UNIT
+)
+class YouTubeUploadTaskTests(FakeYouTubeMixin, SpoolTestCase):
+    def setUp(self):
+        super().setUp()
+        self.youtube = self.start_fake_youtube()
+        self.lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+        self.content = os.urandom(2 * RESUMABLE_CHUNK_UNIT + 1000)
+        self.handle = spool_upload(SimpleUploadedFile("clip.mp4", self.content, "video/mp4"))
+
+    #Run the task body as delivery number retries + 1
+    def run_task(self, retries=0):
+        upload_to_youtube.push_request(retries=retries)
+        try:
+            return upload_to_youtube.run(self.handle, "Title", "Description", "token", self.lesson.lessonID, None)
+        finally:
+            upload_to_youtube.pop_request()
+
+    def make_job(self, **fields):
+        return UploadJob.objects.create(
+            lessonID=self.lesson, spoolPath=self.handle["path"], fileSize=self.handle["size"], **fields
+        )
+
+    def range_starts(self):
+        return [int(content_range.split(" ")[1].split("-")[0]) for content_range in self.youtube.upload_ranges]
+
+    def assert_uploaded(self):
+        self.assertEqual(bytes(self.youtube.sessions[0]["received"]), self.content)
+        job = UploadJob.objects.get(spoolPath=self.handle["path"])
+        self.assertEqual((job.status, job.bytesSent, job.videoID), (UploadJob.STATUS_COMPLETE, len(self.content), "upload00000"))
+        self.assertTrue(Uploaded.objects.filter(lessonID=self.lesson, videoID="upload00000").exists())
+        self.assertEqual(self.spooled_files(), [])
+
+    def test_partial_commit_resumes_from_the_next_byte(self):
+        self.youtube.commit_limit = 100 * 1024
+        self.assertEqual(self.run_task(), 0)
+        # Every 308 kept only part of the chunk, the next one starts right after the committed byte
+        self.assertEqual(self.range_starts(), list(range(0, len(self.content), 100 * 1024)))
+        self.assert_uploaded()
+
+    def test_retry_after_a_lost_worker_reuses_the_session(self):
+        # A delivery started the session and sent one chunk, then its worker died
+        self.youtube.sessions[self.youtube.start_session()]["received"] += self.content[:RESUMABLE_CHUNK_UNIT]
+        job = self.make_job(
+            sessionURL=f"{self.youtube.base_url}/upload/session/0",
+            bytesSent=RESUMABLE_CHUNK_UNIT, status=UploadJob.STATUS_UPLOADING
+        )
+        expired = timezone.now() - timedelta(seconds=settings.YOUTUBE_UPLOAD_LEASE_SECONDS + 1)
+        UploadJob.objects.filter(pk=job.pk).update(updatedAt=expired)
+
+        self.assertEqual(self.run_task(retries=1), 0)
+        self.assertEqual(len(self.youtube.sessions), 1)
+        self.assertEqual(self.range_starts(), [RESUMABLE_CHUNK_UNIT, 2 * RESUMABLE_CHUNK_UNIT])
+        self.assert_uploaded()
+
+    def test_delivery_waits_while_another_one_holds_the_lease(self):
+        self.make_job(sessionURL=f"{self.youtube.base_url}/upload/session/0", status=UploadJob.STATUS_UPLOADING)
+        with mock.patch.object(upload_to_youtube, "retry", side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                self.run_task()
+        self.assertEqual(retry.call_args.kwargs["countdown"], settings.YOUTUBE_UPLOAD_LEASE_SECONDS)
+        self.assertEqual((self.youtube.sessions, self.youtube.upload_ranges), ({}, []))
+        self.assertEqual(UploadJob.objects.get().status, UploadJob.STATUS_UPLOADING)
+        self.assertEqual(self.spooled_files(), [self.handle["path"]])
+
+    def test_spool_survives_a_retry_and_goes_after_success(self):
+        self.youtube.failing_puts = 1
+        with mock.patch.object(upload_to_youtube, "retry", side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                self.run_task()
+        self.assertEqual(retry.call_args.kwargs["countdown"], settings.YOUTUBE_UPLOAD_RETRY_DELAY)
+        self.assertEqual(UploadJob.objects.get().status, UploadJob.STATUS_PENDING)
+        self.assertEqual(self.spooled_files(), [self.handle["path"]])
+
+        # The retry continues the same session
+        self.assertEqual(self.run_task(retries=1), 0)
+        self.assertEqual(len(self.youtube.sessions), 1)
+        self.assert_uploaded()
+
+    def post_without_queue(self):
+        with mock.patch("backend_app.views.upload_to_youtube") as task, mock.patch("backend_app.tasks.time") as clock:
+            task.delay.side_effect = ConnectionError("Broker down")
+            response = self.client.post("/api/upload/video/", {
+                "file": SimpleUploadedFile("clip.mp4", self.content, "video/mp4"),
+                "title": "Title",
+                "lesson_id": self.lesson.lessonID,
+                "accessToken": "token",
+            })
+        return response, clock.sleep
+
+    def test_view_uploads_itself_with_bounded_retries_when_the_queue_is_down(self):
+        self.youtube.failing_puts = 1
+        response, sleep = self.post_without_queue()
+        self.assertEqual(response.status_code, 200)
+        # One quick retry in the request instead of the task's retry countdown
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [settings.YOUTUBE_BACKOFF])
+        self.assertEqual(Uploaded.objects.get(lessonID=self.lesson).videoID, "upload00000")
+        # Only the file spooled in setUp is left
+        self.assertEqual(self.spooled_files(), [self.handle["path"]])
+
+    def test_view_gives_up_after_the_sync_attempts(self):
+        self.youtube.failing_puts = 100
+        response, sleep = self.post_without_queue()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(self.youtube.upload_ranges), settings.YOUTUBE_UPLOAD_SYNC_ATTEMPTS)
+        self.assertEqual(sleep.call_count, settings.YOUTUBE_UPLOAD_SYNC_ATTEMPTS - 1)
+        self.assertEqual(UploadJob.objects.get().status, UploadJob.STATUS_FAILED)
+        # Only the file spooled in setUp is left
+        self.assertEqual(self.spooled_files(), [self.handle["path"]])
+
+    def test_spool_goes_after_the_last_retry_fails(self):
+        self.youtube.failing_puts = 1
+        self.assertEqual(self.run_task(retries=settings.YOUTUBE_UPLOAD_MAX_RETRIES), 1)
+        self.assertEqual(UploadJob.objects.get().status, UploadJob.STATUS_FAILED)
+        self.assertEqual(self.spooled_files(), [])
+        self.assertFalse(Uploaded.objects.filter(lessonID=self.lesson).exists())
+
+
+class BlobStoreTestCase(TestCase):
+    # Each test case gets its own blob store directory
+    def setUp(self):
+        self.blob_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.blob_dir, True)
+        settings_override = override_settings(BLOB_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": self.blob_dir},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_blob_storage.cache_clear()
+        self.addCleanup(get_blob_storage.cache_clear)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class UploadListingTests(BlobStoreTestCase):
+    FILE_SIZE = 256 * 1024
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.course = make_course()
+        self.lesson = Lessons.objects.create(courseID=self.course, lessonName="Lesson", lessonDescription="Description")
+        response = self.client.post("/api/uploaded/", {
+            "lessonID": self.lesson.lessonID,
+            "file": SimpleUploadedFile("notes.pdf", b"x" * self.FILE_SIZE, "application/pdf"),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.file_id = response.json()["fileID"]
+        Uploaded.objects.create(lessonID=self.lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+
+    def get_listing(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query["sql"] for query in queries]
+
+    def assert_metadata_only(self, url, lessons):
+        response, queries = self.get_listing(url)
+        # Upload rows are read with the summary columns only, never file contents
+        upload_queries = [sql for sql in queries if 'FROM "backend_app_uploaded"' in sql]
+        self.assertTrue([sql for sql in upload_queries if not sql.startswith("SELECT MAX(")])
+        summary_columns = {Uploaded._meta.get_field(name).column for name in UPLOAD_SUMMARY_FIELDS}
+        # The ETag/Last-Modified aggregate (see conditional.py) also reads the change timestamp
+        validator_columns = summary_columns | {Uploaded._meta.get_field("updatedAt").column}
+        for sql in upload_queries:
+            selected = set(re.findall(r'"backend_app_uploaded"\."(\w+)"', sql.split(" FROM ")[0]))
+            self.assertTrue(selected, sql)
+            self.assertLessEqual(selected, validator_columns if sql.startswith("SELECT MAX(") else summary_columns, sql)
+        # The payload does not grow with the size of the attached file
+        self.assertLess(len(response.content), self.FILE_SIZE // 16)
+
+        lesson = next(lesson for lesson in lessons(response.json()) if lesson["lessonID"] == self.lesson.lessonID)
+        uploads = lesson["uploads"]
+        self.assertEqual([upload["kind"] for upload in uploads], ["file", "video"])
+        self.assertNotIn("file", uploads[0])
+        self.assertEqual(uploads[0]["fileSize"], self.FILE_SIZE)
+        self.assertTrue(uploads[0]["downloadURL"].endswith(f"/api/uploaded/{self.file_id}/download/"))
+        self.assertIsNone(uploads[1]["downloadURL"])
+        self.assertEqual(uploads[1]["videoID"], "dQw4w9WgXcQ")
+
+    def test_lesson_list(self):
+        self.assert_metadata_only("/api/lessons/", lambda data: data["results"])
+
+    def test_lesson_detail(self):
+        self.assert_metadata_only(f"/api/lessons/{self.lesson.lessonID}/", lambda data: [data])
+
+    def test_course_lessons(self):
+        self.assert_metadata_only(f"/api/courses/{self.course.courseID}/lessons/", lambda data: data["results"])
+
+    def test_upload_list(self):
+        self.assert_metadata_only("/api/uploaded/", lambda data: [{
+            "lessonID": self.lesson.lessonID,
+            "uploads": [upload for upload in data["results"] if upload["lessonID"] == self.lesson.lessonID],
+        }])
+
+    def test_file_bytes_come_from_download(self):
+        response = self.client.get(f"/api/uploaded/{self.file_id}/download/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"x" * self.FILE_SIZE)
+
+
+class BlobReleaseTests(BlobStoreTestCase):
+    def upload(self, lesson, content):
+        response = self.client.post("/api/uploaded/", {
+            "lessonID": lesson.lessonID,
+            "file": SimpleUploadedFile("notes.txt", content, "text/plain"),
+        })
+        self.assertEqual(response.status_code, 201)
+        return Uploaded.objects.get(pk=response.json()["fileID"])
+
+    def test_shared_blob_is_deleted_with_its_last_row(self):
+        lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+        first, second = self.upload(lesson, b"shared"), self.upload(lesson, b"shared")
+        self.assertEqual(first.contentHash, second.contentHash)
+        self.assertEqual(Blob.objects.filter(contentHash=first.contentHash).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(blob_exists(second.contentHash))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(blob_exists(second.contentHash))
+        self.assertFalse(Blob.objects.filter(contentHash=second.contentHash).exists())
+
+    def test_release_keeps_a_blob_referenced_by_a_new_row(self):
+        lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+        upload = self.upload(lesson, b"contents")
+        with self.captureOnCommitCallbacks() as callbacks:
+            upload.delete()
+        # Another upload of the same content lands before the release runs
+        with transaction.atomic():
+            content_hash, size = put_blob(b"contents")
+            Uploaded.objects.create(lessonID=lesson, contentHash=content_hash, fileSize=size)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(blob_exists(content_hash))
+        with open_blob(content_hash) as blob:
+            self.assertEqual(blob.read(), b"contents")
+
+
+class DownloadTests(BlobStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+
+    def upload(self, content, content_type):
+        response = self.client.post("/api/uploaded/", {
+            "lessonID": self.lesson.lessonID,
+            "file": SimpleUploadedFile("file", content, content_type),
+        })
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploaded/{response.json()['fileID']}/download/"
+
+    def test_parse_byte_range(self):
+        self.assertEqual(parse_byte_range("bytes=0-3", 10), (0, 3))
+        self.assertEqual(parse_byte_range("bytes=5-", 10), (5, 9))
+        self.assertEqual(parse_byte_range("bytes=5-100", 10), (5, 9))
+        self.assertEqual(parse_byte_range("bytes=-4", 10), (6, 9))
+        self.assertEqual(parse_byte_range("bytes=-100", 10), (0, 9))
+        # Missing, malformed or invalid ranges are ignored
+        for header in (None, "", "items=0-3", "bytes=0-1,4-5", "bytes=5-abc", "bytes=abc-5", "bytes=-", "bytes=5", "bytes=6-2"):
+            self.assertIsNone(parse_byte_range(header, 10), header)
+        # Unsatisfiable ones are not
+        for header, size in (("bytes=10-", 10), ("bytes=-0", 10), ("bytes=-4", 0), ("bytes=0-", 0)):
+            with self.assertRaises(ValueError):
+                parse_byte_range(header, size)
+
+    def test_ranges(self):
+        url = self.upload(b"0123456789", "application/pdf")
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=5-abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_keeps_the_validators(self):
+        url = self.upload(b"0123456789", "application/pdf")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((response["ETag"], response["Cache-Control"]), (etag, "no-cache"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_empty_file_ranges(self):
+        # The API refuses empty files, older rows may still have one
+        with transaction.atomic():
+            content_hash, size = put_blob(b"")
+            upload = Uploaded.objects.create(lessonID=self.lesson, contentHash=content_hash, fileSize=size, contentType="text/plain")
+        url = f"/api/uploaded/{upload.fileID}/download/"
+        response = self.client.get(url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */0")
+
+    def test_only_safe_types_are_shown_inline(self):
+        self.assertEqual(self.client.get(self.upload(b"%PDF", "application/pdf"))["Content-Disposition"], "inline")
+        for content_type in ("text/html", "image/svg+xml", "application/xhtml+xml"):
+            response = self.client.get(self.upload(b"<script>alert(1)</script>", content_type))
+            self.assertEqual(response["Content-Disposition"], "attachment", content_type)
+            self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        course = make_course()
+        for number in range(7):
+            Lessons.objects.create(courseID=course, lessonName=f"Lesson {number}", lessonDescription="Description")
+
+    def test_pages_follow_the_primary_key_without_offsets(self):
+        url = "/api/lessons/?page_size=2"
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).json()
+                self.assertLessEqual(len(data["results"]), 2)
+                seen.extend(lesson["lessonID"] for lesson in data["results"])
+                url = data["next"]
+        self.assertEqual(seen, list(Lessons.objects.order_by("pk").values_list("pk", flat=True)))
+        for query in queries:
+            self.assertNotIn("OFFSET", query["sql"])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, "max_page_size", 3):
+            data = self.client.get("/api/lessons/?page_size=1000").json()
+        self.assertEqual(len(data["results"]), 3)
+
+
+class VideoIDTests(TestCase):
+    def test_only_the_video_id_is_kept(self):
+        for url in (
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ#t=30s_and_a_long_fragment_here_xyz",
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123",
+            "https://youtu.be/dQw4w9WgXcQ/extra/path",
+            "https://www.youtube.com/shorts/dQw4w9WgXcQ?feature=share",
+        ):
+            self.assertEqual(extract_video_id(url), "dQw4w9WgXcQ")
+        self.assertIsNone(extract_video_id("https://www.youtube.com/watch?v=short"))
+        self.assertIsNone(extract_video_id("https://www.youtube.com/watch?v=dQw4w9WgXcQabc"))
+
+    def test_fragment_urls_save(self):
+        lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+        upload = Uploaded.objects.create(lessonID=lesson, videoURL="https://www.youtube.com/watch?v=dQw4w9WgXcQ#t=30s_and_a_long_fragment_here_xyz")
+        self.assertEqual(Uploaded.objects.get(pk=upload.pk).videoID, "dQw4w9WgXcQ")
+
+    def test_migration_keeps_duplicate_links(self):
+        populate_video_ids = import_module("backend_app.migrations.0005_uploaded_videoid").populate_video_ids
+        lesson = Lessons.objects.create(courseID=make_course(), lessonName="Lesson", lessonDescription="Description")
+        first = Uploaded.objects.create(lessonID=lesson, videoURL="https://youtu.be/aaaaaaaaaaa")
+        duplicate = Uploaded.objects.create(lessonID=lesson, videoURL="https://youtu.be/bbbbbbbbbbb")
+        # Links saved before the column existed, the second one points at the same video
+        Uploaded.objects.filter(pk=duplicate.pk).update(videoURL="https://www.youtube.com/watch?v=aaaaaaaaaaa")
+        Uploaded.objects.filter(pk__in=[first.pk, duplicate.pk]).update(videoID=None)
+        with self.assertLogs("django", "WARNING"):
+            populate_video_ids(django_apps, None)
+        self.assertEqual(
+            dict(Uploaded.objects.filter(lessonID=lesson).values_list("fileID", "videoID")),
+            {first.pk: "aaaaaaaaaaa", duplicate.pk: None}
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CourseBundleTests(TestCase):
+    # course + rating, lessons, uploads, tag names, video metadata
+    BUNDLE_QUERIES = 5
+
+    def setUp(self):
+        # Keep on-commit callbacks from queueing snapshot builds on the broker
+        patcher = mock.patch("backend_app.signals.schedule_catalog_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.course = make_course()
+        for name in ("python", "beginner"):
+            CourseTag.objects.create(courseID=self.course, tagID=Tags.objects.create(tagName=name))
+        for rating in (4, 5):
+            Rating.objects.create(courseID=self.course, rating=rating)
+
+    def add_lessons(self, count):
+        for number in range(count):
+            lesson = Lessons.objects.create(courseID=self.course, lessonName=f"Lesson {number}", lessonDescription="Description")
+            video_id = f"video{lesson.lessonID:06d}"
+            Uploaded.objects.create(lessonID=lesson, videoURL=f"https://youtu.be/{video_id}")
+            VideoMetadata.objects.create(videoID=video_id, title=f"Video {number}")
+
+    def get_bundle(self):
+        response = self.client.get(f"/api/courses/{self.course.courseID}/bundle/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_depend_on_lesson_count(self):
+        for total in (2, 20):
+            self.add_lessons(total - Lessons.objects.filter(courseID=self.course).count())
+            cache.clear()
+            with self.assertNumQueries(self.BUNDLE_QUERIES):
+                bundle = self.get_bundle()
+            self.assertEqual(len(bundle["lessons"]), total)
+
+    def test_bundle_contents(self):
+        self.add_lessons(3)
+        bundle = self.get_bundle()
+        self.assertEqual(bundle["course"]["courseID"], self.course.courseID)
+        self.assertEqual(bundle["tags"], ["beginner", "python"])
+        self.assertEqual(bundle["rating"], {
+            "average": 4.5, "count": 2, "histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1},
+        })
+        lesson_ids = [lesson["lessonID"] for lesson in bundle["lessons"]]
+        self.assertEqual(lesson_ids, sorted(lesson_ids))
+        upload = bundle["lessons"][0]["uploads"][0]
+        self.assertEqual(upload["kind"], "video")
+        self.assertEqual(upload["metadata"]["title"], "Video 0")
+
+    def test_cached_until_a_row_changes(self):
+        self.add_lessons(1)
+        self.get_bundle()
+        with self.assertNumQueries(0):
+            self.get_bundle()
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(courseID=self.course, rating=1)
+        self.assertEqual(self.get_bundle()["rating"]["count"], 3)
+        tag = Tags.objects.get(tagName="python")
+        tag.tagName = "python3"
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(self.get_bundle()["tags"], ["beginner", "python3"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Lessons.objects.create(courseID=self.course, lessonName="Late lesson", lessonDescription="Description")
+        self.assertEqual(len(self.get_bundle()["lessons"]), 2)
+
+    def test_lesson_delete_drops_the_bundle_once(self):
+        self.add_lessons(1)
+        lesson = Lessons.objects.get(courseID=self.course)
+        for number in range(3):
+            Uploaded.objects.create(lessonID=lesson, videoURL=f"https://youtu.be/extra{number:06d}")
+        self.get_bundle()
+        # Course version bumps once the changes commit
+        def bumps(delete):
+            with mock.patch("backend_app.signals.bump_versions", wraps=catalog_cache.bump_versions) as bump:
+                with self.captureOnCommitCallbacks(execute=True):
+                    delete()
+            version = catalog_cache.course_version(self.course.courseID)
+            return [call.args[0] for call in bump.call_args_list if version in call.args[0]]
+
+        # A directly deleted upload moves the bundle itself
+        self.assertEqual(len(bumps(Uploaded.objects.filter(lessonID=lesson).first().delete)), 1)
+        with CaptureQueriesContext(connection) as queries:
+            lesson_bumps = bumps(lesson.delete)
+        # The cascaded uploads leave the bundle to the lesson's handler, which bumps the course version once
+        lookups = [query["sql"] for query in queries if query["sql"].startswith('SELECT "backend_app_lessons"."courseID_id" FROM "backend_app_lessons" WHERE "backend_app_lessons"."lessonID" =')]
+        self.assertEqual(lookups, [])
+        self.assertEqual(len(lesson_bumps), 1)
+        self.assertEqual(self.get_bundle()["lessons"], [])
+
+    def test_bulk_writers_move_the_bundle(self):
+        self.add_lessons(1)
+        video_id = Uploaded.objects.get(lessonID__courseID=self.course).videoID
+        self.get_bundle()
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"items": [{"id": video_id, "snippet": {"title": "Renamed"}, "status": {"embeddable": True}}]}
+        with override_settings(YOUTUBE_API_KEY="key"), mock.patch("backend_app.tasks.youtube_client") as client:
+            client.return_value.get.return_value = response
+            refresh_video_metadata()
+        self.assertEqual(self.get_bundle()["lessons"][0]["uploads"][0]["metadata"]["title"], "Renamed")
+
+        # bulk_create skips the rating handlers, the rebuild brings the aggregate and the bundle up to date
+        Rating.objects.bulk_create([Rating(courseID=self.course, rating=1)])
+        self.assertEqual(self.get_bundle()["rating"]["count"], 2)
+        rebuild_rating_aggregates([self.course.courseID])
+        self.assertEqual(self.get_bundle()["rating"]["count"], 3)
+
+    def test_missing_course(self):
+        self.assertEqual(self.client.get("/api/courses/999999/bundle/").status_code, 404)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = make_course()
+        self.other_course = make_course("Other")
+
+    def aggregate(self, course):
+        return CourseRatingAggregate.objects.get(courseID=course)
+
+    def test_created_with_the_course(self):
+        self.assertEqual(self.aggregate(self.course).ratingCount, 0)
+        self.assertIsNone(self.aggregate(self.course).average)
+
+    def test_follows_create_update_and_delete(self):
+        ratings = [Rating.objects.create(courseID=self.course, rating=value) for value in (5, 4, 4)]
+        aggregate = self.aggregate(self.course)
+        self.assertEqual((aggregate.ratingCount, aggregate.ratingSum), (3, 13))
+        self.assertEqual(aggregate.histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+
+        ratings[0].rating = 1
+        ratings[0].save()
+        ratings[1].courseID = self.other_course
+        ratings[1].save()
+        ratings[2].delete()
+        aggregate = self.aggregate(self.course)
+        self.assertEqual((aggregate.ratingCount, aggregate.ratingSum, aggregate.oneStar, aggregate.fiveStars), (1, 1, 1, 0))
+        self.assertEqual(self.aggregate(self.other_course).histogram[4], 1)
+
+    def test_course_delete_cascades(self):
+        Rating.objects.create(courseID=self.course, rating=3)
+        self.course.delete()
+        self.assertFalse(CourseRatingAggregate.objects.filter(courseID_id=self.course.pk).exists())
+
+    def test_rating_and_aggregate_commit_together(self):
+        Rating.objects.create(courseID=self.course, rating=4)
+        with mock.patch("backend_app.signals.apply_rating_deltas", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Rating.objects.create(courseID=self.course, rating=5)
+        self.assertEqual(Rating.objects.filter(courseID=self.course).count(), 1)
+        self.assertEqual(self.aggregate(self.course).ratingCount, 1)
+
+    def test_out_of_range_ratings_are_refused(self):
+        for value in (0, 7):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Rating.objects.create(courseID=self.course, rating=value)
+        self.assertEqual(self.aggregate(self.course).ratingCount, 0)
+
+    def test_rebuild_command(self):
+        for value in (2, 3, 3):
+            Rating.objects.create(courseID=self.course, rating=value)
+        CourseRatingAggregate.objects.update(ratingCount=0, ratingSum=0, threeStars=0)
+        CourseRatingAggregate.objects.filter(courseID=self.other_course).delete()
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+        aggregate = self.aggregate(self.course)
+        self.assertEqual((aggregate.ratingCount, aggregate.ratingSum, aggregate.average), (3, 8, 2.67))
+        self.assertEqual(aggregate.histogram, {1: 0, 2: 1, 3: 2, 4: 0, 5: 0})
+        self.assertEqual(self.aggregate(self.other_course).ratingCount, 0)
+
+    def test_course_endpoints_read_the_aggregate(self):
+        Rating.objects.create(courseID=self.course, rating=4)
+        Rating.objects.create(courseID=self.course, rating=5)
+        # The ETag/Last-Modified aggregate, then the courses with their aggregates
+        with self.assertNumQueries(2):
+            detail = self.client.get(f"/api/courses/{self.course.courseID}/").json()
+        self.assertEqual((detail["ratingAverage"], detail["ratingCount"]), (4.5, 2))
+        with self.assertNumQueries(2):
+            listing = self.client.get("/api/courses/").json()["results"]
+        self.assertTrue(all("ratingAverage" in course for course in listing))
+
+
+@skipUnless(redis_available(settings.RATING_BUFFER_URL), "needs the rating buffer Redis")
+@override_settings(RATING_INGEST_MODE="buffered")
+class BufferedRatingTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        rating_buffer().delete(RATING_BUFFER_KEY)
+        self.addCleanup(rating_buffer().delete, RATING_BUFFER_KEY)
+
+    def test_ratings_are_acknowledged_then_written_in_batches(self):
+        with mock.patch.object(drain_rating_buffer, "apply_async") as schedule:
+            for value in (5, 4, 4):
+                response = self.client.post("/api/ratings/", {"courseID": self.course.pk, "rating": value}, content_type="application/json")
+                self.assertEqual(response.status_code, 202)
+            self.assertEqual(self.client.post("/api/ratings/", {"courseID": self.course.pk, "rating": 6}, content_type="application/json").status_code, 400)
+            # Only the first rating into an empty buffer queues a drain
+            self.assertEqual(schedule.call_count, 1)
+            self.assertEqual(Rating.objects.count(), 0)
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(drain_rating_buffer(), 3)
+        # One bulk insert and one aggregate update for the whole batch
+        statements = [query["sql"] for query in queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO "backend_app_rating"')]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE "backend_app_courseratingaggregate"')]), 1)
+        self.assertEqual(buffered_rating_count(), 0)
+        aggregate = CourseRatingAggregate.objects.get(courseID=self.course)
+        self.assertEqual((aggregate.ratingCount, aggregate.ratingSum, aggregate.fourStars), (3, 13, 2))
+
+
+class RatingDrainLockTests(TestCase):
+    # Runs without Redis, the buffer client and its drain lock are mocks
+    def setUp(self):
+        self.course = make_course()
+        self.buffer = mock.MagicMock()
+        self.buffer.llen.return_value = 0
+        self.lock = self.buffer.lock.return_value
+        self.lock.acquire.return_value = True
+        self.lock.owned.return_value = True
+        for target in ("backend_app.tasks.rating_buffer", "backend_app.ratings.rating_buffer"):
+            patcher = mock.patch(target, return_value=self.buffer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("backend_app.tasks.schedule_catalog_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def calls(self):
+        return [name for name, _, _ in self.buffer.mock_calls if name in ("lock().extend", "lrange", "ltrim")]
+
+    def test_lock_is_extended_before_every_batch(self):
+        rating = json.dumps([self.course.pk, 4])
+        self.buffer.lrange.side_effect = [[rating], [rating], []]
+        self.assertEqual(drain_rating_buffer(), 2)
+        self.assertEqual(self.calls(), ["lock().extend", "lrange", "ltrim"] * 2 + ["lock().extend", "lrange"])
+
+    def test_batch_that_outlived_the_lock_is_rolled_back(self):
+        self.buffer.lrange.return_value = [json.dumps([self.course.pk, 4])]
+        self.lock.owned.return_value = False
+        self.lock.release.side_effect = LockNotOwnedError("expired")
+        self.assertEqual(drain_rating_buffer(), 0)
+        self.assertFalse(Rating.objects.exists())
+        self.buffer.ltrim.assert_not_called()
+
+    def test_expired_lock_stops_before_reading(self):
+        self.lock.extend.side_effect = LockNotOwnedError("expired")
+        self.lock.release.side_effect = LockNotOwnedError("expired")
+        self.assertEqual(drain_rating_buffer(), 0)
+        self.buffer.lrange.assert_not_called()
+
+
+# Runs the full text search on PostgreSQL and the icontains fallback elsewhere
+class SearchTests(TestCase):
+    def setUp(self):
+        self.by_name = make_course("Zanzibar")
+        self.by_name.courseName = "Zanzibar cooking"
+        self.by_name.save()
+        self.by_description = make_course("Spices")
+        self.by_description.courseDescription = "Recipes from zanzibar markets"
+        self.by_description.save()
+        self.by_tag = make_course("Islands")
+        CourseTag.objects.create(courseID=self.by_tag, tagID=Tags.objects.create(tagName="zanzibar"))
+
+    def search(self, **params):
+        response = self.client.get("/api/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_courses_are_ranked_by_where_the_text_is(self):
+        results = self.search(q="zanzibar")["results"]
+        ids = [course["courseID"] for course in results]
+        self.assertEqual(set(ids), {self.by_name.pk, self.by_description.pk, self.by_tag.pk})
+        self.assertEqual(ids[0], self.by_name.pk)
+        self.assertIn("ratingAverage", results[0])
+        self.assertNotIn("searchVector", results[0])
+
+    def test_lessons_and_tag_changes(self):
+        lesson = Lessons.objects.create(courseID=self.by_tag, lessonName="Beaches", lessonDescription="Sand")
+        tag = Tags.objects.create(tagName="snorkel")
+        LessonTag.objects.create(lessonID=lesson, tagID=tag)
+        self.assertEqual([row["lessonID"] for row in self.search(q="snorkel", type="lessons")["results"]], [lesson.pk])
+
+        tag.tagName = "diving"
+        tag.save()
+        self.assertEqual(self.search(q="snorkel", type="lessons")["results"], [])
+        self.assertEqual(len(self.search(q="diving", type="lessons")["results"]), 1)
+
+    def test_cursor_pages_cover_every_match_once(self):
+        # Renamed without signals, picked up by the rebuild. Equal names give equal ranks
+        for number in range(5):
+            Courses.objects.filter(pk=make_course(f"Tour{number}").pk).update(courseName="Zanzibar tours")
+        call_command("rebuild_search_vectors", stdout=StringIO())
+        expected = self.search(q="zanzibar", page_size=100)["results"]
+        seen = []
+        url = "/api/search/?q=zanzibar&page_size=2"
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data["results"]), 2)
+            seen.extend(course["courseID"] for course in data["results"])
+            url = data["next"]
+        self.assertEqual(seen, [course["courseID"] for course in expected])
+        self.assertEqual(len(seen), 8)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/search/").status_code, 400)
+        self.assertEqual(self.client.get("/api/search/", {"q": "x", "type": "users"}).status_code, 400)
+
+
+class TagFilterTestCase(TestCase):
+    def setUp(self):
+        self.tags = {name: Tags.objects.create(tagName=name) for name in ("python", "algorithms", "web", "beginner")}
+        self.both = self.make_tagged("Both", ["python", "algorithms"], ["beginner"])
+        self.python = self.make_tagged("Python", ["python", "web"])
+        self.lesson_tagged = self.make_tagged("Lessons", [], ["algorithms"])
+        self.unpublished = self.make_tagged("Draft", ["python", "algorithms"], published=False)
+
+    #Course tags go on the course, lesson tags on a lesson of the course
+    def make_tagged(self, name, course_tags, lesson_tags=(), published=True):
+        course = make_course(name)
+        Courses.objects.filter(pk=course.pk).update(isPublished=published)
+        for tag in course_tags:
+            CourseTag.objects.create(courseID=course, tagID=self.tags[tag])
+        lesson = Lessons.objects.create(courseID=course, lessonName=f"{name} lesson", lessonDescription="Description")
+        for tag in lesson_tags:
+            LessonTag.objects.create(lessonID=lesson, tagID=self.tags[tag])
+        return course
+
+    def by_tags(self, **params):
+        response = self.client.get("/api/courses/by-tags/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def course_ids(self, **params):
+        return [course["courseID"] for course in self.by_tags(**params)["results"]]
+
+    def check_matches_and_facets(self):
+        self.assertEqual(self.course_ids(tag_names="python,algorithms"), [self.both.pk])
+        self.assertEqual(self.course_ids(tags=f"{self.tags['python'].pk},{self.tags['algorithms'].pk}", match="any"),
+                         [self.both.pk, self.python.pk, self.lesson_tagged.pk])
+        self.assertEqual(self.course_ids(tag_names="python,missing"), [])
+        self.assertEqual(self.course_ids(tag_names="python,missing", match="any"), [self.both.pk, self.python.pk])
+
+        data = self.by_tags(tag_names="python")
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(data["facets"], [
+            {"tagID": self.tags["algorithms"].pk, "tagName": "algorithms", "count": 1},
+            {"tagID": self.tags["web"].pk, "tagName": "web", "count": 1},
+            {"tagID": self.tags["beginner"].pk, "tagName": "beginner", "count": 1},
+        ])
+
+
+class TagFilterDatabaseTests(TagFilterTestCase):
+    # Redis down, answered from the database
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(tag_index, "filter_courses", side_effect=redis.ConnectionError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matches_and_facets(self):
+        self.check_matches_and_facets()
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/courses/by-tags/").status_code, 400)
+        self.assertEqual(self.client.get("/api/courses/by-tags/", {"tags": "python"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/courses/by-tags/", {"tags": "1", "match": "some"}).status_code, 400)
+
+
+@skipUnless(redis_available(settings.TAG_INDEX_URL), "needs the tag index Redis")
+class TagIndexTests(TagFilterTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("schedule_topic_courses_refresh", "schedule_catalog_snapshot"):
+            patcher = mock.patch(f"backend_app.signals.{name}")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # The three published test courses, plus the tagged courses of the 0002 sample data
+        self.assertEqual(rebuild_tag_index(), len(tag_index.course_tag_sets()))
+
+    def test_matches_and_facets(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.by_tags(tags=str(self.tags["python"].pk))
+        # Only the page of courses and the facet tag names are read from the database
+        self.assertFalse([query for query in queries if "coursetag" in query["sql"]])
+        self.check_matches_and_facets()
+
+    def test_incremental_updates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseTag.objects.create(courseID=self.python, tagID=self.tags["algorithms"])
+        self.assertEqual(self.course_ids(tag_names="python,algorithms"), [self.both.pk, self.python.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unpublished.isPublished = True
+            self.unpublished.save()
+            Lessons.objects.filter(courseID=self.both).delete()
+        self.assertEqual(self.course_ids(tag_names="beginner"), [])
+        self.assertEqual(self.course_ids(tag_names="python,algorithms"), [self.both.pk, self.python.pk, self.unpublished.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags["algorithms"].delete()
+            self.python.delete()
+        self.assertEqual(self.course_ids(tag_names="python"), [self.both.pk, self.unpublished.pk])
+        self.assertEqual(self.by_tags(tag_names="python")["facets"], [])
+
+    def test_stale_reindex_keeps_both_sides_in_step(self):
+        # A reindex that read the database before another one applied its result runs last
+        with mock.patch.object(tag_index, "course_tag_sets", return_value={self.both.pk: {self.tags["python"].pk}}):
+            tag_index.reindex_courses([self.both.pk])
+        self.assertEqual(self.course_ids(tag_names="algorithms"), [self.lesson_tagged.pk])
+        tag_index.reindex_courses([self.both.pk])
+        self.assertEqual(self.course_ids(tag_names="algorithms"), [self.both.pk, self.lesson_tagged.pk])
+
+    def test_rebuild_keeps_changes_committed_while_it_runs(self):
+        course_tag_sets = tag_index.course_tag_sets
+
+        def snapshot_then_change(course_ids=None):
+            tag_sets = course_tag_sets(course_ids)
+            if course_ids is None:
+                with self.captureOnCommitCallbacks(execute=True):
+                    CourseTag.objects.create(courseID=self.python, tagID=self.tags["algorithms"])
+            return tag_sets
+
+        with mock.patch.object(tag_index, "course_tag_sets", side_effect=snapshot_then_change):
+            rebuild_tag_index()
+        self.assertEqual(self.course_ids(tag_names="python,algorithms"), [self.both.pk, self.python.pk])
+
+
+class TagSuggestTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.lesson = Lessons.objects.create(courseID=self.course, lessonName="Lesson", lessonDescription="Description")
+        # Names unlike the topics and tags of the 0002 sample data
+        self.topic = Topics.objects.create(topicName="Web Development")
+        self.tags = {name: Tags.objects.create(tagName=name) for name in ("django", "django-rest", "djangocms", "pydjango", "java")}
+
+    def usage(self, name):
+        return Tags.objects.get(tagName=name).usageCount
+
+    def suggest(self, **params):
+        response = self.client.get("/api/tags/suggest/", params)
+        self.assertEqual(response.status_code, 200)
+        return [(tag["tagName"], tag["match"]) for tag in response.json()["results"]]
+
+    def test_a_save_loads_the_previous_link_once(self):
+        link = CourseTag.objects.create(courseID=self.course, tagID=self.tags["django"])
+        other = make_course("Other")
+        link.courseID, link.tagID = other, self.tags["java"]
+        with CaptureQueriesContext(connection) as queries:
+            link.save()
+        lookups = [query["sql"] for query in queries if 'FROM "backend_app_coursetag" WHERE "backend_app_coursetag"."courseTagID" =' in query["sql"]]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual((link._previous_course_id, link._previous_tag_id), (self.course.pk, self.tags["django"].pk))
+        self.assertEqual((self.usage("django"), self.usage("java")), (0, 1))
+
+    def test_usage_counts_follow_the_links(self):
+        CourseTag.objects.create(courseID=self.course, tagID=self.tags["django"])
+        LessonTag.objects.create(lessonID=self.lesson, tagID=self.tags["django"])
+        link = TopicTag.objects.create(topicID=self.topic, tagID=self.tags["django"])
+        self.assertEqual(self.usage("django"), 3)
+
+        link.tagID = self.tags["java"]
+        link.save()
+        self.assertEqual((self.usage("django"), self.usage("java")), (2, 1))
+        # Renaming a tag loaded before its links changed keeps the count
+        self.tags["django"].tagName = "django2"
+        self.tags["django"].save()
+        self.assertEqual(self.usage("django2"), 2)
+
+        self.course.delete()
+        self.assertEqual(self.usage("django2"), 0)
+        Tags.objects.update(usageCount=0)
+        call_command("rebuild_tag_usage", stdout=StringIO())
+        self.assertEqual(self.usage("java"), 1)
+
+    def test_prefix_matches_come_first_most_used_first(self):
+        CourseTag.objects.create(courseID=self.course, tagID=self.tags["djangocms"])
+        self.assertEqual(self.suggest(q="DJA")[:3], [("djangocms", "prefix"), ("django", "prefix"), ("django-rest", "prefix")])
+        self.assertIn(("pydjango", "similar"), self.suggest(q="jango"))
+        self.assertEqual(self.suggest(q="dj", limit=2), [("djangocms", "prefix"), ("django", "prefix")])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/tags/suggest/").status_code, 400)
+        self.assertEqual(self.client.get("/api/tags/suggest/", {"q": "dj", "limit": "many"}).status_code, 400)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TopicBrowseTests(TestCase):
+    def setUp(self):
+        # Keep on-commit callbacks from queueing snapshot builds on the broker
+        patcher = mock.patch("backend_app.signals.schedule_catalog_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        # Names unlike the topics of the 0002 sample data
+        self.topic = Topics.objects.create(topicName="Programming")
+        self.other_topic = Topics.objects.create(topicName="Art")
+        tags = {name: Tags.objects.create(tagName=name) for name in ("python", "algorithms", "drawing")}
+        TopicTag.objects.create(topicID=self.topic, tagID=tags["python"])
+        TopicTag.objects.create(topicID=self.topic, tagID=tags["algorithms"])
+        TopicTag.objects.create(topicID=self.other_topic, tagID=tags["drawing"])
+
+        self.courses = []
+        for name, course_tags, ratings, published in (
+            ("Intro", ["python", "algorithms"], [5, 4], True),
+            ("Sorting", ["algorithms"], [3], True),
+            ("Draft", ["python"], [1], False),
+        ):
+            course = make_course(name)
+            Courses.objects.filter(pk=course.pk).update(isPublished=published)
+            for tag in course_tags:
+                CourseTag.objects.create(courseID=course, tagID=tags[tag])
+            for rating in ratings:
+                Rating.objects.create(courseID=course, rating=rating)
+            self.courses.append(course)
+        topic_browse.refresh_topic_courses()
+
+    def browse(self, topic, **params):
+        response = self.client.get(f"/api/topics/{topic.topicID}/courses/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_published_courses_with_topic_totals(self):
+        data = self.browse(self.topic)
+        # Intro shares two tags with the topic but is listed once
+        self.assertEqual([course["courseID"] for course in data["results"]], [self.courses[0].pk, self.courses[1].pk])
+        self.assertEqual(data["topic"], {
+            "topicID": self.topic.topicID, "topicName": "Programming",
+            "courseCount": 2, "ratingCount": 3, "ratingAverage": 4.0,
+        })
+        empty = self.browse(self.other_topic)
+        self.assertEqual((empty["results"], empty["topic"]["courseCount"], empty["topic"]["ratingAverage"]), ([], 0, None))
+
+    def test_pages_follow_the_course_id(self):
+        first = self.browse(self.topic, page_size=1)
+        self.assertEqual(len(first["results"]), 1)
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([course["courseID"] for course in second["results"]], [self.courses[1].pk])
+
+    def test_link_changes_queue_one_refresh(self):
+        with mock.patch.object(refresh_topic_courses, "apply_async") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.courses[2].isPublished = True
+                self.courses[2].save()
+                CourseTag.objects.filter(courseID=self.courses[1]).delete()
+            self.assertEqual(schedule.call_count, 1)
+        # Served from the index until the refresh runs
+        self.assertEqual(self.browse(self.topic)["topic"]["courseCount"], 2)
+        refresh_topic_courses()
+        data = self.browse(self.topic)
+        self.assertEqual([course["courseID"] for course in data["results"]], [self.courses[0].pk, self.courses[2].pk])
+        self.assertEqual((data["topic"]["ratingCount"], data["topic"]["ratingAverage"]), (3, 3.33))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        # Keep on-commit callbacks from queueing snapshot builds on the broker
+        patcher = mock.patch("backend_app.signals.schedule_catalog_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.course = make_course()
+        self.lesson = Lessons.objects.create(courseID=self.course, lessonName="Lesson", lessonDescription="Description")
+        # Names unlike the topics of the 0002 sample data
+        self.topic = Topics.objects.create(topicName="Programming")
+
+    def get(self, url, queries=None):
+        if queries is None:
+            response = self.client.get(url)
+        else:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_reads_are_cached_until_a_row_changes(self):
+        detail = f"/api/courses/{self.course.courseID}/"
+        lessons = f"/api/courses/{self.course.courseID}/lessons/"
+        self.get(detail)
+        self.assertEqual(self.get(detail, queries=0)["ratingCount"], 0)
+        self.get("/api/courses/")
+        self.get("/api/courses/", queries=0)
+        self.get(lessons)
+        self.get(lessons, queries=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(courseID=self.course, rating=4)
+        self.assertEqual(self.get(detail)["ratingCount"], 1)
+        listed = next(course for course in self.get("/api/courses/")["results"] if course["courseID"] == self.course.courseID)
+        self.assertEqual(listed["ratingCount"], 1)
+        # Lessons and uploads only change their own course's entries
+        other = make_course("Other")
+        self.get(f"/api/courses/{other.courseID}/", queries=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Uploaded.objects.create(lessonID=self.lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+        self.assertEqual(len(self.get(lessons)["results"][0]["uploads"]), 1)
+        self.get(f"/api/courses/{other.courseID}/", queries=0)
+        self.get("/api/courses/", queries=0)
+
+    def test_topics(self):
+        count = len(self.get("/api/topics/")["results"])
+        self.get(f"/api/topics/{self.topic.topicID}/")
+        self.get(f"/api/topics/{self.topic.topicID}/", queries=0)
+        self.get("/api/topics/", queries=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Topics.objects.create(topicName="Art")
+        self.assertEqual(len(self.get("/api/topics/")["results"]), count + 1)
+
+    def test_stale_entry_served_while_another_request_rebuilds(self):
+        url = f"/api/courses/{self.course.courseID}/"
+        with override_settings(CATALOG_CACHE_TTL=0):
+            self.get(url)
+            with mock.patch.object(catalog_cache, "_claim", return_value=False):
+                self.get(url, queries=0)
+            self.get(url, queries=2)
+        login_staff(self.client)
+        stats = self.client.get("/api/cache-stats/").json()["stats"]["catalog"]
+        self.assertEqual((stats["miss"], stats["stale"], stats["hit"]), (2, 1, 0))
+        self.assertEqual(stats["hit_rate"], round(1 / 3, 4))
+
+    def test_missing_course_is_not_cached(self):
+        self.assertEqual(self.client.get("/api/courses/999999/").status_code, 404)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get("/api/courses/999999/").status_code, 404)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        # Keep on-commit callbacks from queueing snapshot builds on the broker
+        patcher = mock.patch("backend_app.signals.schedule_catalog_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.course = make_course()
+        self.lesson = Lessons.objects.create(courseID=self.course, lessonName="Lesson", lessonDescription="Description")
+        self.tag = Tags.objects.create(tagName="python")
+
+    def revalidate(self, url, response, queries):
+        with self.assertNumQueries(queries):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_list_is_not_sent_again(self):
+        first = self.client.get("/api/tags/")
+        self.assertTrue(first["ETag"].startswith('W/"'))
+        # Only the validators are read, nothing is serialized
+        second = self.revalidate("/api/tags/", first, 1)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(self.client.get("/api/tags/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+
+    def test_edits_and_deletes_change_the_etag(self):
+        etag = self.client.get("/api/tags/")["ETag"]
+        self.tag.tagName = "python3"
+        self.tag.save()
+        self.assertEqual(self.client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        other = Tags.objects.create(tagName="rust")
+        etag = self.client.get("/api/tags/")["ETag"]
+        other.delete()
+        self.assertEqual(self.client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_reads_revalidate_without_queries(self):
+        detail = f"/api/courses/{self.course.courseID}/"
+        lessons = f"/api/courses/{self.course.courseID}/lessons/"
+        first, first_lessons = self.client.get(detail), self.client.get(lessons)
+        self.assertEqual(self.revalidate(detail, first, 0).status_code, 304)
+        self.assertEqual(self.revalidate(lessons, first_lessons, 0).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(courseID=self.course, rating=5)
+        response = self.revalidate(detail, first, 2)
+        self.assertEqual((response.status_code, response.json()["ratingCount"]), (200, 1))
+
+    def test_upload_changes_touch_the_lesson(self):
+        url = f"/api/lessons/{self.lesson.lessonID}/"
+        first = self.client.get(url)
+        Uploaded.objects.create(lessonID=self.lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((response.status_code, len(response.json()["uploads"])), (200, 1))
+
+    def test_only_anonymous_reads_of_published_content_are_public(self):
+        url = f"/api/lessons/{self.lesson.lessonID}/"
+        self.assertIn("private", self.client.get(url)["Cache-Control"])
+        self.course.isPublished = True
+        self.course.save()
+        response = self.client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn(f"max-age={settings.CATALOG_MAX_AGE}", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+        self.assertIn("private", self.client.get(url, HTTP_AUTHORIZATION="Bearer token")["Cache-Control"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CATALOG_CHANGES_SETTLE_SECONDS=0
+)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        for name in ("schedule_topic_courses_refresh", "schedule_catalog_snapshot"):
+            patcher = mock.patch(f"backend_app.signals.{name}")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Rows present before the test were logged by the migration
+        self.since = CatalogChange.objects.aggregate(last=Max('seq'))['last'] or 0
+
+    def feed(self, since=None, **params):
+        response = self.client.get("/api/changes/", {"since": self.since if since is None else since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def entries(self, data, model_name=None):
+        return [
+            (change["modelName"], change["objectID"], change["action"]) for change in data["changes"]
+            if model_name is None or change["modelName"] == model_name
+        ]
+
+    def test_feed_follows_creates_updates_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course()
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lessons.objects.create(courseID=course, lessonName="Lesson", lessonDescription="Description")
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = Uploaded.objects.create(lessonID=lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+        data = self.feed()
+        self.assertEqual(self.entries(data)[:2], [("courses", course.pk, "created"), ("lessons", lesson.pk, "created")])
+        # The lesson shows its uploads, so it is logged again with the upload in it
+        self.assertIn(("lessons", lesson.pk, "updated"), self.entries(data))
+        self.assertEqual(len(data["changes"][-1]["data"]["uploads"]), 1)
+
+        # delete() clears the primary keys
+        course_id, lesson_id = course.pk, lesson.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        deleted = self.feed(since=data["next"])
+        self.assertEqual(set(self.entries(deleted)), {
+            ("uploaded", upload.pk, "deleted"), ("lessons", lesson_id, "deleted"), ("courses", course_id, "deleted")
+        })
+        self.assertTrue(all(change["data"] is None for change in deleted["changes"]))
+
+    def test_ratings_log_their_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course()
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(courseID=course, rating=4)
+        changes = [change for change in self.feed()["changes"] if change["modelName"] == "courses"]
+        self.assertEqual(changes[-1]["action"], "updated")
+        self.assertEqual(changes[-1]["data"]["ratingCount"], 1)
+
+    def test_bulk_writers_log_the_rows_they_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course()
+            lesson = Lessons.objects.create(courseID=course, lessonName="Lesson", lessonDescription="Description")
+            upload = Uploaded.objects.create(lessonID=lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+        since = CatalogChange.objects.aggregate(last=Max('seq'))['last']
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"items": [{"id": "dQw4w9WgXcQ", "snippet": {"title": "Renamed"}, "status": {"embeddable": True}}]}
+        with override_settings(YOUTUBE_API_KEY="key"), mock.patch("backend_app.tasks.youtube_client") as client:
+            client.return_value.get.return_value = response
+            with self.captureOnCommitCallbacks(execute=True):
+                refresh_video_metadata()
+        data = self.feed(since=since)
+        self.assertIn(("uploaded", upload.pk, "updated"), self.entries(data))
+        self.assertIn(("lessons", lesson.pk, "updated"), self.entries(data))
+        refreshed = next(change for change in data["changes"] if change["modelName"] == "uploaded" and change["objectID"] == upload.pk)
+        self.assertEqual(refreshed["data"]["metadata"]["title"], "Renamed")
+
+        since = self.feed(since=since)["next"]
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_rating_aggregates([course.pk])
+        self.assertEqual(self.entries(self.feed(since=since)), [("courses", course.pk, "updated")])
+
+    def test_batches_wait_for_changes_to_settle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tags = [Tags.objects.create(tagName=f"tag{index}") for index in range(3)]
+        first = self.feed(limit=2)
+        self.assertEqual((len(first["changes"]), first["more"]), (2, True))
+        second = self.feed(since=first["next"], limit=2)
+        self.assertEqual((self.entries(second), second["more"]), ([("tags", tags[2].pk, "created")], False))
+        with override_settings(CATALOG_CHANGES_SETTLE_SECONDS=60):
+            waiting = self.feed()
+        self.assertEqual((waiting["changes"], waiting["next"]), ([], self.since))
+
+    def test_compaction_keeps_the_latest_entry_of_each_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tags.objects.create(tagName="python")
+        for name in ("python3", "python4"):
+            with self.captureOnCommitCallbacks(execute=True):
+                tag.tagName = name
+                tag.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Tags.objects.create(tagName="rust")
+        self.assertEqual(len(self.feed()["changes"]), 4)
+
+        compact_catalog_changes()
+        data = self.feed()
+        self.assertEqual(self.entries(data), [("tags", tag.pk, "updated"), ("tags", other.pk, "created")])
+        self.assertEqual(data["changes"][0]["data"]["tagName"], "python4")
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_dir, True)
+        settings_override = override_settings(CATALOG_SNAPSHOT_DIR=self.snapshot_dir, CATALOG_SNAPSHOT_KEEP=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch("backend_app.signals.schedule_catalog_snapshot")
+        self.scheduled = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.course = make_course()
+        self.course.isPublished = True
+        self.course.courseDescription = "A long description of the course. " * 20
+        self.course.save()
+        self.draft = make_course("Draft")
+        lesson = Lessons.objects.create(courseID=self.course, lessonName="Lesson", lessonDescription="Description")
+        Uploaded.objects.create(lessonID=lesson, videoURL="https://youtu.be/dQw4w9WgXcQ")
+        CourseTag.objects.create(courseID=self.course, tagID=Tags.objects.create(tagName="python"))
+        Rating.objects.create(courseID=self.course, rating=4)
+
+    def read(self, manifest):
+        with open(os.path.join(self.snapshot_dir, manifest["file"])) as file:
+            return json.load(file)
+
+    def test_snapshot_holds_the_published_catalog(self):
+        manifest = build_catalog_snapshot()
+        courses = {course["courseID"]: course for course in self.read(manifest)["courses"]}
+        # The published courses of the 0002 sample data are in it too, the draft is not
+        self.assertEqual(set(courses), set(Courses.objects.filter(isPublished=True).values_list('courseID', flat=True)))
+        self.assertNotIn(self.draft.courseID, courses)
+        course = courses[self.course.courseID]
+        self.assertEqual(course["tags"], ["python"])
+        self.assertEqual((course["rating"]["average"], course["rating"]["count"]), (4.0, 1))
+        self.assertEqual(course["lessons"][0]["videoIDs"], ["dQw4w9WgXcQ"])
+        self.assertTrue(os.path.exists(os.path.join(self.snapshot_dir, manifest["file"] + ".gz")))
+        self.assertEqual([name for name in os.listdir(self.snapshot_dir) if ".tmp" in name], [])
+
+    def test_compressed_copies_are_in_place_before_the_snapshot(self):
+        replace = os.replace
+        published = []
+
+        def record(source, destination):
+            replace(source, destination)
+            published.append(os.path.basename(destination))
+
+        with mock.patch("backend_app.catalog_snapshot.os.replace", side_effect=record):
+            manifest = build_catalog_snapshot()
+        name = manifest["file"]
+        self.assertIn(f"{name}.gz", published)
+        self.assertLess(published.index(f"{name}.gz"), published.index(name))
+        self.assertEqual(published[-1], "manifest.json")
+
+    def test_versions_follow_the_contents(self):
+        first = build_catalog_snapshot()
+        self.assertEqual(build_catalog_snapshot()["version"], first["version"])
+        for name in ("Renamed", "Renamed again"):
+            self.course.courseName = name
+            self.course.save()
+            latest = build_catalog_snapshot()
+        self.assertNotEqual(latest["version"], first["version"])
+        renamed = next(course for course in self.read(latest)["courses"] if course["courseID"] == self.course.courseID)
+        self.assertEqual(renamed["courseName"], "Renamed again")
+        # Only CATALOG_SNAPSHOT_KEEP versions stay on disk
+        self.assertFalse(os.path.exists(os.path.join(self.snapshot_dir, first["file"])))
+
+    def test_manifest_and_snapshot_are_served(self):
+        with mock.patch("backend_app.views.schedule_catalog_snapshot") as schedule:
+            self.assertEqual(self.client.get("/api/catalog/manifest/").status_code, 503)
+        schedule.assert_called_once()
+
+        build_catalog_snapshot()
+        manifest = self.client.get("/api/catalog/manifest/")
+        self.assertIn(f"max-age={settings.CATALOG_SNAPSHOT_MANIFEST_MAX_AGE}", manifest["Cache-Control"])
+        response = self.client.get(manifest.json()["url"], HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(self.client.get(f"{settings.CATALOG_SNAPSHOT_URL}catalog.0000000000000000.json").status_code, 404)
+
+    def test_writes_queue_one_debounced_build(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(courseID=self.course, rating=5)
+        self.scheduled.assert_called()
+        with mock.patch.object(build_catalog_snapshot, "apply_async") as queue:
+            schedule_catalog_snapshot()
+            schedule_catalog_snapshot()
+        self.assertEqual(queue.call_count, 1)
 
-# Create your tests here.
@@ -0,0 +1,86 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger("django")
+
+"""
+Topic -> published course browse index behind /topics/<id>/courses/.
+Topics only reach courses through TopicTag -> Tags -> CourseTag, so the mapping is precomputed:
+- backend_app_topiccourse (TopicCourse): one row per topic and published course sharing a tag,
+  with the course's rating count and sum from CourseRatingAggregate
+- backend_app_topiccoursesummary (TopicCourseSummary): per topic course count and rating totals
+On PostgreSQL both are materialized views refreshed CONCURRENTLY, so reads never wait on a
+refresh. Other databases (SQLite in development) keep them as tables rewritten in a transaction.
+refresh_topic_courses runs from celery-beat every TOPIC_COURSES_REFRESH_INTERVAL, and the
+signal handlers in signals.py queue one TOPIC_COURSES_REFRESH_DELAY seconds after tag links
+or courses change (claim_refresh lets only the first change of a burst queue it).
+Migration 0010 creates both, with the unique index CONCURRENTLY needs.
+"""
+
+TOPIC_COURSES_VIEW = "backend_app_topiccourse"
+TOPIC_SUMMARY_VIEW = "backend_app_topiccoursesummary"
+REFRESH_QUEUED_KEY = "topics:courses:refresh-queued"
+
+TOPIC_COURSES_SQL = """
+SELECT
+    tt."topicID_id" || '-' || c."courseID" AS "id",
+    tt."topicID_id" AS "topicID_id",
+    c."courseID" AS "courseID_id",
+    COALESCE(a."ratingCount", 0) AS "ratingCount",
+    COALESCE(a."ratingSum", 0) AS "ratingSum"
+FROM backend_app_topictag tt
+JOIN backend_app_coursetag ct ON ct."tagID_id" = tt."tagID_id"
+JOIN backend_app_courses c ON c."courseID" = ct."courseID_id" AND c."isPublished"
+LEFT JOIN backend_app_courseratingaggregate a ON a."courseID_id" = c."courseID"
+GROUP BY tt."topicID_id", c."courseID", a."ratingCount", a."ratingSum"
+"""
+
+TOPIC_SUMMARY_SQL = f"""
+SELECT
+    "topicID_id" AS "topicID_id",
+    COUNT(*) AS "courseCount",
+    SUM("ratingCount") AS "ratingCount",
+    SUM("ratingSum") AS "ratingSum"
+FROM {TOPIC_COURSES_VIEW}
+GROUP BY "topicID_id"
+"""
+
+#(name, query), summary after the rows it sums
+VIEWS = (
+    (TOPIC_COURSES_VIEW, TOPIC_COURSES_SQL),
+    (TOPIC_SUMMARY_VIEW, TOPIC_SUMMARY_SQL),
+)
+
+def _materialized(connection):
+    return connection.vendor == "postgresql"
+
+#Recompute both views from the tag links, courses and rating aggregates
+def refresh_topic_courses():
+    with connection.cursor() as cursor:
+        if _materialized(connection):
+            for name, _ in VIEWS:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+        else:
+            with transaction.atomic():
+                for name, query in VIEWS:
+                    cursor.execute(f"DELETE FROM {name}")
+                    cursor.execute(f"INSERT INTO {name} {query}")
+    logger.debug("Topic_Courses_Refreshed")
+
+#True for the first change asking for a refresh while none is queued
+def claim_refresh():
+    try:
+        return cache.add(REFRESH_QUEUED_KEY, 1, settings.TOPIC_COURSES_REFRESH_DELAY + 60)
+    except Exception as e:
+        logger.error(f"Topic courses refresh claim failed: {e}")
+        return True
+
+#Called when a refresh starts, later changes queue the next one
+def release_refresh():
+    try:
+        cache.delete(REFRESH_QUEUED_KEY)
+    except Exception as e:
+        logger.error(f"Topic courses refresh release failed: {e}")
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     UserInfoViewAll, InstructorViewAll, TopicViewAll, CourseViewAll,
     LessonViewAll, RatingViewAll, TagViewAll, TopicTagViewAll, 
-    CourseTagViewAll, LessonTagViewAll, UploadedViewAll
+    CourseTagViewAll, LessonTagViewAll, UploadedViewAll, download_file, SearchView, catalog_cache_stats,
+    ChangeFeedView, catalog_snapshot_manifest
 )
 
 router = DefaultRouter()
@@ -22,6 +23,11 @@ router.register(r'uploaded', UploadedViewAll, basename="uploaded")
 urlpatterns = [
     path("upload/", include("backend_app.upload_urls")),
     path('youtube/', include("backend_app.youtube_urls")),
+    path('uploaded/<int:file_id>/download/', download_file, name="download_file"),
+    path('search/', SearchView.as_view(), name="search"),
+    path('cache-stats/', catalog_cache_stats, name="catalog_cache_stats"),
+    path('changes/', ChangeFeedView.as_view(), name="changes"),
+    path('catalog/manifest/', catalog_snapshot_manifest, name="catalog_snapshot_manifest"),
     path('', include(router.urls)),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 ]
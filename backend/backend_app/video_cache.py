@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+
+from .caching import cache_get, cache_set, cache_delete, record, cache_stats
+from .youtube import youtube_client
+
+logger = logging.getLogger("django")
+
+"""
+Cache of each channel's video list, so the instructor dashboard does not re-crawl YouTube.
+An entry is served directly while fresh (YOUTUBE_VIDEO_CACHE_TTL). After that it is kept for
+YOUTUBE_VIDEO_CACHE_STALE_TTL and revalidated with the ETag of the first search page, a 304
+makes it fresh again without listing the channel. Updates and deletes patch the entry and a
+finished upload drops it.
+- videos: the list fetch_youtube_videos returned
+- etag: ETag of the first search page when the list was fetched
+- fresh_until: unix time until which the entry is served without asking YouTube
+"""
+
+CACHE_NAME = "youtube_videos"
+CACHE_OUTCOMES = ("hit", "revalidated", "miss")
+
+def _token_key(access_token):
+    return "youtube:token:" + hashlib.sha256(access_token.encode()).hexdigest()
+
+def _channel_key(channel_id):
+    return f"youtube:channel:{channel_id}:videos"
+
+#Channel of the token's owner, remembered for the token's lifetime (None if unknown)
+def get_channel_id(access_token):
+    key = _token_key(access_token)
+    channel_id = cache_get(key)
+    if channel_id:
+        return channel_id
+
+    response = youtube_client().get(
+        "/youtube/v3/channels",
+        params={"part": "id", "mine": "true"},
+        headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    )
+    if response.status_code != 200:
+        return None
+    items = response.json().get("items", [])
+    if not items:
+        return None
+    channel_id = items[0]["id"]
+    cache_set(key, channel_id, settings.YOUTUBE_TOKEN_CACHE_TTL)
+    return channel_id
+
+def get_entry(channel_id):
+    return cache_get(_channel_key(channel_id))
+
+def is_fresh(entry):
+    return entry is not None and entry["fresh_until"] > time.time()
+
+def store_videos(channel_id, videos, etag):
+    cache_set(_channel_key(channel_id), {
+        "videos": videos,
+        "etag": etag,
+        "fresh_until": time.time() + settings.YOUTUBE_VIDEO_CACHE_TTL,
+    }, settings.YOUTUBE_VIDEO_CACHE_STALE_TTL)
+
+#A 304 on revalidation, keep serving the same list for another fresh period
+def refresh_entry(channel_id, entry):
+    store_videos(channel_id, entry["videos"], entry["etag"])
+
+def invalidate_channel(channel_id):
+    cache_delete(_channel_key(channel_id))
+
+#Apply an edit to the cached copy of one video (fields use fetch_video_details names)
+def patch_video(channel_id, video_id, changes):
+    entry = get_entry(channel_id)
+    if entry is None:
+        return
+    for video in entry["videos"]:
+        if video["id"] == video_id:
+            video.update(changes)
+    cache_set(_channel_key(channel_id), entry, settings.YOUTUBE_VIDEO_CACHE_STALE_TTL)
+
+def remove_video(channel_id, video_id):
+    entry = get_entry(channel_id)
+    if entry is None:
+        return
+    entry["videos"] = [video for video in entry["videos"] if video["id"] != video_id]
+    cache_set(_channel_key(channel_id), entry, settings.YOUTUBE_VIDEO_CACHE_STALE_TTL)
+
+#Invalidate the cache of whoever owns access_token, never raising
+def invalidate_for_token(access_token):
+    try:
+        channel_id = get_channel_id(access_token)
+        if channel_id:
+            invalidate_channel(channel_id)
+    except Exception as e:
+        logger.error(f"Video cache invalidation failed: {e}")
+
+def record_outcome(outcome):
+    record(CACHE_NAME, outcome)
+
+def video_cache_stats():
+    return cache_stats(CACHE_NAME, CACHE_OUTCOMES)
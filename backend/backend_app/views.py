@@ -1,29 +1,46 @@
 import json
 import logging
-import base64
-import re
-
-from django.http import JsonResponse
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Max, Prefetch, Q
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import require_GET, require_POST, require_safe
 
-import requests
-from rest_framework import viewsets
+from rest_framework import generics, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from celery.result import AsyncResult
-
-from .tasks import link_uploaded, upload_to_youtube, ensure_playlist_exists
+import redis
+
+from .tasks import link_uploaded, upload_to_youtube, upload_to_youtube_now, UPLOAD_IN_PROGRESS, ensure_playlist_exists, drain_rating_buffer, rebuild_tag_index, schedule_catalog_snapshot
+from .youtube import youtube_client, youtube_executor, extract_video_id, parse_video
+from . import video_cache, course_bundle, tag_index, catalog_cache, conditional, changes, catalog_snapshot
+from .blobstore import open_blob
+from .ratings import buffer_ratings
+from .pagination import RankedKeysetPagination
+from .search import search, SEARCH_TARGETS
+from .tag_suggest import suggest_tags
+from .spool import spool_upload, discard_spooled, SpoolingUploadHandler, UploadTooLarge
 from .models import (
     UserInfo, Instructor, Topics, Courses, Lessons, Rating, Tags, 
-    TopicTag, CourseTag, LessonTag, Uploaded
+    TopicTag, CourseTag, LessonTag, Uploaded, VideoMetadata, TopicCourse, TopicCourseSummary, CatalogChange
 )
 from .serializers import (
     UserInfoSerializer, InstructorSerializer, TopicSerializer, 
     CourseSerializer, LessonSerializer, RatingSerializer, 
     TagSerializer, TopicTagSerializer, CourseTagSerializer, 
-    LessonTagSerializer, UploadedSerializer
+    LessonTagSerializer, UploadedSerializer, UploadedSummarySerializer, UPLOAD_SUMMARY_FIELDS,
+    CourseSearchResultSerializer, LessonSearchResultSerializer, TagSuggestionSerializer
 )
 
 logger = logging.getLogger("django")
@@ -55,28 +72,11 @@ def extract_token_from_header(request):
         pass
     return None
 
-#Helper function to remove youtube junk from youtube id in url
-def extract_video_id(youtube_url):
-    log(f"Called_Extract_Video_Id")
-    #Patterns Generated with Claude 3.7 Sonnet
-    patterns=[
-        r'(?:youtube\.com\/watch\?v=|youtu.be\/)([^&\n?]+)',
-        r'youtube\.com\/shorts\/([^&\n?]+)'
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, youtube_url)
-        if match:
-            log(f"Video_Match_Extract : {match.group(1)}")
-            return match.group(1)
-    log(f"ID_Not_Extracted")
-    return None
-
 def fetch_video_details(access_token, video_ids):
     log(f"Called_Fetch_Video_Details")
     # Set up API request fields
     video_ids_str = ",".join(video_ids)
-    url = "https://www.googleapis.com/youtube/v3/videos"
+    url = "/youtube/v3/videos"
     params = {
         "part": "snippet,contentDetails,statistics,status",
         "id": video_ids_str
@@ -87,109 +87,169 @@ def fetch_video_details(access_token, video_ids):
     }
 
     #Make API Request
-    response = requests.get(url, params=params, headers=headers)
+    response = youtube_client().get(url, params=params, headers=headers)
 
     if response.status_code != 200:
         return []
 
     data = response.json()
-    videos = []
+    videos = [parse_video(item) for item in data.get("items", [])]
+    log(f"Videos_Fetched : {videos}")
+    return videos
 
-    for item in data.get("items", []):
-        snippet = item.get("snippet", {})
-        content_details = item.get("contentDetails", {})
-        statistics = item.get("statistics", {})
-        status = item.get("status", {})
-        tags = snippet.get("tags", [])
-
-        thumbnails = snippet.get("thumbnails", {})
-        thumbnail_url = None
-        for quality in ["maxres", "standard", "high", "medium", "default"]:
-            if quality in thumbnails:
-                thumbnail_url = thumbnails[quality].get('url')
-                break
+#Raised while listing videos when the search API answers with an error, carries the result dict
+class YouTubeListError(Exception):
+    def __init__(self, result):
+        super().__init__(result["error"])
+        self.result = result
 
-        # Made with AI
-        video = {
-            "id": item.get("id"),
-            "title": snippet.get("title", ""),
-            "description": snippet.get("description", ""),
-            "youtube_url": f"https://www.youtube.com/watch?v={item.get('id')}",
-            "thumbnail_url": thumbnail_url,
-            "channel_id": snippet.get("channelId"),
-            "channel_title": snippet.get("channelTitle"),
-            "published_at": snippet.get("publishedAt"),
-            "tags": tags,
-            "category_id": snippet.get("categoryId"),
-            "duration": content_details.get("duration"),
-            "view_count": statistics.get("viewCount", 0),
-            "like_count": statistics.get("likeCount", 0),
-            "comment_count": statistics.get("commentCount", 0),
-            "privacy_status": status.get("privacyStatus"),
-            "embeddable": status.get("embeddable", True),
-            "license": status.get("license"),
-        }
+#Build the error result for a failed search page response
+def search_error_result(response):
+    try:
+        error_data = response.json()
+        error_message = error_data.get("error", {}).get("message", "Unknown Error")
+        # Check specifically for token expiration
+        if response.status_code == 401:
+            return {
+                "success": False,
+                "error": "Token expired",
+                "error_code": "TOKEN_EXPIRED",
+                "details": error_message
+            }
+        return {"success": False, "error": error_message}
+    except ValueError:
+        return {"success": False, "error": f"HTTP Error: {response.status_code}"}
 
-        videos.append(video)
-    log(f"Videos_Fetched : {videos}")
-    return videos
+#etag makes the request conditional, YouTube answers 304 when the page has not changed
+def fetch_search_page(access_token, page_token, max_results, etag=None):
+    url = "/youtube/v3/search"
+    params = {
+        "part": "snippet",
+        "forMine": "true",
+        "type": "video",
+        "maxResults": max_results
+    }
 
-def fetch_youtube_videos(access_token, max_results= 50):
+    if page_token:
+        params["pageToken"] = page_token
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json"
+    }
+    if etag:
+        headers["If-None-Match"] = etag
+
+    response = youtube_client().get(url, params=params, headers=headers)
+    log(f"Fetch_Youtube_Videos_Response : {response}")
+    return response
+
+#Yield the channel's videos one search page at a time, in the original order
+#The next search page is requested while details for the current page are fetched on the
+#shared pool, so a page costs roughly one round trip instead of two
+#first_page is an already fetched response for the first search page, if the caller has one
+def iter_youtube_video_pages(access_token, max_results=50, first_page=None):
+    executor = youtube_executor()
+    pending_details = deque()
+    if first_page is None:
+        next_search = executor.submit(fetch_search_page, access_token, None, max_results)
+    else:
+        next_search = Future()
+        next_search.set_result(first_page)
+    try:
+        while next_search is not None or pending_details:
+            if next_search is not None:
+                response = next_search.result()
+                if response.status_code != 200:
+                    raise YouTubeListError(search_error_result(response))
+                data = response.json()
+
+                next_page_token = data.get("nextPageToken")
+                next_search = executor.submit(fetch_search_page, access_token, next_page_token, max_results) if next_page_token else None
+
+                video_ids = [item["id"]["videoId"] for item in data.get("items", [])]
+                if video_ids:
+                    pending_details.append(executor.submit(fetch_video_details, access_token, video_ids))
+
+            #Hand back finished pages in order without waiting on the search still in flight
+            while pending_details and (next_search is None or pending_details[0].done()):
+                yield pending_details.popleft().result()
+    finally:
+        for future in pending_details:
+            future.cancel()
+        if next_search is not None:
+            next_search.cancel()
+
+def fetch_youtube_videos(access_token, max_results= 50, first_page=None):
     log(f"Called_Fetch_Youtube_Videos")
     videos = []
-    next_page_token = None
-    
-    try:
-        while True:
-            url = "https://www.googleapis.com/youtube/v3/search"
-            params = {
-                "part": "snippet",
-                "forMine": "true",
-                "type": "video",
-                "maxResults": max_results
-            }
 
-            if next_page_token:
-                params["pageToken"] = next_page_token
+    try:
+        for page in iter_youtube_video_pages(access_token, max_results, first_page):
+            videos.extend(page)
+        return {"success": True, "videos": videos}
+    except YouTubeListError as e:
+        return e.result
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Accept": "application/json"
-            }
+#iter_youtube_video_pages behind the per channel cache (see video_cache.py)
+#A cached list comes back as a single page, a fresh listing is cached once it completes
+def iter_youtube_video_pages_cached(access_token, max_results= 50):
+    channel_id = video_cache.get_channel_id(access_token)
+    if channel_id is None:
+        yield from iter_youtube_video_pages(access_token, max_results)
+        return
+
+    entry = video_cache.get_entry(channel_id)
+    if video_cache.is_fresh(entry):
+        video_cache.record_outcome("hit")
+        yield entry["videos"]
+        return
+
+    #Stale or missing, the first search page doubles as the revalidation request
+    first_page = fetch_search_page(access_token, None, max_results, etag=entry["etag"] if entry else None)
+    if entry is not None and first_page.status_code == 304:
+        video_cache.record_outcome("revalidated")
+        video_cache.refresh_entry(channel_id, entry)
+        yield entry["videos"]
+        return
+    if first_page.status_code != 200:
+        raise YouTubeListError(search_error_result(first_page))
+
+    video_cache.record_outcome("miss")
+    videos = []
+    for page in iter_youtube_video_pages(access_token, max_results, first_page=first_page):
+        videos.extend(page)
+        yield page
+    etag = first_page.headers.get("ETag") or first_page.json().get("etag")
+    video_cache.store_videos(channel_id, videos, etag)
+
+def fetch_youtube_videos_cached(access_token, max_results= 50):
+    log(f"Called_Fetch_Youtube_Videos_Cached")
+    videos = []
 
-            response = requests.get(url, params=params, headers=headers)
-            log(f"Fetch_Youtube_Videos_Response : {response}")
-
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_message = error_data.get("error", {}).get("message", "Unknown Error")
-                    # Check specifically for token expiration
-                    if response.status_code == 401:
-                        return {
-                            "success": False,
-                            "error": "Token expired",
-                            "error_code": "TOKEN_EXPIRED",
-                            "details": error_message
-                        }
-                    return {"success": False, "error": error_message}
-                except ValueError:
-                    return {"success": False, "error": f"HTTP Error: {response.status_code}"}
-                
-            data = response.json()
-
-            video_ids = [item["id"]["videoId"] for item in data.get("items", [])]
-            if video_ids:
-                detailed_videos = fetch_video_details(access_token, video_ids)
-                videos.extend(detailed_videos)
-
-            next_page_token = data.get("nextPageToken")
-            if not next_page_token:
-                break
+    try:
+        for page in iter_youtube_video_pages_cached(access_token, max_results):
+            videos.extend(page)
         return {"success": True, "videos": videos}
+    except YouTubeListError as e:
+        return e.result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+#Newline delimited JSON, one video per line, written a page at a time as soon as the page's
+#details arrive. A failure part way through ends the stream with an error line.
+def stream_youtube_videos(access_token):
+    log(f"Called_Stream_Youtube_Videos")
+    try:
+        for page in iter_youtube_video_pages_cached(access_token):
+            yield "".join(json.dumps(video) + "\n" for video in page)
+    except YouTubeListError as e:
+        yield json.dumps(e.result) + "\n"
+    except Exception as e:
+        yield json.dumps({"success": False, "error": str(e)}) + "\n"
+
 @csrf_exempt
 @require_GET
 def get_youtube_videos(request):
@@ -203,7 +263,13 @@ def get_youtube_videos(request):
                 "error": "No Auth Token Provided Currently"
             }, status=401)
 
-        result = fetch_youtube_videos(access_token)
+        #?stream=1 sends videos as NDJSON while the channel is still being listed
+        if request.GET.get("stream") in ("1", "true"):
+            response = StreamingHttpResponse(stream_youtube_videos(access_token), content_type="application/x-ndjson")
+            response["X-Accel-Buffering"] = "no" #Do not let a proxy hold pages back
+            return response
+
+        result = fetch_youtube_videos_cached(access_token)
 
         if result["success"]:
             return JsonResponse({"success": True, "videos": result["videos"]})
@@ -246,14 +312,14 @@ def update_youtube_video(request):
             }, status=400)
         log(f"Update_Found_ID : {video_id}")
     
-        url = "https://www.googleapis.com/youtube/v3/videos"
+        url = "/youtube/v3/videos"
         headers={
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
 
-        get_response = requests.get(
+        get_response = youtube_client().get(
             f"{url}?id={video_id}&part=snippet,status",
             headers=headers
         )
@@ -279,7 +345,7 @@ def update_youtube_video(request):
             "status": video_resource.get("status", {})
         }
 
-        update_response = requests.put(
+        update_response = youtube_client().put(
             f"{url}?part=snippet,status",
             headers=headers,
             json=update_data
@@ -288,6 +354,11 @@ def update_youtube_video(request):
         log(f"Updated : {update_response}")
 
         if update_response.status_code == 200:
+            channel_id = video_cache.get_channel_id(access_token)
+            if channel_id:
+                video_cache.patch_video(channel_id, video_id, {
+                    {"categoryId": "category_id"}.get(key, key): value for key, value in video_data.items()
+                })
             return JsonResponse({"success":True, "message":"Video Update Success"}, status=200)
         else:
             try:
@@ -335,18 +406,20 @@ def delete_youtube_video(request):
         
         log(f"Deleting_ID : {video_id}")
     
-        #url = f"https://www.googleapis.com/youtube/v3/video?id={video_id}"
-        url = f"https://www.googleapis.com/youtube/v3/videos?id={video_id}"
+        url = f"/youtube/v3/videos?id={video_id}"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/json"
         }
 
-        response = requests.delete(url, headers=headers)
+        response = youtube_client().delete(url, headers=headers)
 
         log(f"Delete_Response : {response}")
 
         if response.status_code == 204:
+            channel_id = video_cache.get_channel_id(access_token)
+            if channel_id:
+                video_cache.remove_video(channel_id, video_id)
             return JsonResponse({
                 "success": True,
                 "message": f"Video {video_id} Deletion Success"
@@ -375,6 +448,35 @@ def delete_youtube_video(request):
             "error": str(e)
         }, status=500)
 
+@staff_member_required
+@require_GET
+def youtube_cache_stats(request):
+    log(f"Called_Youtube_Cache_Stats")
+    return JsonResponse({"success": True, "stats": video_cache.video_cache_stats()})
+
+@staff_member_required
+@require_GET
+def catalog_cache_stats(request):
+    log(f"Called_Catalog_Cache_Stats")
+    return JsonResponse({"success": True, "stats": {
+        "catalog": catalog_cache.catalog_cache_stats(),
+        "course_bundle": course_bundle.course_bundle_stats(),
+    }})
+
+#Current static catalog snapshot (see catalog_snapshot.py), clients read this and then fetch url,
+#which never changes and can be cached forever
+@require_GET
+def catalog_snapshot_manifest(request):
+    manifest = catalog_snapshot.read_manifest()
+    if manifest is None:
+        schedule_catalog_snapshot()
+        response = JsonResponse({"status": "building", "message": "The catalog snapshot is not built yet, use the API meanwhile."}, status=503)
+        patch_cache_control(response, no_cache=True)
+        return response
+    response = JsonResponse({**manifest, "url": request.build_absolute_uri(settings.CATALOG_SNAPSHOT_URL + manifest["file"])})
+    patch_cache_control(response, public=True, max_age=settings.CATALOG_SNAPSHOT_MANIFEST_MAX_AGE)
+    return response
+
 @csrf_exempt #Disable CSRF, need Proper Authentication CHANGE
 def check_task_status(request, task_id):
     log(f"Called_Check_Task_Status")
@@ -439,6 +541,10 @@ def upload_video(request):
     if request.method != "POST":
         return JsonResponse({"error": "Only POST requests are allowed"}, status=405)
 
+    #Stream the file straight to disk instead of the default memory/temp file handlers
+    request.upload_handlers = [SpoolingUploadHandler(request)]
+
+    upload_handle = None
     try:
        # Ensure it's a file upload request that can hold a file as JSON will not
         if request.content_type.startswith("multipart/form-data"):
@@ -461,15 +567,13 @@ def upload_video(request):
             log(f"Access Token: {access_token}")
             log(f"Received file: {file.name} (Size: {file.size} bytes)")
 
-            #Read file and encode to base64 for transfer
-            file_data = file.read()
-            file_base64 = base64.b64encode(file_data).decode()
+            #Spool file to shared storage so only a small handle goes through Redis
+            upload_handle = spool_upload(file)
 
             log("Attempting YT Video Enqueue")
             #At a delay (queue with Celery/Redis for task based) call upload
             upload_res = upload_to_youtube.delay(
-                file_base64,
-                file.size,
+                upload_handle,
                 title,
                 description,
                 access_token,
@@ -478,12 +582,13 @@ def upload_video(request):
             )  # Enqueue Celery task with required information
             log("YouTube video queued")
 
-            if(upload_res == 0):
-                return JsonResponse({"message": "File uploaded successfully", "filename": file.name}, status=200,)
-            else:
-                return JsonResponse({"message": "File upload failure"}, status=500)
+            #The worker uploads it later, check_task_status reports the result
+            return JsonResponse({"message": "File upload queued", "filename": file.name, "task_id": upload_res.id}, status=202)
         else:
             return JsonResponse({"error": "Invalid Content-Type"}, status=400)
+    except UploadTooLarge as e:
+        log(f"Upload_Too_Large : {e}")
+        return JsonResponse({"error": "File is too large"}, status=413)
     except Exception as e:
         logger.error(f"Upload attempted but failed using Redis/Celery: {e}")
         log(f"Upload_Retry_Without_CeleRedis")
@@ -498,83 +603,207 @@ def upload_video(request):
             access_token = request.POST.get("accessToken")
             if not file:
                 return JsonResponse({"error": "File is required"}, status=400)
-            file_data = file.read()
-            file_base64 = base64.b64encode(file_data).decode()
-            #file_base64, file.size, title, description, access_token, lesson_id, playlist
-
-            #COPIED CODE FROM tasks.py upload_to_youtube task
             if(lesson_id is None):
+                discard_spooled(upload_handle)
                 return JsonResponse({"error": "Lesson ID None"}, status=400)
-            try:
-                # https://developers.google.com/youtube/v3/docs/videos/insert#.net
-                # Documentations on insert/upload YT functionality
-                metadata = {
-                    "snippet":{
-                        "title":title,
-                        "description":description,
-                        "tags":["Test"], #Will need to swap out for user provided course tags CHANGE
-                        "categoryId": "27", #educational lock
-                    },
-                    "status":{
-                        "madeForKids":False, #Might not function as intended anymore CHANGE
-                        "privacyStatus": "public",
-                    }
-                }
-                headers = {
-                    "Authorization":f"Bearer {access_token}" #Use our ClientID with UserAuth
-                }
+            if upload_handle is None:
+                upload_handle = spool_upload(file)
 
-                #Post request to youtube to get resumable URL
-                init_response = requests.post(
-                    "https://www.googleapis.com/upload/youtube/v3/videos",
-                    params={
-                        "part":"snippet, status", 
-                        "uploadType":"resumable"
-                    },
-                    headers=headers,
-                    json=metadata
-                )
-
-                if init_response.status_code != 200:
-                    raise Exception(f"Error intiating upload: {init_response.text}")
-                resumable_url = init_response.headers['Location']
-
-                #decode b64 to binary
-                file_data = base64.b64decode(file_base64)
-                #Use resumable URL to upload video binary data
-                upload_response = requests.put(
-                    resumable_url,
-                    headers={
-                        "Content-Type": "video/mp4",
-                        "Content-Length": str(file.size)
-                    },
-                    data=file_data
-                )
-                
-                if upload_response.status_code != 200:
-                    raise Exception(f"Error uploading video: {upload_response.text}")
-
-                response_dict = upload_response.json()
-                video_id = response_dict.get("id")
-                logger.debug(f'Youtube_Link https://www.youtube.com/watch?v={video_id}')
-
-                lesson_id = int(lesson_id)
-                lesson = Lessons.objects.get(lessonID=lesson_id)
-                upload = Uploaded.objects.create(lessonID=lesson, videoURL="https://www.youtube.com/watch?v="+video_id)
-                logger.debug(f"Upload_Status {upload}")
-
-                #If a playlist is given
-                #CHANGE if fixing playlist feature
-                    
+            #Upload in this process with a few quick retries, it cleans up the spooled file itself
+            upload_res = upload_to_youtube_now(
+                upload_handle,
+                title,
+                description,
+                access_token,
+                lesson_id,
+                playlist
+            )
+
+            if(upload_res == 0):
                 return JsonResponse({"message": "File uploaded successfully", "filename": file.name}, status=200,)
-            
-            except Exception as e:
-                logger.debug(f"Upload Error {str(e)}")
+            elif(upload_res == UPLOAD_IN_PROGRESS):
+                return JsonResponse({"message": "File upload already in progress", "filename": file.name}, status=202)
+            else:
                 return JsonResponse({"error": "Internal Server Error in Upload"}, status=500)
         except Exception as e:
             logger.debug(f"Upload Error {str(e)}")
+            discard_spooled(upload_handle)
             return JsonResponse({"error": "Internal Server Error in Upload Outer?"}, status=500)
 
+#Bytes read from the blob store per write when sending part of a file
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+#Content types shown in the browser, every other file is sent as an attachment
+#The type is whatever the uploader sent, so HTML, SVG and the like are never rendered from the API origin
+INLINE_CONTENT_TYPES = {
+    "application/pdf",
+    "image/png", "image/jpeg", "image/gif", "image/webp",
+    "audio/mpeg", "audio/ogg", "video/mp4", "video/webm",
+    "text/plain",
+}
+
+#Parse a single "bytes=" Range header into (start, end) inclusive, None to send the whole file
+#Raises ValueError when the range cannot be satisfied
+def parse_byte_range(range_header, size):
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None #Missing, another unit or several ranges, send everything
+    start, dash, end = range_header[len("bytes="):].strip().partition("-")
+    if not dash or (start and not start.isdigit()) or (end and not end.isdigit()) or not (start or end):
+        return None #Malformed, ignored as the RFC allows
+    if not start:
+        #Suffix range, the last N bytes. An empty file has none to send
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError(f"Range {range_header} outside of {size} bytes")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None #Invalid, ignored as well
+    if start >= size:
+        raise ValueError(f"Range {range_header} outside of {size} bytes")
+    return start, min(int(end), size - 1) if end else size - 1
+
+def iter_file_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+#Validator and caching headers, the same on the file and on its 304
+def set_download_validators(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache" #Cacheable, revalidated with the ETag
+    return response
+
+#Stream an attached file from the blob store, supporting Range (206), ETag and If-None-Match (304)
+@require_safe
+def download_file(request, file_id):
+    log(f"Called_Download_File : {file_id}")
+    upload = get_object_or_404(
+        Uploaded.objects.only("fileID", "contentHash", "fileSize", "contentType"),
+        fileID=file_id,
+        contentHash__isnull=False
+    )
+    etag = f'"{upload.contentHash}"'
+    size = upload.fileSize
+    content_type = upload.contentType or "application/octet-stream"
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return set_download_validators(not_modified, etag)
+
+    #If-Range asks for the range only while the file is still the same one
+    byte_range = None
+    if request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_byte_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = str(size)
+    elif byte_range is None:
+        #Whole file, FileResponse lets the server use sendfile when the blob is on disk
+        response = FileResponse(open_blob(upload.contentHash), content_type=content_type)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(open_blob(upload.contentHash), start, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+
+    set_download_validators(response, etag)
+    response["Accept-Ranges"] = "bytes"
+    inline = content_type.split(";")[0].strip().lower() in INLINE_CONTENT_TYPES
+    response["Content-Disposition"] = "inline" if inline else "attachment"
+    return response
+
+#Stored metadata for the videos of the given lessons/uploads in one query, as {videoID: VideoMetadata}
+def video_metadata_for(instances):
+    if instances is None:
+        return {}
+    if isinstance(instances, (Lessons, Uploaded)):
+        instances = [instances]
+    video_ids = set()
+    for instance in instances:
+        uploads = instance.uploaded_set.all() if isinstance(instance, Lessons) else [instance]
+        video_ids.update(upload.videoID for upload in uploads if upload.videoID)
+    if not video_ids:
+        return {}
+    return VideoMetadata.objects.in_bulk(video_ids)
+
+#Prefetch of a lesson's uploads reading only the columns UploadedSummarySerializer shows
+def upload_summaries():
+    return Prefetch('uploaded_set', queryset=Uploaded.objects.only(*UPLOAD_SUMMARY_FIELDS).order_by('fileID'))
+
+#Puts video metadata for whatever is being serialized into the serializer context
+class VideoMetadataMixin:
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            kwargs.setdefault("context", self.get_serializer_context())
+            kwargs["context"]["video_metadata"] = video_metadata_for(args[0])
+        return super().get_serializer(*args, **kwargs)
+
+#Latest refresh of any stored video metadata, which lesson and upload responses show
+def latest_video_metadata():
+    return VideoMetadata.objects.aggregate(latest=Max('fetchedAt'))['latest']
+
+#ETag/Last-Modified on list and retrieve, a client whose copy is still current gets a 304 before
+#anything is serialized (see conditional.py)
+class ConditionalGetMixin:
+    #Timestamps the serialized rows depend on, and a Q of rows that must not be cached publicly
+    validator_fields = ('updatedAt',)
+    private_rows = None
+
+    def extra_timestamps(self):
+        return ()
+
+    def validators(self, queryset):
+        return conditional.validate(self.request, queryset, self.validator_fields, self.private_rows, self.extra_timestamps())
+
+    def list(self, request, *args, **kwargs):
+        validators = self.validators(self.filter_queryset(self.get_queryset()))
+        return conditional.conditional_response(request, validators, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            validators = self.validators(self.get_queryset().filter(**{self.lookup_field: lookup}))
+        except (TypeError, ValueError, DjangoValidationError):
+            return super().retrieve(request, *args, **kwargs) # Not a valid key, let it 404
+        return conditional.conditional_response(request, validators, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+#Tag IDs from a comma separated list, e.g. "3,7"
+def parse_tag_ids(value):
+    try:
+        return [int(tag_id) for tag_id in value.split(",") if tag_id.strip()]
+    except ValueError:
+        raise ValidationError({"tags": "Must be comma separated tag IDs."})
+
+#Matching course IDs and facets from the tag index, or from the database while it is unavailable
+def courses_with_tags(tag_ids, match_all):
+    try:
+        return tag_index.filter_courses(tag_ids, match_all)
+    except tag_index.TagIndexNotBuilt:
+        if tag_index.claim_rebuild():
+            rebuild_tag_index.delay()
+    except redis.RedisError as e:
+        logger.error(f"Tag index unavailable, filtering in the database: {e}")
+    return tag_index.filter_courses_from_database(tag_ids, match_all)
+
 class UserInfoViewAll(viewsets.ModelViewSet):
     queryset = UserInfo.objects.all()
     serializer_class = UserInfoSerializer
@@ -583,15 +812,52 @@ class InstructorViewAll(viewsets.ModelViewSet):
     queryset = Instructor.objects.all()
     serializer_class = InstructorSerializer
 
-class TopicViewAll(viewsets.ModelViewSet):
+class TopicViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Topics.objects.all()
     serializer_class = TopicSerializer
 
-class CourseViewAll(viewsets.ModelViewSet):
-    queryset = Courses.objects.all()
+    def list(self, request, *args, **kwargs):
+        return catalog_cache.cached_response(request, ["topics"], lambda: super(TopicViewAll, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_cache.cached_response(request, ["topics"], lambda: super(TopicViewAll, self).retrieve(request, *args, **kwargs))
+
+    #Published courses sharing a tag with the topic, read from the browse index (see topic_browse.py)
+    @action(detail=True, methods=['get'])
+    def courses(self, request, pk=None):
+        topic = self.get_object()
+        log(f"Called_Topic_Courses : {topic.topicID}")
+        summary = TopicCourseSummary.objects.filter(topicID=topic).first()
+        courses = self.paginate_queryset(
+            Courses.objects.select_related('ratingAggregate')
+            .filter(pk__in=TopicCourse.objects.filter(topicID=topic).values('courseID'))
+        )
+        response = self.get_paginated_response(CourseSerializer(courses, many=True, context=self.get_serializer_context()).data)
+        response.data["topic"] = {
+            "topicID": topic.topicID,
+            "topicName": topic.topicName,
+            "courseCount": summary.courseCount if summary else 0,
+            "ratingCount": summary.ratingCount if summary else 0,
+            "ratingAverage": summary.average if summary else None,
+        }
+        return response
+
+class CourseViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Courses.objects.select_related('ratingAggregate')
     serializer_class = CourseSerializer
+    validator_fields = ('updatedAt', 'ratingAggregate__updatedAt')
+    private_rows = Q(isPublished=False)
+
+    def list(self, request, *args, **kwargs):
+        return catalog_cache.cached_response(request, ["courses"], lambda: super(CourseViewAll, self).list(request, *args, **kwargs))
 
     def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get("pk")
+        if not str(pk).isdigit():
+            return self.retrieve_course(request, *args, **kwargs)
+        return catalog_cache.cached_response(request, [catalog_cache.course_version(pk)], lambda: self.retrieve_course(request, *args, **kwargs))
+
+    def retrieve_course(self, request, *args, **kwargs):
         try:
             return super().retrieve(request, *args, **kwargs)
         except Courses.DoesNotExist:
@@ -604,11 +870,27 @@ class CourseViewAll(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def lessons(self, request, pk=None):
+        if not str(pk).isdigit():
+            return self.course_lessons()
+        return catalog_cache.cached_response(request, [catalog_cache.course_version(pk)], lambda: self.conditional_course_lessons(request, pk))
+
+    #The course's lessons with ETag/Last-Modified, 304 when the client's copy is current
+    def conditional_course_lessons(self, request, pk):
+        validators = conditional.validate(
+            request, Lessons.objects.filter(courseID=pk), private=Q(courseID__isPublished=False),
+            extra_timestamps=[latest_video_metadata()]
+        )
+        return conditional.conditional_response(request, validators, self.course_lessons)
+
+    def course_lessons(self):
         try:
             course = self.get_object()
-            lessons = Lessons.objects.filter(courseID=course).prefetch_related('uploaded_set')
-            serializer = LessonSerializer(lessons, many=True)
-            return Response(serializer.data)
+            lessons = self.paginate_queryset(Lessons.objects.filter(courseID=course).prefetch_related(upload_summaries()))
+            serializer = LessonSerializer(lessons, many=True, context={
+                **self.get_serializer_context(),
+                "video_metadata": video_metadata_for(lessons)
+            })
+            return self.get_paginated_response(serializer.data)
         except Courses.DoesNotExist:
             return Response({
                 "status": "under_construction",
@@ -617,30 +899,218 @@ class CourseViewAll(viewsets.ModelViewSet):
                 "emoji": "👨‍🍳"
             }, status=404)
 
-class LessonViewAll(viewsets.ModelViewSet):
-    queryset = Lessons.objects.all().prefetch_related('uploaded_set')
+    #Course, ordered lessons with upload summaries, tag names and rating in one response
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        log(f"Called_Course_Bundle : {pk}")
+        bundle = course_bundle.get_bundle(pk) if str(pk).isdigit() else None
+        if bundle is None:
+            return Response({
+                "status": "under_construction",
+                "message": "🚧 Oops! This course is still under construction! 🏗️",
+                "details": "Our educational architects are hard at work building something amazing. Check back soon!",
+                "emoji": "👷‍♂️"
+            }, status=404)
+        return Response(bundle)
+
+    #Published courses tagged with all (match=all, default) or any (match=any) of the given tags,
+    #plus how many of them carry each other tag, e.g. /courses/by-tags/?tag_names=python,algorithms
+    @action(detail=False, methods=['get'], url_path='by-tags')
+    def by_tags(self, request):
+        match = request.query_params.get("match", "all")
+        if match not in ("all", "any"):
+            raise ValidationError({"match": "Must be all or any."})
+        tag_ids = set(parse_tag_ids(request.query_params.get("tags", "")))
+        names = {name.strip() for name in request.query_params.get("tag_names", "").split(",") if name.strip()}
+        if not tag_ids and not names:
+            raise ValidationError({"tags": "Give at least one tag ID (tags) or name (tag_names)."})
+        log(f"Called_Courses_By_Tags : {match} : {tag_ids} : {names}")
+        named = dict(Tags.objects.filter(tagName__in=names).values_list('tagName', 'tagID')) if names else {}
+        tag_ids.update(named.values())
+
+        if (match == "all" and len(named) < len(names)) or not tag_ids:
+            course_ids, facets = set(), [] # An unknown tag name matches nothing
+        else:
+            course_ids, facets = courses_with_tags(tag_ids, match == "all")
+
+        courses = self.paginate_queryset(self.get_queryset().filter(pk__in=course_ids))
+        response = self.get_paginated_response(self.get_serializer(courses, many=True).data)
+        tag_names = Tags.objects.in_bulk([tag_id for tag_id, _ in facets])
+        response.data["count"] = len(course_ids)
+        response.data["facets"] = [
+            {"tagID": tag_id, "tagName": tag_names[tag_id].tagName, "count": count}
+            for tag_id, count in facets if tag_id in tag_names
+        ]
+        return response
+
+class LessonViewAll(ConditionalGetMixin, VideoMetadataMixin, viewsets.ModelViewSet):
+    queryset = Lessons.objects.all().prefetch_related(upload_summaries())
     serializer_class = LessonSerializer
+    private_rows = Q(courseID__isPublished=False)
+
+    def extra_timestamps(self):
+        return [latest_video_metadata()]
 
-class RatingViewAll(viewsets.ModelViewSet):
+    #Lessons using a YouTube video, found through the indexed Uploaded.videoID
+    @action(detail=False, methods=['get'], url_path=r'by-video/(?P<video_id>[\w-]+)')
+    def by_video(self, request, video_id=None):
+        lessons = self.paginate_queryset(self.get_queryset().filter(uploaded__videoID=video_id).distinct())
+        serializer = self.get_serializer(lessons, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class RatingViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
-
-class TagViewAll(viewsets.ModelViewSet):
+    private_rows = Q(courseID__isPublished=False)
+
+    #In buffered mode a valid rating is acknowledged once it is in the Redis buffer (see ratings.py)
+    def create(self, request, *args, **kwargs):
+        if settings.RATING_INGEST_MODE != "buffered":
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course_id, rating = serializer.validated_data["courseID"].pk, serializer.validated_data["rating"]
+        try:
+            buffered = buffer_ratings([(course_id, rating)])
+        except redis.RedisError as e:
+            logger.error(f"Rating buffer unavailable, saving directly: {e}")
+            self.perform_create(serializer)
+            return Response(serializer.data, status=201)
+        if buffered == 1:
+            drain_rating_buffer.apply_async(countdown=settings.RATING_BUFFER_FLUSH_DELAY)
+        return Response({"status": "queued", "courseID": course_id, "rating": rating}, status=202)
+
+class TagViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Tags.objects.all()
     serializer_class = TagSerializer
 
-class TopicTagViewAll(viewsets.ModelViewSet):
+    #Autocomplete, existing tags starting with or resembling q, e.g. /tags/suggest/?q=pyth&limit=5
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "Text to complete is required."})
+        try:
+            limit = int(request.query_params.get("limit", settings.TAG_SUGGEST_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "Must be a number."})
+        limit = max(1, min(limit, settings.TAG_SUGGEST_MAX_LIMIT))
+        log(f"Called_Tag_Suggest : {text}")
+        return Response({"results": TagSuggestionSerializer(suggest_tags(text, limit), many=True).data})
+
+class TopicTagViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = TopicTag.objects.all()
     serializer_class = TopicTagSerializer
 
-class CourseTagViewAll(viewsets.ModelViewSet):
+class CourseTagViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CourseTag.objects.all()
     serializer_class = CourseTagSerializer
+    private_rows = Q(courseID__isPublished=False)
 
-class LessonTagViewAll(viewsets.ModelViewSet):
+class LessonTagViewAll(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = LessonTag.objects.all()
     serializer_class = LessonTagSerializer
+    private_rows = Q(lessonID__courseID__isPublished=False)
 
-class UploadedViewAll(viewsets.ModelViewSet):
+class UploadedViewAll(ConditionalGetMixin, VideoMetadataMixin, viewsets.ModelViewSet):
     queryset = Uploaded.objects.all()
     serializer_class = UploadedSerializer
+    private_rows = Q(lessonID__courseID__isPublished=False)
+
+    def extra_timestamps(self):
+        return [latest_video_metadata()]
+
+    #Listings show summaries only, file contents are fetched through download_file
+    def get_queryset(self):
+        if self.action == 'list':
+            return Uploaded.objects.only(*UPLOAD_SUMMARY_FIELDS)
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return UploadedSummarySerializer
+        return super().get_serializer_class()
+
+#Viewsets whose queryset and serializer render the rows of each logged model in the change feed
+CHANGE_FEED_VIEWSETS = {
+    "topics": TopicViewAll,
+    "courses": CourseViewAll,
+    "lessons": LessonViewAll,
+    "ratings": RatingViewAll,
+    "tags": TagViewAll,
+    "topic-tags": TopicTagViewAll,
+    "course-tags": CourseTagViewAll,
+    "lesson-tags": LessonTagViewAll,
+    "uploaded": UploadedViewAll,
+}
+
+#Catalog changes after a sequence number (see changes.py), e.g. /changes/?since=120&limit=500
+#Every entry carries its row as the endpoint shows it now, or null once the row is deleted.
+#Pass next as since to continue, more is true while further changes are ready
+class ChangeFeedView(APIView):
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = int(request.query_params.get("limit", settings.CATALOG_CHANGES_LIMIT))
+        except ValueError:
+            raise ValidationError({"since": "since and limit must be numbers."})
+        limit = max(1, min(limit, settings.CATALOG_CHANGES_MAX_LIMIT))
+        log(f"Called_Change_Feed : {since}")
+        batch = changes.changes_since(since, limit)
+        rows = self.current_rows(batch)
+        return Response({
+            "since": since,
+            "next": batch[-1].seq if batch else since,
+            "more": len(batch) == limit,
+            "changes": [
+                {
+                    "seq": change.seq,
+                    "modelName": change.modelName,
+                    "objectID": change.objectID,
+                    "action": change.action,
+                    "data": rows.get((change.modelName, change.objectID)),
+                }
+                for change in batch
+            ],
+        })
+
+    #Current serialized rows of the changes that were not deletes, one query per model, {(model name, ID): data}
+    def current_rows(self, batch):
+        object_ids = defaultdict(set)
+        for change in batch:
+            if change.action != CatalogChange.ACTION_DELETED:
+                object_ids[change.modelName].add(change.objectID)
+        rows = {}
+        for name, ids in object_ids.items():
+            viewset = CHANGE_FEED_VIEWSETS[name]
+            instances = list(viewset.queryset.filter(pk__in=ids))
+            context = {"request": self.request}
+            if issubclass(viewset, VideoMetadataMixin):
+                context["video_metadata"] = video_metadata_for(instances)
+            data = viewset.serializer_class(instances, many=True, context=context).data
+            rows.update(((name, instance.pk), row) for instance, row in zip(instances, data))
+        return rows
+
+#Ranked full text search over courses (default) or lessons, e.g. /search/?q=python loops&type=lessons
+class SearchView(generics.ListAPIView):
+    pagination_class = RankedKeysetPagination
+
+    def get_kind(self):
+        kind = self.request.query_params.get("type", "courses")
+        if kind not in SEARCH_TARGETS:
+            raise ValidationError({"type": f"Must be one of {', '.join(SEARCH_TARGETS)}."})
+        return kind
+
+    def get_queryset(self):
+        kind = self.get_kind()
+        text = self.request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "Search text is required."})
+        log(f"Called_Search : {kind} : {text}")
+        results = search(kind, text).defer("searchVector")
+        if kind == "courses":
+            results = results.select_related("ratingAggregate")
+        return results
+
+    def get_serializer_class(self):
+        return CourseSearchResultSerializer if self.get_kind() == "courses" else LessonSearchResultSerializer
@@ -0,0 +1,181 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger("django")
+
+"""
+Shared client for every call to the YouTube Data API.
+- One pooled requests.Session per process, so connections (and TLS sessions) are kept alive
+- Every call has a (connect, read) timeout from settings
+- 429 and 5xx responses and connection errors are retried with jittered exponential backoff
+- youtube_executor() is a bounded thread pool for running independent calls side by side
+- configure_client() swaps the base URL or transport (a requests adapter), so tests and
+  benchmarks can point the whole app at a local fake server
+"""
+
+#Status codes worth retrying, everything else goes straight back to the caller
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class YouTubeClient:
+    def __init__(self, base_url=None, transport=None, timeout=None, max_retries=None, backoff=None, backoff_max=None):
+        self.base_url = (base_url or settings.YOUTUBE_API_BASE_URL).rstrip("/")
+        self.timeout = timeout or (settings.YOUTUBE_CONNECT_TIMEOUT, settings.YOUTUBE_READ_TIMEOUT)
+        self.max_retries = settings.YOUTUBE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.YOUTUBE_BACKOFF if backoff is None else backoff
+        self.backoff_max = settings.YOUTUBE_BACKOFF_MAX if backoff_max is None else backoff_max
+
+        self.session = requests.Session()
+        adapter = transport or HTTPAdapter(
+            pool_connections=settings.YOUTUBE_POOL_SIZE,
+            pool_maxsize=settings.YOUTUBE_POOL_SIZE
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    #Paths are joined to the base url, full urls (like resumable session urls) are used as is
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}{path}"
+
+    #Full jitter, sleep a random time up to the exponential cap, honouring Retry-After when given
+    def backoff_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    #Send a request, retrying 429/5xx and connection problems unless retry is False
+    #Use retry=False for bodies that cannot be replayed, like open file objects
+    def request(self, method, path, retry=True, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.url(path)
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == attempts - 1:
+                    raise
+                logger.debug(f"YouTube_Retry {method} {path} : {e}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    return response
+                logger.debug(f"YouTube_Retry {method} {path} : {response.status_code}")
+            time.sleep(self.backoff_delay(attempt, response))
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+_client = None
+_client_pid = None
+_client_options = {}
+_client_lock = threading.Lock()
+
+#Process wide client, rebuilt after a fork so celery/gunicorn children never share sockets
+def youtube_client():
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = YouTubeClient(**_client_options)
+                _client_pid = os.getpid()
+    return _client
+
+#Point the shared client somewhere else (base_url) or through another transport adapter
+#Calling it with no arguments goes back to the settings defaults
+def configure_client(**options):
+    global _client, _client_options
+    with _client_lock:
+        _client_options = options
+        _client = None
+    return youtube_client()
+
+_executor = None
+_executor_pid = None
+
+#Process wide pool for overlapping YouTube requests, sized by settings.YOUTUBE_FETCH_WORKERS
+def youtube_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _client_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.YOUTUBE_FETCH_WORKERS,
+                    thread_name_prefix="youtube"
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+#Patterns Generated with Claude 3.7 Sonnet, compiled once at import
+#IDs are the 11 characters of the YouTube alphabet, so fragments and trailing paths are never stored
+VIDEO_URL_PATTERNS = [
+    re.compile(r'(?:youtube\.com\/watch\?v=|youtu.be\/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])'),
+    re.compile(r'youtube\.com\/shorts\/([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])')
+]
+
+#Helper function to remove youtube junk from youtube id in url
+def extract_video_id(youtube_url):
+    logger.debug(f"Called_Extract_Video_Id")
+    for pattern in VIDEO_URL_PATTERNS:
+        match = pattern.search(youtube_url)
+        if match:
+            logger.debug(f"Video_Match_Extract : {match.group(1)}")
+            return match.group(1)
+    logger.debug(f"ID_Not_Extracted")
+    return None
+
+#Flatten one item of a videos.list response (snippet, contentDetails, statistics, status)
+def parse_video(item):
+    snippet = item.get("snippet", {})
+    content_details = item.get("contentDetails", {})
+    statistics = item.get("statistics", {})
+    status = item.get("status", {})
+    tags = snippet.get("tags", [])
+
+    thumbnails = snippet.get("thumbnails", {})
+    thumbnail_url = None
+    for quality in ["maxres", "standard", "high", "medium", "default"]:
+        if quality in thumbnails:
+            thumbnail_url = thumbnails[quality].get('url')
+            break
+
+    # Made with AI
+    return {
+        "id": item.get("id"),
+        "title": snippet.get("title", ""),
+        "description": snippet.get("description", ""),
+        "youtube_url": f"https://www.youtube.com/watch?v={item.get('id')}",
+        "thumbnail_url": thumbnail_url,
+        "channel_id": snippet.get("channelId"),
+        "channel_title": snippet.get("channelTitle"),
+        "published_at": snippet.get("publishedAt"),
+        "tags": tags,
+        "category_id": snippet.get("categoryId"),
+        "duration": content_details.get("duration"),
+        "view_count": statistics.get("viewCount", 0),
+        "like_count": statistics.get("likeCount", 0),
+        "comment_count": statistics.get("commentCount", 0),
+        "privacy_status": status.get("privacyStatus"),
+        "embeddable": status.get("embeddable", True),
+        "license": status.get("license"),
+    }
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import get_youtube_videos, delete_youtube_video, update_youtube_video, check_task_status
+from .views import get_youtube_videos, delete_youtube_video, update_youtube_video, check_task_status, youtube_cache_stats
 
 urlpatterns = [
     #Get Videos
@@ -9,5 +9,7 @@ urlpatterns = [
     #Delete Video
     path("update/", update_youtube_video, name="update_youtube_video"),
     # Task Status
-    path("status/<str:task_id>/", check_task_status, name="check_task_status")
+    path("status/<str:task_id>/", check_task_status, name="check_task_status"),
+    #Video Cache Hit/Miss Counters
+    path("cache-stats/", youtube_cache_stats, name="youtube_cache_stats")
 ]
\ No newline at end of file
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'backend_app',
     'corsheaders',
     'rest_framework',
@@ -48,7 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'backend_app.middleware.SnapshotWhiteNoiseMiddleware', # WhiteNoise, plus the catalog snapshots
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,6 +58,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Every API listing is cursor paginated on the primary key (see backend_app/pagination.py),
+# clients pick a page size with ?page_size= up to API_MAX_PAGE_SIZE
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "backend_app.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", 50)),
+}
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 500))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://localhost:8000",
@@ -91,12 +100,111 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+
 CELERY_BROKER_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_RESULT_BACKEND = os.getenv("REDIS_URL", "redis://redis:6379/0")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 
+# Bytes sent per request when uploading to YouTube, must be a multiple of 256 KiB.
+# Bigger chunks mean fewer round trips but more memory per worker, 0 streams the
+# whole file in a single request
+YOUTUBE_UPLOAD_CHUNK_SIZE = int(os.getenv("YOUTUBE_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# Interrupted uploads resume from the last committed byte, see UploadJob
+YOUTUBE_UPLOAD_MAX_RETRIES = int(os.getenv("YOUTUBE_UPLOAD_MAX_RETRIES", 5))
+YOUTUBE_UPLOAD_RETRY_DELAY = int(os.getenv("YOUTUBE_UPLOAD_RETRY_DELAY", 30)) # doubled on every retry
+YOUTUBE_UPLOAD_LEASE_SECONDS = int(os.getenv("YOUTUBE_UPLOAD_LEASE_SECONDS", 60))
+# Attempts when the web process uploads itself because the task could not be queued,
+# separated by the YOUTUBE_BACKOFF backoff instead of YOUTUBE_UPLOAD_RETRY_DELAY
+YOUTUBE_UPLOAD_SYNC_ATTEMPTS = int(os.getenv("YOUTUBE_UPLOAD_SYNC_ATTEMPTS", 3))
+
+# Uploads are acknowledged late, so only reserve one long task at a time and give
+# Redis enough time before it hands an unacknowledged upload to another worker
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": int(os.getenv("CELERY_VISIBILITY_TIMEOUT", 6 * 60 * 60)),
+}
+
+# Local copy of YouTube details for linked videos (VideoMetadata). Every run refreshes up to
+# VIDEO_METADATA_REFRESH_BATCHES x 50 videos older than VIDEO_METADATA_MAX_AGE, stalest first
+VIDEO_METADATA_REFRESH_INTERVAL = int(os.getenv("VIDEO_METADATA_REFRESH_INTERVAL", 15 * 60))
+VIDEO_METADATA_REFRESH_BATCHES = int(os.getenv("VIDEO_METADATA_REFRESH_BATCHES", 20))
+VIDEO_METADATA_MAX_AGE = int(os.getenv("VIDEO_METADATA_MAX_AGE", 6 * 60 * 60))
+
+# Rating writes: "direct" saves each rating in its own transaction, "buffered" acknowledges
+# it after pushing it to a Redis list that drain_rating_buffer writes in batches
+# (see backend_app/ratings.py). A drain is queued RATING_BUFFER_FLUSH_DELAY seconds after
+# the first rating lands in an empty buffer, beat also drains every RATING_BUFFER_DRAIN_INTERVAL
+RATING_INGEST_MODE = os.getenv("RATING_INGEST_MODE", "direct")
+RATING_BUFFER_URL = os.getenv("RATING_BUFFER_URL", CELERY_BROKER_URL)
+RATING_BUFFER_BATCH_SIZE = int(os.getenv("RATING_BUFFER_BATCH_SIZE", 1000))
+RATING_BUFFER_FLUSH_DELAY = float(os.getenv("RATING_BUFFER_FLUSH_DELAY", 1))
+RATING_BUFFER_DRAIN_INTERVAL = int(os.getenv("RATING_BUFFER_DRAIN_INTERVAL", 60))
+RATING_BUFFER_LOCK_SECONDS = int(os.getenv("RATING_BUFFER_LOCK_SECONDS", 60))
+
+# Tag -> published course inverted index behind /courses/by-tags/ (see backend_app/tag_index.py).
+# Kept current by signals, rebuilt from scratch every TAG_INDEX_REBUILD_INTERVAL as a safety net
+TAG_INDEX_URL = os.getenv("TAG_INDEX_URL", CACHES["default"]["LOCATION"])
+TAG_INDEX_REBUILD_INTERVAL = int(os.getenv("TAG_INDEX_REBUILD_INTERVAL", 6 * 60 * 60))
+TAG_INDEX_LOCK_SECONDS = int(os.getenv("TAG_INDEX_LOCK_SECONDS", 10 * 60))
+TAG_FACET_LIMIT = int(os.getenv("TAG_FACET_LIMIT", 50)) # facet counts returned per request
+
+# Topic -> course browse views behind /topics/<id>/courses/ (see backend_app/topic_browse.py). Refreshed
+# every TOPIC_COURSES_REFRESH_INTERVAL, and TOPIC_COURSES_REFRESH_DELAY seconds after tag links change
+TOPIC_COURSES_REFRESH_INTERVAL = int(os.getenv("TOPIC_COURSES_REFRESH_INTERVAL", 10 * 60))
+TOPIC_COURSES_REFRESH_DELAY = int(os.getenv("TOPIC_COURSES_REFRESH_DELAY", 30))
+
+# Catalog change log behind /changes/?since=<seq> (see backend_app/changes.py). Entries are served once
+# CATALOG_CHANGES_SETTLE_SECONDS old, superseded ones are compacted every CATALOG_CHANGES_COMPACT_INTERVAL
+CATALOG_CHANGES_LIMIT = int(os.getenv("CATALOG_CHANGES_LIMIT", 500)) # entries per batch by default
+CATALOG_CHANGES_MAX_LIMIT = int(os.getenv("CATALOG_CHANGES_MAX_LIMIT", 2000))
+CATALOG_CHANGES_SETTLE_SECONDS = float(os.getenv("CATALOG_CHANGES_SETTLE_SECONDS", 2))
+CATALOG_CHANGES_COMPACT_INTERVAL = int(os.getenv("CATALOG_CHANGES_COMPACT_INTERVAL", 60 * 60))
+CATALOG_CHANGES_COMPACT_BATCH = int(os.getenv("CATALOG_CHANGES_COMPACT_BATCH", 5000))
+
+# Static snapshot of the published catalog (see backend_app/catalog_snapshot.py). Rebuilt
+# CATALOG_SNAPSHOT_DELAY seconds after catalog writes and every CATALOG_SNAPSHOT_INTERVAL
+CATALOG_SNAPSHOT_DELAY = int(os.getenv("CATALOG_SNAPSHOT_DELAY", 30))
+CATALOG_SNAPSHOT_INTERVAL = int(os.getenv("CATALOG_SNAPSHOT_INTERVAL", 60 * 60))
+CATALOG_SNAPSHOT_LOCK_SECONDS = int(os.getenv("CATALOG_SNAPSHOT_LOCK_SECONDS", 5 * 60))
+CATALOG_SNAPSHOT_KEEP = int(os.getenv("CATALOG_SNAPSHOT_KEEP", 3)) # versions kept for clients holding an older manifest
+CATALOG_SNAPSHOT_MANIFEST_MAX_AGE = int(os.getenv("CATALOG_SNAPSHOT_MANIFEST_MAX_AGE", 30))
+
+CELERY_BEAT_SCHEDULE = {
+    "refresh-video-metadata": {
+        "task": "backend_app.tasks.refresh_video_metadata",
+        "schedule": VIDEO_METADATA_REFRESH_INTERVAL,
+    },
+    "drain-rating-buffer": {
+        "task": "backend_app.tasks.drain_rating_buffer",
+        "schedule": RATING_BUFFER_DRAIN_INTERVAL,
+    },
+    "rebuild-tag-index": {
+        "task": "backend_app.tasks.rebuild_tag_index",
+        "schedule": TAG_INDEX_REBUILD_INTERVAL,
+    },
+    "refresh-topic-courses": {
+        "task": "backend_app.tasks.refresh_topic_courses",
+        "schedule": TOPIC_COURSES_REFRESH_INTERVAL,
+    },
+    "compact-catalog-changes": {
+        "task": "backend_app.tasks.compact_catalog_changes",
+        "schedule": CATALOG_CHANGES_COMPACT_INTERVAL,
+    },
+    "build-catalog-snapshot": {
+        "task": "backend_app.tasks.build_catalog_snapshot",
+        "schedule": CATALOG_SNAPSHOT_INTERVAL,
+    },
+}
+
 ROOT_URLCONF = 'backend_project.urls'
 
 TEMPLATES = [
@@ -177,6 +285,33 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded videos are spooled here and handed to Celery by reference, so this
+# location must be shared by the web and celery containers
+UPLOAD_SPOOL_STORAGE = {
+    "BACKEND": "django.core.files.storage.FileSystemStorage",
+    "OPTIONS": {
+        "location": os.getenv("UPLOAD_SPOOL_DIR", os.path.join(MEDIA_ROOT, "spool")),
+    },
+}
+
+# Lesson files are stored here by content hash (see backend_app/blobstore.py)
+BLOB_STORAGE = {
+    "BACKEND": "django.core.files.storage.FileSystemStorage",
+    "OPTIONS": {
+        "location": os.getenv("BLOB_STORAGE_DIR", os.path.join(MEDIA_ROOT, "blobs")),
+    },
+}
+
+# Catalog snapshots are written here by Celery and served by the web containers under
+# CATALOG_SNAPSHOT_URL (see backend_app/middleware.py), so this location must be shared too
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", os.path.join(MEDIA_ROOT, "catalog"))
+CATALOG_SNAPSHOT_URL = os.getenv("CATALOG_SNAPSHOT_URL", "/catalog-snapshots/")
+
+# Video uploads are streamed to disk in chunks of this size and refused once they
+# go past UPLOAD_MAX_SIZE bytes
+UPLOAD_SPOOL_CHUNK_SIZE = int(os.getenv("UPLOAD_SPOOL_CHUNK_SIZE", 256 * 1024))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 4 * 1024 * 1024 * 1024))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -208,4 +343,42 @@ LOGGING = {
     },
 }
 
-YOUTUBE_API_KEY = os.getenv("YT_API_KEY")
\ No newline at end of file
+YOUTUBE_API_KEY = os.getenv("YT_API_KEY")
+
+# Shared YouTube API client (see backend_app/youtube.py)
+YOUTUBE_API_BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com")
+YOUTUBE_POOL_SIZE = int(os.getenv("YOUTUBE_POOL_SIZE", 10))
+YOUTUBE_CONNECT_TIMEOUT = float(os.getenv("YOUTUBE_CONNECT_TIMEOUT", 5))
+YOUTUBE_READ_TIMEOUT = float(os.getenv("YOUTUBE_READ_TIMEOUT", 30))
+YOUTUBE_UPLOAD_TIMEOUT = float(os.getenv("YOUTUBE_UPLOAD_TIMEOUT", 300)) # read timeout for upload chunks
+YOUTUBE_MAX_RETRIES = int(os.getenv("YOUTUBE_MAX_RETRIES", 3))
+YOUTUBE_BACKOFF = float(os.getenv("YOUTUBE_BACKOFF", 0.5)) # seconds, doubled every attempt
+YOUTUBE_BACKOFF_MAX = float(os.getenv("YOUTUBE_BACKOFF_MAX", 8))
+YOUTUBE_FETCH_WORKERS = int(os.getenv("YOUTUBE_FETCH_WORKERS", 4)) # concurrent requests when listing videos
+
+# Per channel cache of listed videos (see backend_app/video_cache.py)
+YOUTUBE_VIDEO_CACHE_TTL = int(os.getenv("YOUTUBE_VIDEO_CACHE_TTL", 5 * 60)) # served without asking YouTube
+YOUTUBE_VIDEO_CACHE_STALE_TTL = int(os.getenv("YOUTUBE_VIDEO_CACHE_STALE_TTL", 24 * 60 * 60)) # kept for ETag revalidation
+YOUTUBE_TOKEN_CACHE_TTL = int(os.getenv("YOUTUBE_TOKEN_CACHE_TTL", 60 * 60)) # access token -> channel ID
+
+# Cached /courses/<id>/bundle/ responses (see backend_app/course_bundle.py)
+COURSE_BUNDLE_CACHE_TTL = int(os.getenv("COURSE_BUNDLE_CACHE_TTL", 10 * 60))
+
+# Cached course, lesson and topic reads (see backend_app/catalog_cache.py). Writes move them to new keys,
+# the TTLs only bound how long an unchanged response is kept
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 10 * 60))
+CATALOG_CACHE_STALE_TTL = int(os.getenv("CATALOG_CACHE_STALE_TTL", 60)) # served while one request rebuilds
+CATALOG_CACHE_LOCK_SECONDS = int(os.getenv("CATALOG_CACHE_LOCK_SECONDS", 10))
+CATALOG_CACHE_WAIT = float(os.getenv("CATALOG_CACHE_WAIT", 2)) # seconds a miss waits on another request's rebuild
+
+# Cache-Control of anonymous catalog reads showing only published content (see backend_app/conditional.py),
+# how long a CDN or browser may reuse them, then keep serving them while it revalidates
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 60))
+CATALOG_STALE_WHILE_REVALIDATE = int(os.getenv("CATALOG_STALE_WHILE_REVALIDATE", 5 * 60))
+
+# Text search configuration of the course and lesson search vectors (see backend_app/search.py)
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "english")
+
+# Suggestions returned by /tags/suggest/ by default and at most (see backend_app/tag_suggest.py)
+TAG_SUGGEST_LIMIT = int(os.getenv("TAG_SUGGEST_LIMIT", 10))
+TAG_SUGGEST_MAX_LIMIT = int(os.getenv("TAG_SUGGEST_MAX_LIMIT", 50))
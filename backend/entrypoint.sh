@@ -39,6 +39,12 @@ done
 # Apply database migrations
 python manage.py migrate --noinput
 
+# Build the tag index behind /courses/by-tags/, requests use the database until it exists
+python manage.py rebuild_tag_index || echo "WARNING: Tag index rebuild failed, it will be retried in the background"
+
+# Write the static catalog snapshot behind /api/catalog/manifest/, it is rebuilt in the background after writes
+python manage.py build_catalog_snapshot || echo "WARNING: Catalog snapshot build failed, it will be retried in the background"
+
 # Collect static files
 python manage.py collectstatic --noinput
 